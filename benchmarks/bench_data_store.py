@@ -0,0 +1,63 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from data_store import import_csv, read_frame, read_columns
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'cleaned_data', 'worm_cleaned.csv')
+
+def scaled_csv(n_rows, directory):
+    """Write worm_cleaned.csv tiled up to n_rows, with timestamps kept increasing"""
+    df = pd.read_csv(DATA_FILE)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    reps = -(-n_rows // len(df))
+    span = df['timestamp'].iloc[-1] - df['timestamp'].iloc[0] + pd.Timedelta('15s')
+    big = pd.concat([df.assign(timestamp=df['timestamp'] + i * span) for i in range(reps)],
+                    ignore_index=True).iloc[:n_rows]
+    path = os.path.join(directory, f'bench_{n_rows}.csv')
+    big.to_csv(path, index=False)
+    return path
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def load_csv(path):
+    df = pd.read_csv(path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CSV parsing with column store loads")
+    parser.add_argument('--rows', type=int, nargs='+', default=[11_697, 1_000_000])
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        print(f"{'rows':>10} {'csv+to_datetime s':>18} {'import s':>9} "
+              f"{'frame (mmap) s':>15} {'columns (mmap) s':>17}")
+        for n_rows in args.rows:
+            path = DATA_FILE if n_rows == 11_697 else scaled_csv(n_rows, directory)
+            store = os.path.join(directory, f'store_{n_rows}.cols')
+
+            csv_time, df = timed(lambda: load_csv(path))
+            import_time, _ = timed(lambda: import_csv(path, store))
+            frame_time, frame = timed(lambda: read_frame(store))
+            columns_time, columns = timed(lambda: read_columns(store))
+
+            assert (frame['timestamp'] == df['timestamp']).all()
+            assert np.array_equal(columns['co2'], df['co2'].to_numpy())
+            print(f"{n_rows:>10} {csv_time:>18.4f} {import_time:>9.4f} "
+                  f"{frame_time:>15.4f} {columns_time:>17.4f}")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
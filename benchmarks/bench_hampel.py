@@ -0,0 +1,77 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from realtime_cleaning import RealTimeHampelFilter, MultiChannelHampelFilter
+
+WINDOW_SIZES = [10, 30, 100, 300, 1000]
+DEVICE_COUNTS = [1, 10, 100, 1000]
+
+def reference_filter(hampel, co2, temperature, humidity):
+    """Original per-reading path: np.array + np.median + median_abs_deviation"""
+    hampel.co2_window.append(co2)
+    hampel.temp_window.append(temperature)
+    hampel.humidity_window.append(humidity)
+    return (hampel.hampel_filter_point(co2, hampel.co2_window),
+            hampel.hampel_filter_point(temperature, hampel.temp_window),
+            hampel.hampel_filter_point(humidity, hampel.humidity_window))
+
+def make_readings(n, seed=0):
+    """Random-walk readings with occasional spikes"""
+    rng = np.random.default_rng(seed)
+    co2 = 700 + np.cumsum(rng.normal(0, 2, n))
+    temperature = 22 + np.cumsum(rng.normal(0, 0.01, n))
+    humidity = 48 + np.cumsum(rng.normal(0, 0.05, n))
+    spikes = rng.random(n) < 0.01
+    co2[spikes] += rng.normal(0, 200, spikes.sum())
+    return list(zip(co2.tolist(), temperature.tolist(), humidity.tolist()))
+
+def time_filter(step, hampel, readings):
+    start = time.perf_counter()
+    outputs = [step(hampel, *reading) for reading in readings]
+    return (time.perf_counter() - start) / len(readings), outputs
+
+def bench_multichannel(window_size=10, ticks=200):
+    """Per-tick cost of cleaning every device: one filter per device vs one batched call"""
+    print(f"\nMulti-channel, window {window_size}")
+    print(f"{'devices':>8} {'per-device ms/tick':>19} {'batched ms/tick':>16} {'channels/s':>12}")
+    for n_devices in DEVICE_COUNTS:
+        rng = np.random.default_rng(n_devices)
+        ticks_data = 700 + rng.normal(0, 5, (ticks, n_devices, 3))
+
+        filters = [RealTimeHampelFilter(window_size) for _ in range(n_devices)]
+        start = time.perf_counter()
+        for tick in ticks_data:
+            for hampel, reading in zip(filters, tick.tolist()):
+                hampel.process_reading(*reading)
+        loop_time = (time.perf_counter() - start) / ticks
+
+        batched = MultiChannelHampelFilter(n_devices * 3, window_size)
+        start = time.perf_counter()
+        for tick in ticks_data:
+            batched.process_batch(tick)
+        batch_time = (time.perf_counter() - start) / ticks
+
+        print(f"{n_devices:>8} {loop_time * 1e3:>19.3f} {batch_time * 1e3:>16.3f} "
+              f"{n_devices * 3 / batch_time:>12.0f}")
+
+def main():
+    print(f"{'window':>8} {'reference us/sample':>20} {'incremental us/sample':>22} {'speedup':>8}")
+    for window_size in WINDOW_SIZES:
+        readings = make_readings(max(5000, 5 * window_size))
+
+        ref_time, ref_out = time_filter(reference_filter,
+                                        RealTimeHampelFilter(window_size), readings)
+        inc_time, inc_out = time_filter(RealTimeHampelFilter.process_reading,
+                                        RealTimeHampelFilter(window_size), readings)
+        assert ref_out == inc_out, f"outputs differ for window_size={window_size}"
+
+        print(f"{window_size:>8} {ref_time * 1e6:>20.1f} {inc_time * 1e6:>22.1f} "
+              f"{ref_time / inc_time:>7.1f}x")
+
+    bench_multichannel()
+
+if __name__ == "__main__":
+    main()
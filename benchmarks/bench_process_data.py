@@ -0,0 +1,57 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from process_data import rolling_hampel
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), '..', 'cleaned_data', 'worm_cleaned.csv')
+# The reference Python loop is only run up to this many rows
+REFERENCE_MAX_ROWS = 100_000
+
+def scaled_series(values, n_rows):
+    """Tile the recorded series up to n_rows, shifting each copy so tiles stay distinct"""
+    reps = -(-n_rows // len(values))
+    tiles = np.tile(values, reps)[:n_rows]
+    tiles += np.repeat(np.arange(reps) * 0.001, len(values))[:n_rows]
+    return tiles
+
+def streaming_reference(values, window_size=10, n_sigmas=3):
+    """RealTimeHampelFilter's rules applied one point at a time"""
+    from realtime_cleaning import RealTimeHampelFilter
+    channel = RealTimeHampelFilter(window_size, n_sigmas).co2
+    return np.array([channel.filter(value) for value in values.tolist()])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch rolling Hampel kernel")
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[11_697, 1_000_000, 10_000_000],
+                        help="row counts to test (e.g. add 100000000 on a machine with ~4 GB free)")
+    parser.add_argument('--window', type=int, default=10)
+    args = parser.parse_args()
+
+    co2 = pd.read_csv(DATA_FILE)['co2'].to_numpy(dtype=float)
+
+    print(f"{'rows':>12} {'kernel s':>10} {'rows/s':>12} {'reference s':>12} {'match':>6}")
+    for n_rows in args.rows:
+        values = scaled_series(co2, n_rows)
+
+        start = time.perf_counter()
+        cleaned = rolling_hampel(values, args.window)
+        kernel_time = time.perf_counter() - start
+
+        ref_time, match = float('nan'), '-'
+        if n_rows <= REFERENCE_MAX_ROWS:
+            start = time.perf_counter()
+            expected = streaming_reference(values, args.window)
+            ref_time = time.perf_counter() - start
+            match = 'yes' if np.array_equal(cleaned, expected, equal_nan=True) else 'NO'
+
+        print(f"{n_rows:>12} {kernel_time:>10.3f} {n_rows / kernel_time:>12.0f} "
+              f"{ref_time:>12.3f} {match:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC_DIR)
+from cli import COMMANDS
+
+HEAVY_MODULES = ['numpy', 'pandas', 'scipy', 'matplotlib', 'seaborn', 'serial']
+
+def cold_start(code, repeat):
+    """Best wall time of a fresh interpreter running code, plus the heavy modules it loaded"""
+    probe = (f"import sys; sys.path.insert(0, {SRC_DIR!r}); {code}; "
+             f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    best, loaded = float('inf'), ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True,
+                             check=True)
+        best = min(best, time.perf_counter() - start)
+        loaded = out.stdout.strip()
+    return best, loaded
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of each CLI subcommand")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Interpreter start-up alone, then the CLI parser, then each tool's imports
+    cases = [('python', 'pass'),
+             ('cli.py --help', 'import cli; cli.build_parser()')]
+    for command, tools in COMMANDS.items():
+        for tool, (module, _) in tools.items():
+            cases.append((f'{command} {tool}', f'import {module}'))
+
+    baseline = None
+    print(f"{'subcommand':<20} {'cold start':>10} {'vs python':>10}  heavy imports")
+    for name, code in cases:
+        seconds, loaded = cold_start(code, args.repeat)
+        baseline = seconds if baseline is None else baseline
+        print(f"{name:<20} {seconds * 1000:>8.0f}ms {(seconds - baseline) * 1000:>+8.0f}ms  "
+              f"{loaded or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""Time the src/ hot paths on synthetic data and save the results as JSON
+
+    python benchmarks/bench_suite.py                      # 10k, 1M and 100M rows
+    python benchmarks/bench_suite.py --sizes 10k 1M --compare benchmarks/results/<old>.json
+
+Datasets come from synthetic.py and are cached under --data-dir. Rows are
+split over devices (1M rows, ~174 days, per device at most) and every
+benchmark runs the way the scripts do: per device, or per worm/no-worm
+device pair. A benchmark stops once it has used --budget seconds and its
+time is extrapolated to the full size ("extrapolated": true in the JSON),
+so per-sample Python paths can't hold a 100M run hostage.
+
+Only compare results from the same machine; on a shared or throttled
+box raise --threshold, the 10k timings move by 10-20% between runs.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+from synthetic import load_device, open_dataset
+
+SIZES = {'10k': 10_000, '1M': 1_000_000, '100M': 100_000_000}
+ROWS_PER_DEVICE = 1_000_000
+SENSORS = ['co2', 'temperature', 'humidity']
+CHUNK = 10_000  # Samples per timed unit in per-sample loops
+
+def devices_for(n_rows):
+    return max(2, -(-n_rows // ROWS_PER_DEVICE))
+
+def pairs(directory, manifest):
+    """(worm_df, withoutworm_df, rows) for consecutive worm/no-worm devices"""
+    devices = manifest['devices']
+    for worm, without in zip(devices[0::2], devices[1::2]):
+        yield (load_device(directory, worm), load_device(directory, without),
+               worm['rows'] + without['rows'])
+
+def frames(directory, manifest):
+    for device in manifest['devices']:
+        yield load_device(directory, device), device['rows']
+
+# Each benchmark yields (work, rows) units; only work() is timed
+
+def hampel_filter(directory, manifest):
+    from process_data import hampel_filter
+    for df, rows in frames(directory, manifest):
+        columns = [df[sensor].to_numpy() for sensor in SENSORS]
+        yield (lambda columns=columns: [hampel_filter(values) for values in columns]), rows
+
+def realtime_hampel(directory, manifest):
+    from realtime_cleaning import RealTimeHampelFilter
+    for df, rows in frames(directory, manifest):
+        hampel = RealTimeHampelFilter(window_size=10, n_sigmas=3)
+        readings = list(zip(df['co2'].tolist(), df['temperature'].tolist(),
+                            df['humidity'].tolist()))
+        for start in range(0, rows, CHUNK):
+            chunk = readings[start:start + CHUNK]
+            yield ((lambda chunk=chunk, hampel=hampel: [hampel.process_reading(*r) for r in chunk]),
+                   len(chunk))
+
+def env_changes(directory, manifest):
+    from analyze_env_changes import analyze_env_changes
+    for df, rows in frames(directory, manifest):
+        frame = df[['timestamp', 'temperature', 'humidity']].copy()
+        yield (lambda frame=frame: analyze_env_changes(frame)), rows
+
+def window_rates(directory, manifest):
+    from analyze_windows import calculate_window_rates
+    for df, rows in frames(directory, manifest):
+        yield (lambda df=df: [calculate_window_rates(df, sensor) for sensor in SENSORS]), rows
+
+def evaluate_detector(directory, manifest):
+    from insect_detection import InsectDetector, evaluate_detector
+    for worm_df, withoutworm_df, rows in pairs(directory, manifest):
+        yield ((lambda worm_df=worm_df, withoutworm_df=withoutworm_df:
+                evaluate_detector(InsectDetector(), worm_df, withoutworm_df)), rows)
+
+def fan_windows(directory, manifest):
+    from fan_detection import FanDetector
+    from windowing import timestamps_ns, window_bounds
+    detector = FanDetector()
+    for df, rows in frames(directory, manifest):
+        _, lo, hi = window_bounds(timestamps_ns(df['timestamp']), '30min')
+        windows = [(a, b) for a, b in zip(lo.tolist(), hi.tolist()) if b > a]
+        per_unit = 100
+        for start in range(0, len(windows), per_unit):
+            unit = windows[start:start + per_unit]
+            work = lambda unit=unit, df=df: [detector.analyze_window(df.iloc[a:b]) for a, b in unit]
+            yield work, sum(b - a for a, b in unit)
+
+def comparison_plots(directory, manifest):
+    from visualize import create_comparison_plots
+    for worm_df, withoutworm_df, rows in pairs(directory, manifest):
+        def work(worm_df=worm_df, withoutworm_df=withoutworm_df):
+            fig = create_comparison_plots(worm_df, withoutworm_df)
+            fig.canvas.draw()
+            plt.close(fig)
+        yield work, rows
+
+BENCHMARKS = {
+    'process_data.hampel_filter': hampel_filter,
+    'RealTimeHampelFilter.process_reading': realtime_hampel,
+    'analyze_env_changes': env_changes,
+    'calculate_window_rates': window_rates,
+    'evaluate_detector': evaluate_detector,
+    'FanDetector.analyze_window': fan_windows,
+    'create_comparison_plots': comparison_plots,
+}
+
+def timed(work):
+    """Seconds work() takes, with the garbage collector off as in timeit"""
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        work()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def run_benchmark(units, total_rows, budget, min_seconds=2.0, max_repeat=100):
+    """Time units until they are exhausted or budget seconds are spent
+
+    Runs shorter than min_seconds are repeated until about min_seconds
+    have been spent and the fastest is kept, so millisecond timings
+    aren't mostly noise.
+    """
+    measured, rows, done = 0.0, 0, []
+    for work, n in units:
+        measured += timed(work)
+        rows += n
+        if measured >= budget and rows < total_rows:
+            break
+        if measured < min_seconds:
+            done.append(work)
+        else:
+            done = None
+    if done:
+        for _ in range(min(max_repeat, int(min_seconds / max(measured, 1e-6)))):
+            measured = min(measured, sum(timed(work) for work in done))
+    rows = max(rows, 1)
+    seconds = measured * total_rows / rows
+    return {
+        'seconds': seconds,
+        'rows_per_sec': total_rows / seconds if seconds else float('inf'),
+        'measured_seconds': measured,
+        'rows_measured': rows,
+        'extrapolated': rows < total_rows,
+    }
+
+def git_version():
+    try:
+        out = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=BENCH_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def environment():
+    import scipy
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scipy': scipy.__version__,
+        'matplotlib': matplotlib.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+def compare(results, previous_path, threshold):
+    """Print time ratios against an earlier results file; flag slowdowns"""
+    with open(previous_path) as f:
+        previous = json.load(f)
+    old = {(r['size'], r['benchmark']): r for r in previous['results']}
+    print(f"\nAgainst {previous['version']} ({previous['created']}):")
+    for r in results:
+        before = old.get((r['size'], r['benchmark']))
+        if before is None:
+            continue
+        ratio = r['seconds'] / before['seconds'] if before['seconds'] else float('inf')
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{r['size']:>5} {r['benchmark']:<38} {ratio:>6.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every src/ hot path on synthetic data")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument('--budget', type=float, default=60.0,
+                        help="seconds per benchmark and size before extrapolating")
+    parser.add_argument('--data-dir', default=os.path.join(BENCH_DIR, 'data'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help="JSON file (default: benchmarks/results/<time>-<version>.json)")
+    parser.add_argument('--compare', default=None, help="earlier results JSON to compare with")
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help="time ratio above which --compare flags a regression")
+    args = parser.parse_args()
+
+    version = git_version()
+    created = datetime.now(timezone.utc)
+    results = []
+    print(f"{'size':>5} {'benchmark':<38} {'seconds':>10} {'rows/s':>14} {'measured':>9}")
+    for size in args.sizes:
+        n_rows = SIZES[size]
+        directory = os.path.join(args.data_dir, f'{size}-seed{args.seed}')
+        manifest = open_dataset(directory, n_rows, devices_for(n_rows), args.seed)
+        for name in args.benchmarks:
+            result = run_benchmark(BENCHMARKS[name](directory, manifest), n_rows, args.budget)
+            result.update(size=size, rows=n_rows, devices=len(manifest['devices']),
+                          benchmark=name)
+            results.append(result)
+            note = f"{result['rows_measured'] / n_rows:.0%}" if result['extrapolated'] else 'all'
+            print(f"{size:>5} {name:<38} {result['seconds']:>10.3f} "
+                  f"{result['rows_per_sec']:>14,.0f} {note:>9}")
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f"{created:%Y%m%d-%H%M%S}-{version}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'version': version, 'created': created.isoformat(),
+                   'environment': environment(), 'budget': args.budget,
+                   'results': results}, f, indent=2)
+    print(f"\nSaved {output}")
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from wal import WriteAheadLog
+
+def readings(n):
+    start = datetime(2025, 5, 24)
+    return [(start + timedelta(seconds=15 * i), 15_000 * i, 800 + i % 50, 22.5, 51.0)
+            for i in range(n)]
+
+def csv_per_row(directory, samples, fsync):
+    """The old trans.py path: open the day's CSV, append one row, close"""
+    path = os.path.join(directory, 'rows.csv')
+    for current_time, _, co2, temperature, humidity in samples:
+        with open(path, 'a', newline='') as f:
+            csv.writer(f).writerow([current_time.strftime("%Y-%m-%d_%H-%M-%S"),
+                                    co2, temperature, humidity])
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+def wal_policy(directory, samples, commit_every, commit_interval, fsync):
+    wal = WriteAheadLog(os.path.join(directory, 'wal'), commit_every=commit_every,
+                        commit_interval=commit_interval, fsync=fsync)
+    if commit_interval is not None:
+        wal.start()
+    for sample in samples:
+        wal.append(*sample)
+    wal.close()
+    return wal.stats['commits']
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest samples/sec under different commit policies")
+    parser.add_argument('--samples', type=int, default=20_000)
+    parser.add_argument('--dir', default=None, help="where to write (e.g. on the SD card)")
+    args = parser.parse_args()
+
+    samples = readings(args.samples)
+    policies = [
+        ('csv open() per row', lambda d: csv_per_row(d, samples, fsync=False)),
+        ('csv fsync per row', lambda d: csv_per_row(d, samples, fsync=True)),
+        ('wal fsync per sample', lambda d: wal_policy(d, samples, 1, None, True)),
+        ('wal group 8', lambda d: wal_policy(d, samples, 8, None, True)),
+        ('wal group 32', lambda d: wal_policy(d, samples, 32, None, True)),
+        ('wal group 128', lambda d: wal_policy(d, samples, 128, None, True)),
+        ('wal every 10 ms', lambda d: wal_policy(d, samples, 10**9, 0.01, True)),
+        ('wal every 100 ms', lambda d: wal_policy(d, samples, 10**9, 0.1, True)),
+        ('wal no fsync', lambda d: wal_policy(d, samples, 32, None, False)),
+    ]
+
+    print(f"{'policy':<22} {'samples/s':>12} {'commits':>8}")
+    for name, run in policies:
+        directory = tempfile.mkdtemp(dir=args.dir)
+        try:
+            start = time.perf_counter()
+            commits = run(directory)
+            elapsed = time.perf_counter() - start
+            commits = '' if commits is None else commits
+            print(f"{name:<22} {len(samples) / elapsed:>12,.0f} {commits:>8}")
+        finally:
+            shutil.rmtree(directory)
+
+    # Recovery: reopen a log with every sample after the checkpoint and replay it
+    directory = tempfile.mkdtemp(dir=args.dir)
+    try:
+        wal_policy(directory, samples, 128, None, False)
+        start = time.perf_counter()
+        wal = WriteAheadLog(os.path.join(directory, 'wal'))
+        replayed = sum(1 for _ in wal.replay())
+        elapsed = time.perf_counter() - start
+        print(f"\nRecovery: opened and replayed {replayed:,} samples in {elapsed * 1000:.1f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
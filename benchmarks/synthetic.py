@@ -0,0 +1,139 @@
+"""Synthetic grain-bin sensor data for benchmarks
+
+    python benchmarks/synthetic.py --rows 1000000 --devices 4 --output benchmarks/data/1M
+
+Each device gets a cleaned-data style frame (timestamp, timestamp_ms, co2,
+temperature, humidity) sampled every 15 s, written as a data_store column
+store so benchmarks load it with mmap instead of parsing CSV. Half the
+devices hold worms. The signal has:
+- diurnal temperature and (anti-correlated) humidity cycles, plus a slow
+  seasonal drift over the months covered;
+- CO2 from respiration: a baseline that worms raise, following temperature
+  and a slow random walk, and drawn down while the fan runs;
+- fan events (about two a day, 10-40 min) stepping temperature, humidity
+  and CO2, which is what FanDetector looks for;
+- isolated spikes (0.1% of samples) for the Hampel filters to remove;
+- device reboots every few days, which reset timestamp_ms (device uptime).
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from data_store import read_frame, write_columns
+
+INTERVAL_MS = 15_000
+DAY_S = 86_400
+MANIFEST = 'dataset.json'
+
+def _ar1(rng, n, phi, scale):
+    """AR(1) noise: x[i] = phi * x[i-1] + e[i]"""
+    return lfilter([1.0], [1.0, -phi], rng.normal(0.0, scale, n))
+
+def _fan_mask(rng, t_s, per_day=2.0, min_s=600, max_s=2400):
+    """Boolean mask of samples while a fan event is running"""
+    span = t_s[-1] - t_s[0] if len(t_s) else 0
+    n_events = rng.poisson(per_day * span / DAY_S) if span else 0
+    starts = rng.uniform(t_s[0], t_s[-1], n_events) if n_events else np.empty(0)
+    ends = starts + rng.uniform(min_s, max_s, n_events)
+    # +1 at each start, -1 at each end: running count > 0 while any fan is on
+    edges = np.zeros(len(t_s) + 1)
+    np.add.at(edges, np.searchsorted(t_s, starts), 1)
+    np.add.at(edges, np.searchsorted(t_s, ends), -1)
+    return np.cumsum(edges)[:-1] > 0
+
+def generate_device(n_rows, seed=0, worms=True, start='2025-01-01', interval_ms=INTERVAL_MS):
+    """One device's readings as a cleaned-data style DataFrame"""
+    rng = np.random.default_rng(seed)
+    # Wall clock: a fixed interval with a little jitter, kept increasing
+    offsets_ms = np.arange(n_rows, dtype=np.int64) * interval_ms
+    offsets_ms += rng.integers(-20, 21, n_rows)
+    t_s = offsets_ms / 1000.0
+    hour = (t_s / 3600.0) % 24
+    diurnal = np.sin(2 * np.pi * (hour - 9) / 24)
+    seasonal = np.sin(2 * np.pi * t_s / (365 * DAY_S))
+    fan = _fan_mask(rng, t_s)
+
+    temperature = (22.5 + rng.uniform(-1, 1) + 1.5 * diurnal + 3.0 * seasonal
+                   + _ar1(rng, n_rows, 0.995, 0.01) - 0.8 * fan)
+    humidity = (50.0 + rng.uniform(-3, 3) - 3.0 * diurnal - 2.0 * seasonal
+                + _ar1(rng, n_rows, 0.99, 0.05) - 5.0 * fan)
+    respiration = (150.0 + 20.0 * (temperature - 22.5) + np.cumsum(rng.normal(0, 0.05, n_rows))
+                   if worms else 40.0 + 5.0 * (temperature - 22.5))
+    co2 = np.round(600.0 + respiration + _ar1(rng, n_rows, 0.9, 3.0) - 150.0 * fan)
+
+    # Isolated spikes the Hampel filter should remove
+    for values, size in ((co2, 300.0), (temperature, 5.0), (humidity, 15.0)):
+        spikes = rng.random(n_rows) < 0.001
+        values[spikes] += rng.choice([-size, size], spikes.sum())
+
+    # Device uptime restarts at 0 after each reboot (every few days)
+    reboots = np.flatnonzero(rng.random(n_rows) < interval_ms / (4 * DAY_S * 1000))
+    boot = np.zeros(n_rows, dtype=np.int64)
+    boot[reboots] = offsets_ms[reboots]
+    boot = np.maximum.accumulate(boot)
+    timestamp_ms = offsets_ms - boot + 100_000
+
+    timestamp = pd.Timestamp(start, tz='UTC') + pd.to_timedelta(offsets_ms, unit='ms')
+    return pd.DataFrame({
+        'timestamp': timestamp.as_unit('ns'),
+        'timestamp_ms': timestamp_ms,
+        'co2': co2,
+        'temperature': np.round(temperature, 2),
+        'humidity': np.round(humidity, 2),
+    })
+
+def write_dataset(directory, n_rows, n_devices, seed=0, start='2025-01-01'):
+    """Generate n_rows split over n_devices into directory; returns the manifest"""
+    os.makedirs(directory, exist_ok=True)
+    devices = []
+    per_device = -(-n_rows // n_devices)
+    for i in range(n_devices):
+        rows = min(per_device, n_rows - i * per_device)
+        name = f'device{i:03d}'
+        worms = i % 2 == 0
+        df = generate_device(rows, seed=seed * 100_003 + i, worms=worms, start=start)
+        write_columns(df, os.path.join(directory, f'{name}.cols'))
+        devices.append({'name': name, 'worms': worms, 'rows': rows})
+    manifest = {'rows': n_rows, 'devices': devices, 'seed': seed, 'start': start}
+    # Manifest last: a directory without one is treated as missing
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def open_dataset(directory, n_rows, n_devices, seed=0, regenerate=False):
+    """Manifest of the dataset in directory, generating it first if needed"""
+    path = os.path.join(directory, MANIFEST)
+    if os.path.exists(path) and not regenerate:
+        with open(path) as f:
+            manifest = json.load(f)
+        if (manifest['rows'] == n_rows and len(manifest['devices']) == n_devices and
+                manifest['seed'] == seed):
+            return manifest
+    return write_dataset(directory, n_rows, n_devices, seed)
+
+def load_device(directory, device):
+    """A device's frame (columns memory-mapped from its column store)"""
+    return read_frame(os.path.join(directory, f"{device['name']}.cols"))
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic multi-device sensor data")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="total rows over all devices")
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', default='2025-01-01')
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(__file__), 'data', 'synthetic'))
+    args = parser.parse_args()
+
+    manifest = write_dataset(args.output, args.rows, args.devices, args.seed, args.start)
+    days = manifest['devices'][0]['rows'] * INTERVAL_MS / 1000 / DAY_S
+    print(f"Wrote {args.rows:,} rows over {args.devices} devices "
+          f"({days:.0f} days each) to {args.output}")
+
+if __name__ == "__main__":
+    main()
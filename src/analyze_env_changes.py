@@ -1,34 +1,60 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import os
-from datetime import datetime
 
-def analyze_env_changes(df, window_size='30min'):
+from data_store import load_condition
+from feature_cache import FeatureCache
+from rollups import RollupStore
+from windowing import window_aggregates
+
+def analyze_env_changes(df, window_size='30min', step=None, origin=None):
     """Analyze temperature and humidity changes in 30-minute windows"""
     # Ensure timestamp is datetime
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     
-    # Group data into 30-minute windows
-    window_stats = []
-    for start_time in pd.date_range(df['timestamp'].min(), 
-                                  df['timestamp'].max(), 
-                                  freq=window_size):
-        end_time = start_time + pd.Timedelta(window_size)
-        window = df[(df['timestamp'] >= start_time) & 
-                   (df['timestamp'] < end_time)]
-        
-        if len(window) > 0:
-            stats = {
-                'window_start': start_time,
-                'temp_change': window['temperature'].iloc[-1] - window['temperature'].iloc[0],
-                'humid_change': window['humidity'].iloc[-1] - window['humidity'].iloc[0],
-                'temp_mean': window['temperature'].mean(),
-                'humid_mean': window['humidity'].mean()
-            }
-            window_stats.append(stats)
+    # All windows in one pass (step < window_size gives sliding windows)
+    windows = window_aggregates(df, ['temperature', 'humidity'], size=window_size, step=step,
+                                aggs=('diff', 'mean'), origin=origin)
     
-    return pd.DataFrame(window_stats)
+    return pd.DataFrame({
+        'window_start': windows['window_start'],
+        'temp_change': windows['temperature_diff'],
+        'humid_change': windows['humidity_diff'],
+        'temp_mean': windows['temperature_mean'],
+        'humid_mean': windows['humidity_mean']
+    })
+
+def cached_env_changes(df, window_size='30min', step=None, cache=None):
+    """analyze_env_changes through the feature cache (only new windows after an append)"""
+    cache = cache or FeatureCache()
+    return cache.time_windows(
+        'env_changes', df, ['timestamp', 'temperature', 'humidity'],
+        lambda frame, origin: analyze_env_changes(frame, window_size, step, origin),
+        window_size, step)
+
+def rollup_env_changes(rollups, condition, start=None, end=None):
+    """analyze_env_changes from the 30-minute rollup tier instead of raw samples
+
+    Windows are aligned to clock half-hours (the rollup grid), so this equals
+    analyze_env_changes with origin at the half-hour before the first sample.
+    """
+    windows = rollups.frame(condition, '30min', start, end, sensors=['temperature', 'humidity'])
+    return pd.DataFrame({
+        'window_start': windows['window_start'],
+        'temp_change': windows['temperature_diff'],
+        'humid_change': windows['humidity_diff'],
+        'temp_mean': windows['temperature_mean'],
+        'humid_mean': windows['humidity_mean']
+    })
+
+def env_changes_for(condition, data_dir, cache, rollups=None):
+    """30-minute changes of a condition, from a RollupStore if one is given, else raw samples"""
+    if rollups is not None:
+        if not rollups.has_device(condition):
+            raise FileNotFoundError(f"No rollups of '{condition}' under {rollups.root}")
+        return rollup_env_changes(rollups, condition)
+    return cached_env_changes(load_condition(data_dir, condition), cache=cache)
 
 def plot_changes(results_df, title, export_dir):
     """Create visualization of temperature and humidity changes"""
@@ -53,6 +79,11 @@ def plot_changes(results_df, title, export_dir):
     plt.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Temperature and humidity changes per 30 minutes")
+    parser.add_argument('--rollups', default=None,
+                        help="take the windows from this rollup root (clock-aligned half-hours)")
+    args = parser.parse_args()
+
     # Load data
     data_dir = "cleaned_data"
     export_dir = "pic"
@@ -61,12 +92,12 @@ def main():
     if not os.path.exists(export_dir):
         os.makedirs(export_dir)
     
-    worm_df = pd.read_csv(os.path.join(data_dir, 'worm_cleaned.csv'))
-    withoutworm_df = pd.read_csv(os.path.join(data_dir, 'withoutworm_cleaned.csv'))
-    
-    # Analyze both datasets
-    worm_results = analyze_env_changes(worm_df)
-    noworm_results = analyze_env_changes(withoutworm_df)
+    # Analyze both datasets: raw samples (windows unchanged since the last run
+    # come from the cache), or the rollup tiers with --rollups
+    cache = FeatureCache()
+    rollups = RollupStore(args.rollups, writable=False) if args.rollups else None
+    worm_results = env_changes_for('worm', data_dir, cache, rollups)
+    noworm_results = env_changes_for('withoutworm', data_dir, cache, rollups)
     
     # Print summary statistics
     print("=== With Worms ===")
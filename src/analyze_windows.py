@@ -1,42 +1,64 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 import numpy as np
-from scipy import stats
 
-def calculate_window_rates(df, sensor, window_size=30):
-    """Calculate rate of change for sensor using fixed number of rows"""
+from data_store import load_condition
+from feature_cache import FeatureCache
+from kde import binned_kde
+from windowing import nan_mean_std
+
+def calculate_window_rates_all(df, sensors, window_size=30):
+    """Calculate rate of change for several sensors using fixed number of rows
+
+    All windows of all sensors are computed at once on a (windows, window_size)
+    reshape of each column. Returns a tidy frame with one row per sensor and
+    window, tagged by a 'sensor' column.
+    """
     # Calculate number of complete windows
     n_windows = len(df) // window_size
+    starts = np.arange(n_windows) * window_size
+    ends = starts + window_size - 1
     
-    # Initialize list to store window data
-    window_data_list = []
-    
-    for i in range(n_windows):
-        start_idx = i * window_size
-        end_idx = start_idx + window_size
-        window_data = df.iloc[start_idx:end_idx]
-        
-        # Calculate window statistics
-        window_stats = {
-            'start_time': window_data['timestamp'].iloc[0],
-            'end_time': window_data['timestamp'].iloc[-1],
-            'mean_value': window_data[sensor].mean(),
-            'start_ms': window_data['timestamp_ms'].iloc[0],
-            'end_ms': window_data['timestamp_ms'].iloc[-1],
-            'time_span_ms': window_data['timestamp_ms'].iloc[-1] - window_data['timestamp_ms'].iloc[0],
-            'total_change': window_data[sensor].iloc[-1] - window_data[sensor].iloc[0],
-        }
-        window_data_list.append(window_stats)
-    
-    # Create DataFrame from list of dictionaries
-    window_rates = pd.DataFrame(window_data_list)
+    # Window boundaries shared by every sensor
+    start_ms = df['timestamp_ms'].to_numpy()[starts]
+    end_ms = df['timestamp_ms'].to_numpy()[ends]
+    time_span_ms = end_ms - start_ms
+    start_time = df['timestamp'].iloc[starts].to_numpy()
+    end_time = df['timestamp'].iloc[ends].to_numpy()
     
-    # Calculate rate
-    window_rates['rate'] = window_rates['total_change'] / (window_rates['time_span_ms'] / 1000)
+    frames = []
+    for sensor in sensors:
+        values = df[sensor].to_numpy(dtype=float)[:n_windows * window_size]
+        blocks = values.reshape(n_windows, window_size)
+        total_change = blocks[:, -1] - blocks[:, 0]
+        frames.append(pd.DataFrame({
+            'sensor': sensor,
+            'start_time': start_time,
+            'end_time': end_time,
+            'mean_value': nan_mean_std(blocks)[0],
+            'start_ms': start_ms,
+            'end_ms': end_ms,
+            'time_span_ms': time_span_ms,
+            'total_change': total_change,
+            # Calculate rate
+            'rate': total_change / (time_span_ms / 1000),
+        }))
     
-    return window_rates
+    return pd.concat(frames, ignore_index=True)
+
+def calculate_window_rates(df, sensor, window_size=30):
+    """Calculate rate of change for sensor using fixed number of rows"""
+    rates = calculate_window_rates_all(df, [sensor], window_size)
+    return rates.drop(columns='sensor')
+
+def cached_window_rates_all(df, sensors, window_size=30, cache=None):
+    """calculate_window_rates_all through the feature cache (only new windows after an append)"""
+    cache = cache or FeatureCache()
+    return cache.row_windows(
+        'window_rates', df, ['timestamp', 'timestamp_ms'] + list(sensors),
+        lambda frame: calculate_window_rates_all(frame, sensors, window_size),
+        window_size, group_col='sensor', params={'sensors': list(sensors)})
 
 def analyze_window_stats(window_rates, title):
     """Calculate statistics for window-based rates"""
@@ -71,9 +93,10 @@ def plot_window_comparison(worm_windows, withoutworm_windows, sensor, export_dir
     ax1.grid(True)
     ax1.legend()
     
-    # Rate distribution
-    sns.kdeplot(data=worm_windows['rate'], ax=ax2, label='With Worm', color='blue')
-    sns.kdeplot(data=withoutworm_windows['rate'], ax=ax2, label='Without Worm', color='red')
+    # Rate distribution (binned FFT KDE, linear in the number of windows)
+    ax2.plot(*binned_kde(worm_windows['rate']), label='With Worm', color='blue')
+    ax2.plot(*binned_kde(withoutworm_windows['rate']), label='Without Worm', color='red')
+    ax2.set_ylabel('Density')
     ax2.set_title(f'{sensor} Rate Distribution (30-min windows)')
     ax2.set_xlabel('Rate of Change per Second')
     ax2.grid(True)
@@ -81,7 +104,7 @@ def plot_window_comparison(worm_windows, withoutworm_windows, sensor, export_dir
     
     # Box plot
     box_data = [worm_windows['rate'], withoutworm_windows['rate']]
-    ax3.boxplot(box_data, labels=['With Worm', 'Without Worm'])
+    ax3.boxplot(box_data, tick_labels=['With Worm', 'Without Worm'])
     ax3.set_title(f'{sensor} Rate Comparison (30-min windows)')
     ax3.set_ylabel('Rate of Change per Second')
     ax3.grid(True)
@@ -95,8 +118,13 @@ def main():
     sensors = ['co2', 'temperature', 'humidity']
     
     # Read data
-    worm_df = pd.read_csv(os.path.join(export_dir, 'worm_cleaned.csv'))
-    withoutworm_df = pd.read_csv(os.path.join(export_dir, 'withoutworm_cleaned.csv'))
+    worm_df = load_condition(export_dir, 'worm')
+    withoutworm_df = load_condition(export_dir, 'withoutworm')
+    
+    # Window rates for every sensor in one pass, reused from the cache when unchanged
+    cache = FeatureCache()
+    worm_rates = cached_window_rates_all(worm_df, sensors, cache=cache)
+    withoutworm_rates = cached_window_rates_all(withoutworm_df, sensors, cache=cache)
     
     # Analyze each sensor
     for sensor in sensors:
@@ -104,15 +132,17 @@ def main():
         print(f"Analyzing {sensor.upper()} (30-row windows)")
         print(f"{'='*50}")
         
-        # Calculate window-based rates
-        worm_windows = calculate_window_rates(worm_df, sensor)
-        withoutworm_windows = calculate_window_rates(withoutworm_df, sensor)
+        # Window-based rates for this sensor
+        worm_windows = worm_rates[worm_rates['sensor'] == sensor].reset_index(drop=True)
+        withoutworm_windows = withoutworm_rates[
+            withoutworm_rates['sensor'] == sensor].reset_index(drop=True)
         
         # Analyze window statistics
         worm_stats = analyze_window_stats(worm_windows, f"{sensor} With Worm")
         withoutworm_stats = analyze_window_stats(withoutworm_windows, f"{sensor} Without Worm")
         
         # Perform statistical test on window rates
+        from scipy import stats
         t_stat, p_value = stats.ttest_ind(
             worm_windows['rate'].dropna(),
             withoutworm_windows['rate'].dropna()
@@ -0,0 +1,79 @@
+import argparse
+import importlib
+import sys
+
+# Subcommand -> {tool: (module whose main() runs, help)}; the first tool is the default.
+# Modules are imported only once a subcommand is chosen, so `cli.py ingest` never
+# loads pandas/matplotlib/scipy and `--help` loads nothing beyond argparse.
+COMMANDS = {
+    'ingest': {
+        'serial': ('trans', "one serial port to daily CSVs and Firestore"),
+        'multi': ('collector', "many devices (or --simulate N) through one selector loop"),
+        'replay': ('replay', "load-test ingestion + detection with virtual devices"),
+    },
+    'clean': {
+        'live': ('realtime_cleaning', "Hampel-filter readings from a serial port"),
+        'batch': ('process_data', "clean the merged exports into *_cleaned.csv"),
+    },
+    'detect': {
+        'insects': ('insect_detection', "evaluate the CO2 insect detector"),
+        'fans': ('fan_detection', "fan/ventilation on-off transitions"),
+        'tune': ('tune_detector', "grid-search insect detector thresholds"),
+    },
+    'analyze': {
+        'env': ('analyze_env_changes', "30-minute temperature/humidity changes"),
+        'windows': ('analyze_windows', "30-row window rates and t-tests"),
+        'merge': ('merge_data', "merge per-sensor daily CSVs"),
+    },
+    'store': {
+        'segments': ('segment_store', "import, compact and query the time-partitioned store"),
+        'rollups': ('rollups', "backfill and query the 1 min - 1 h rollup tiers"),
+    },
+    'plot': {
+        'report': ('report', "every figure, in parallel, into pic/"),
+        'comparison': ('visualize', "sensor comparison figure and change statistics"),
+    },
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description="Sensor pipeline tools",
+        epilog="Arguments after the tool name are passed to it, e.g. "
+               "`cli.py plot report --force` or `cli.py clean live --port /dev/ttyUSB0`.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for command, tools in COMMANDS.items():
+        lines = [f"  {tool:<10} {help_text}" for tool, (_, help_text) in tools.items()]
+        sub = subparsers.add_parser(command, formatter_class=argparse.RawDescriptionHelpFormatter,
+                                    description="tools:\n" + "\n".join(lines))
+        sub.add_argument('tool', nargs='?', choices=list(tools), default=next(iter(tools)))
+        sub.add_argument('args', nargs=argparse.REMAINDER, help="arguments for the tool")
+    return parser
+
+def module_for(command, tool=None):
+    tools = COMMANDS[command]
+    return tools[tool or next(iter(tools))][0]
+
+def split_argv(argv):
+    """(command [tool], tool arguments)
+
+    Everything after the command and an optional tool name belongs to the
+    tool, so `cli.py plot --force` reaches the default tool instead of
+    tripping argparse. A bare -h/--help after the command shows its tools.
+    """
+    if not argv or argv[0] not in COMMANDS:
+        return argv, []
+    head, rest = argv[:1], argv[1:]
+    if rest and (rest[0] in COMMANDS[argv[0]] or rest[0] in ('-h', '--help')):
+        head.append(rest.pop(0))
+    return head, rest
+
+def main(argv=None):
+    head, tool_args = split_argv(sys.argv[1:] if argv is None else list(argv))
+    args = build_parser().parse_args(head)
+    module = importlib.import_module(module_for(args.command, args.tool))
+    # Tools parse sys.argv themselves; hand them only their own arguments
+    sys.argv = [f'{module.__name__}.py'] + args.args + tool_args
+    return module.main()
+
+if __name__ == "__main__":
+    main()
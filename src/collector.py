@@ -0,0 +1,183 @@
+import argparse
+import os
+import selectors
+import threading
+import time
+from datetime import datetime
+
+from realtime_cleaning import RealTimeHampelFilter
+from ingestion import DailyCSVWriter, parse_sensor_line
+from metrics import DeviceMetrics
+from fake_serial import load_daily_readings, replay_clock
+
+OUTPUT_HEADER = ["timestamp", "device_id", "timestamp_ms", "co2", "temperature", "humidity"]
+
+# Device id -> serial port, one entry per grain bin on this gateway
+PORTS = {
+    'bin01': '/dev/ttyUSB0',
+}
+BAUDRATE = 115200
+
+class Device:
+    """One sensor device: a readable file descriptor plus its own filter state"""
+    def __init__(self, device_id, fd, window_size=10, n_sigmas=3, handle=None):
+        self.device_id = device_id
+        self.fd = fd
+        self.handle = handle  # Keeps the owning object (e.g. serial.Serial) alive
+        self.buffer = b''
+        self.hampel = RealTimeHampelFilter(window_size=window_size, n_sigmas=n_sigmas)
+        self.metrics = DeviceMetrics(device_id)
+
+    def read_lines(self):
+        """Read whatever is available and return the complete lines"""
+        try:
+            chunk = os.read(self.fd, 4096)
+        except BlockingIOError:
+            return []
+        except OSError:
+            # A pty whose other end has closed reports EIO instead of end of file
+            chunk = b''
+        if not chunk:
+            raise EOFError(self.device_id)
+        self.metrics.bytes_read += len(chunk)
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split(b'\n')
+        return lines
+
+class Collector:
+    """Read many serial devices concurrently with a single selector loop"""
+    def __init__(self, devices, writer):
+        self.all_devices = list(devices)
+        self.devices = {device.fd: device for device in devices}
+        self.writer = writer
+        self.selector = selectors.DefaultSelector()
+        for device in devices:
+            os.set_blocking(device.fd, False)
+            self.selector.register(device.fd, selectors.EVENT_READ, device)
+
+    def handle(self, device):
+        received_at = time.monotonic()
+        try:
+            lines = device.read_lines()
+        except EOFError:
+            # Unplugged or closed: the device is not reopened, so say so
+            self.selector.unregister(device.fd)
+            del self.devices[device.fd]
+            device.metrics.disconnects += 1
+            print(f"{device.device_id}: disconnected after {device.metrics.samples} samples")
+            return
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                reading = parse_sensor_line(line.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError):
+                device.metrics.parse_errors += 1
+                continue
+            timestamp_ms, co2, temperature, humidity = reading
+
+            cleaned_co2, cleaned_temp, cleaned_humidity = device.hampel.process_reading(
+                co2, temperature, humidity
+            )
+            current_time = datetime.utcnow()
+            self.writer.write(current_time, [
+                current_time.strftime("%Y-%m-%d_%H-%M-%S"), device.device_id, timestamp_ms,
+                cleaned_co2, cleaned_temp, cleaned_humidity
+            ])
+            device.metrics.record(received_at)
+
+    def run(self, duration=None):
+        """Serve devices until all have closed, or for duration seconds"""
+        deadline = None if duration is None else time.monotonic() + duration
+        while self.devices:
+            timeout = 1.0 if deadline is None else deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            for key, _ in self.selector.select(timeout):
+                self.handle(key.data)
+
+    def summary(self):
+        return [device.metrics.summary() for device in self.all_devices]
+
+def open_serial_devices(ports, window_size=10, n_sigmas=3):
+    """Open real serial ports (POSIX only: the selector needs file descriptors)"""
+    import serial
+    devices = []
+    for device_id, port in ports.items():
+        ser = serial.Serial(port, BAUDRATE, timeout=0)
+        devices.append(Device(device_id, ser.fileno(), window_size, n_sigmas, handle=ser))
+    return devices
+
+class SimulatedDevices:
+    """Pseudo-terminals fed by one thread replaying recorded readings at accelerated speed"""
+    def __init__(self, n_devices, readings, speed=1000.0):
+        import tty  # POSIX only, like the pseudo-terminals themselves
+        self.readings = readings
+        self.speed = speed
+        self.masters = []
+        self.slaves = []
+        for _ in range(n_devices):
+            master, slave = os.openpty()
+            tty.setraw(slave)  # No echo or newline translation
+            self.masters.append(master)
+            self.slaves.append(slave)
+        self.thread = threading.Thread(target=self._feed, daemon=True)
+
+    def _feed(self):
+        start_wall = time.monotonic()
+        for offset_ms, (timestamp_ms, co2, temperature, humidity) in zip(
+                replay_clock(self.readings), self.readings):
+            due = start_wall + offset_ms / 1000 / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            line = f"{timestamp_ms},{co2},{temperature},{humidity}\n".encode('utf-8')
+            for master in self.masters:
+                os.write(master, line)
+        # Closing the master makes the slave side report end of file
+        for master in self.masters:
+            os.close(master)
+
+    def devices(self, window_size=10, n_sigmas=3):
+        return [Device(f"sim{i:03d}", slave, window_size, n_sigmas)
+                for i, slave in enumerate(self.slaves)]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="Collect and clean data from many sensor devices")
+    parser.add_argument('--simulate', type=int, default=0,
+                        help="replay cleaned_data through N simulated devices instead of PORTS")
+    parser.add_argument('--speed', type=float, default=1000.0, help="replay speed-up factor")
+    parser.add_argument('--output', default="collected")
+    parser.add_argument('--duration', type=float, default=None)
+    args = parser.parse_args()
+
+    if args.simulate:
+        readings = load_daily_readings("cleaned_data", "worm")
+        simulated = SimulatedDevices(args.simulate, readings, speed=args.speed)
+        devices = simulated.devices()
+    else:
+        devices = open_serial_devices(PORTS)
+
+    with DailyCSVWriter(args.output, header=OUTPUT_HEADER, flush_rows=1000) as writer:
+        collector = Collector(devices, writer)
+        if args.simulate:
+            simulated.start()
+        print(f"Collecting from {len(devices)} devices...")
+        try:
+            collector.run(args.duration)
+        except KeyboardInterrupt:
+            print("Stopped by user.")
+
+    print("\nPer-device metrics:")
+    for stats in collector.summary():
+        print(f"{stats['device_id']}: {stats['samples']} samples, "
+              f"{stats['samples_per_sec']:.1f} samples/s, "
+              f"lag mean {stats['mean_lag_ms']:.2f} ms / max {stats['max_lag_ms']:.2f} ms, "
+              f"{stats['parse_errors']} parse errors, {stats['disconnects']} disconnects")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# Typed column layout of the cleaned datasets; timestamps are int64 ns since the epoch (UTC)
+CLEANED_DTYPES = {
+    'timestamp': 'int64',
+    'timestamp_ms': 'int64',
+    'co2': 'float64',
+    'temperature': 'float64',
+    'humidity': 'float64',
+}
+STORE_SUFFIX = '.cols'
+
+def store_path_for(csv_path):
+    """worm_cleaned.csv -> worm_cleaned.cols (a directory next to the CSV)"""
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+def write_columns(df, store_path, source=None):
+    """Write a DataFrame as one .npy file per column plus a small JSON manifest"""
+    os.makedirs(store_path, exist_ok=True)
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(values):
+            # Store instants as int64 nanoseconds, normalised to UTC
+            values = pd.to_datetime(values, utc=True).dt.as_unit('ns')
+            array = values.to_numpy(dtype='datetime64[ns]').view('int64')
+            kind = 'datetime'
+        else:
+            array = values.to_numpy(dtype=CLEANED_DTYPES.get(col))
+            kind = 'numeric'
+        np.save(os.path.join(store_path, f'{col}.npy'), array)
+        columns[col] = {'dtype': str(array.dtype), 'kind': kind}
+
+    manifest = {'columns': columns, 'rows': len(df), 'source': source}
+    # Manifest last: a store without one is treated as missing
+    with open(os.path.join(store_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+def read_manifest(store_path):
+    path = os.path.join(store_path, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def read_columns(store_path, columns=None, mmap=True):
+    """Return {column: ndarray}; with mmap the arrays are read-only views of the files"""
+    manifest = read_manifest(store_path)
+    if manifest is None:
+        raise FileNotFoundError(f"No column store at {store_path}")
+    names = list(manifest['columns']) if columns is None else columns
+    return {col: np.load(os.path.join(store_path, f'{col}.npy'),
+                         mmap_mode='r' if mmap else None)
+            for col in names}
+
+def read_frame(store_path, columns=None, mmap=True):
+    """Load a column store as a DataFrame with timestamp as datetime64[ns, UTC]"""
+    manifest = read_manifest(store_path)
+    arrays = read_columns(store_path, columns, mmap)
+    data = {}
+    for col, array in arrays.items():
+        if manifest['columns'][col]['kind'] == 'datetime':
+            data[col] = pd.Series(array.view('datetime64[ns]'), copy=False).dt.tz_localize('UTC')
+        else:
+            data[col] = pd.Series(array, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+def _source_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return {'path': os.path.basename(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def import_csv(csv_path, store_path=None):
+    """Parse a legacy cleaned CSV once and write it as a column store"""
+    store_path = store_path or store_path_for(csv_path)
+    df = pd.read_csv(csv_path)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    write_columns(df, store_path, source=_source_stamp(csv_path))
+    return store_path
+
+def load_cleaned(csv_path, columns=None, mmap=True):
+    """Load a cleaned dataset, going through its column store
+
+    The store next to the CSV is (re)built whenever it is missing or the CSV has
+    changed since it was imported; after that, loads skip CSV and date parsing.
+    If only the store exists (no CSV), it is used as-is.
+    """
+    store_path = store_path_for(csv_path)
+    manifest = read_manifest(store_path)
+    if os.path.exists(csv_path):
+        if manifest is None or manifest.get('source') != _source_stamp(csv_path):
+            import_csv(csv_path, store_path)
+    elif manifest is None:
+        raise FileNotFoundError(csv_path)
+    return read_frame(store_path, columns, mmap)
+
+def load_condition(data_dir, condition, start=None, end=None, store_root=None):
+    """Cleaned readings of one condition ('worm', 'withoutworm', ...), optionally a time range
+
+    From <data_dir>/<condition>_cleaned.csv through its column store, or, when
+    store_root is given, from that segment store (device = condition),
+    touching only the segments and rows in [start, end).
+    """
+    from segment_store import SegmentStore, to_ns
+    if store_root is not None:
+        if not os.path.isdir(os.path.join(store_root, condition)):
+            raise FileNotFoundError(f"No device '{condition}' in segment store {store_root}")
+        return SegmentStore(store_root, writable=False).read_frame(condition, start, end)
+    df = load_cleaned(os.path.join(data_dir, f'{condition}_cleaned.csv'))
+    if start is None and end is None:
+        return df
+    ts_ns = df['timestamp'].array.asi8
+    lo = 0 if start is None else np.searchsorted(ts_ns, to_ns(start), side='left')
+    hi = len(df) if end is None else np.searchsorted(ts_ns, to_ns(end), side='left')
+    return df.iloc[lo:hi].reset_index(drop=True)
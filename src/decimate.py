@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+def _as_numeric(x):
+    """x values as a float/int array; datetimes become int64 nanoseconds"""
+    x = pd.Series(x) if not isinstance(x, (pd.Series, pd.Index, np.ndarray)) else x
+    if isinstance(getattr(x, 'dtype', None), pd.DatetimeTZDtype) or \
+            np.issubdtype(np.asarray(x).dtype, np.datetime64):
+        return pd.DatetimeIndex(x).as_unit('ns').asi8
+    return np.asarray(x, dtype=float)
+
+def _first_match(values, target, segment, lengths):
+    """Index of the first element of each segment equal to that segment's target"""
+    match = np.flatnonzero(values == np.repeat(target, lengths))
+    _, first = np.unique(segment[match], return_index=True)
+    return match[first]
+
+def x_range(xs, margin=0.0):
+    """Numeric (lo, hi) spanning every sorted x in xs, widened by margin * span per side"""
+    firsts, lasts = [], []
+    for x in xs:
+        x = _as_numeric(x)
+        if len(x):
+            firsts.append(x[0])
+            lasts.append(x[-1])
+    if not firsts:
+        return None
+    lo, hi = min(firsts), max(lasts)
+    pad = (hi - lo) * margin
+    return lo - pad, hi + pad
+
+def to_x(value, like):
+    """A numeric x (as from x_range) in like's units: a Timestamp when like holds datetimes"""
+    dtype = getattr(like, 'dtype', None)
+    if isinstance(dtype, pd.DatetimeTZDtype):
+        return pd.Timestamp(int(round(value)), unit='ns', tz=dtype.tz)
+    if dtype is not None and np.issubdtype(dtype, np.datetime64):
+        return pd.Timestamp(int(round(value)), unit='ns')
+    return value
+
+def m4_indices(x, y, n_bins, bounds=None):
+    """Row indices kept by M4 decimation over n_bins equal-width x bins
+
+    For every bin the first, last, minimum and maximum points are kept, so
+    when the bins line up with pixel columns each column keeps the full
+    series' extremes and spikes and dips survive. The bins split bounds
+    (numeric (lo, hi), default the line's own x range); lines sharing an
+    axis should share bounds set to its limits. x must be sorted; NaN values
+    in y are never chosen as min/max.
+    """
+    x = _as_numeric(x)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= 4 * n_bins:
+        return np.arange(n)
+
+    lo, hi = bounds if bounds is not None else (x[0], x[-1])
+    span = hi - lo
+    if span > 0:
+        bins = np.clip(((x - lo) / span * n_bins).astype(np.int64), 0, n_bins - 1)
+    else:
+        bins = np.zeros(n, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    ends = starts + lengths - 1
+    segment = np.repeat(np.arange(len(starts)), lengths)
+
+    nan = np.isnan(y)
+    low = np.where(nan, np.inf, y)
+    high = np.where(nan, -np.inf, y)
+    mins = _first_match(low, np.minimum.reduceat(low, starts), segment, lengths)
+    maxs = _first_match(high, np.maximum.reduceat(high, starts), segment, lengths)
+    return np.unique(np.concatenate([starts, ends, mins, maxs]))
+
+def m4(x, y, n_bins, bounds=None):
+    """Decimated (x, y) keeping first/last/min/max of each of n_bins x bins"""
+    idx = m4_indices(x, y, n_bins, bounds)
+    x = x.iloc[idx] if isinstance(x, pd.Series) else np.asarray(x)[idx]
+    y = y.iloc[idx] if isinstance(y, pd.Series) else np.asarray(y)[idx]
+    return x, y
+
+def axes_pixel_width(ax, dpi=None):
+    """Width of an Axes in output pixels (at dpi, default the figure's)"""
+    fig = ax.get_figure()
+    return max(1, int(ax.get_position().width * fig.get_figwidth() * (dpi or fig.dpi)))
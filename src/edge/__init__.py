@@ -0,0 +1,16 @@
+"""Gateway runtime: Hampel cleaning plus insect and fan detection on plain arrays
+
+Standard library only (array, bisect, math). The one streaming
+implementation: RealTimeHampelFilter, StreamingInsectDetector and
+StreamingFanDetector build on these classes. Same semantics as the
+numpy/scipy Hampel reference and InsectDetector / FanDetector.analyze_window
+over trailing 30-minute windows; tests/test_edge.py checks them on cleaned_data.
+"""
+from .buffers import ArrayQueue, MonotonicQueue
+from .device import EdgeDevice
+from .fan import EdgeFanDetector
+from .hampel import EdgeHampelFilter, HampelChannel
+from .insect import EdgeInsectDetector
+
+__all__ = ['ArrayQueue', 'MonotonicQueue', 'EdgeDevice', 'EdgeFanDetector', 'EdgeHampelFilter',
+           'HampelChannel', 'EdgeInsectDetector']
@@ -0,0 +1,83 @@
+from array import array
+
+class ArrayQueue:
+    """Double-ended queue of machine numbers stored in one array.array
+
+    popleft() only advances a head offset; the consumed prefix is cut off in
+    bulk once it is at least half the array, so every operation is O(1)
+    amortized and a float costs 8 bytes instead of a boxed object.
+    """
+    __slots__ = ('data', 'head')
+
+    def __init__(self, typecode='d'):
+        self.data = array(typecode)
+        self.head = 0
+
+    def __len__(self):
+        return len(self.data) - self.head
+
+    def append(self, value):
+        self.data.append(value)
+
+    def pop(self):
+        return self.data.pop()
+
+    def popleft(self):
+        value = self.data[self.head]
+        self.head += 1
+        if self.head >= 64 and 2 * self.head >= len(self.data):
+            del self.data[:self.head]
+            self.head = 0
+        return value
+
+    def first(self):
+        return self.data[self.head]
+
+    def last(self):
+        return self.data[-1]
+
+    def set_first(self, value):
+        self.data[self.head] = value
+
+    def nbytes(self):
+        return self.data.buffer_info()[1] * self.data.itemsize
+
+class MonotonicQueue:
+    """Sliding-window maximum (or minimum) of indexed values
+
+    Keeps (index, value) pairs with values decreasing (increasing for
+    minimum=True); the front is the extreme of everything not yet evicted.
+    """
+    __slots__ = ('indexes', 'values', 'minimum')
+
+    def __init__(self, minimum=False):
+        self.indexes = ArrayQueue('q')
+        self.values = ArrayQueue('d')
+        self.minimum = minimum
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def push(self, index, value):
+        if self.minimum:
+            while len(self.values) and self.values.last() >= value:
+                self.indexes.pop()
+                self.values.pop()
+        else:
+            while len(self.values) and self.values.last() <= value:
+                self.indexes.pop()
+                self.values.pop()
+        self.indexes.append(index)
+        self.values.append(value)
+
+    def evict_through(self, index):
+        """Drop entries with an index <= index"""
+        while len(self.indexes) and self.indexes.first() <= index:
+            self.indexes.popleft()
+            self.values.popleft()
+
+    def front(self):
+        return self.values.first() if len(self.values) else float('nan')
+
+    def nbytes(self):
+        return self.indexes.nbytes() + self.values.nbytes()
@@ -0,0 +1,26 @@
+from .fan import EdgeFanDetector
+from .hampel import EdgeHampelFilter
+from .insect import EdgeInsectDetector
+
+class EdgeDevice:
+    """Cleaning plus insect and fan detection for one sensor device
+
+    process() takes a raw reading and returns (cleaned, insect_detection,
+    insect_results, fan_transition); detection runs on the cleaned values.
+    """
+    __slots__ = ('hampel', 'insects', 'fan')
+
+    def __init__(self, window_size=10, n_sigmas=3, insect_thresholds=None, fan_thresholds=None):
+        self.hampel = EdgeHampelFilter(window_size, n_sigmas)
+        self.insects = EdgeInsectDetector(thresholds=insect_thresholds)
+        self.fan = EdgeFanDetector(thresholds=fan_thresholds)
+
+    def process(self, timestamp_ms, co2, temperature, humidity):
+        cleaned = self.hampel.process_reading(co2, temperature, humidity)
+        detection, results = self.insects.update(timestamp_ms, cleaned[0])
+        transition = self.fan.update(timestamp_ms, cleaned[1], cleaned[2])
+        return cleaned, detection, results, transition
+
+    def nbytes(self):
+        """Bytes held in buffers (grows with samples per window, not with uptime)"""
+        return self.hampel.nbytes() + self.insects.nbytes() + self.fan.nbytes()
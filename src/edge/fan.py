@@ -0,0 +1,84 @@
+import math
+
+from .buffers import ArrayQueue, MonotonicQueue
+
+# Defaults for FanDetector too
+DEFAULT_THRESHOLDS = {
+    'temp_max_change': 0.4,    # Maximum temperature change between readings
+    'humid_max_change': 2.0,   # Maximum humidity change between readings
+}
+
+class MaxAbsDelta:
+    """Max |x[i] - x[i-1]| over the samples currently in a sliding window
+
+    Each delta belongs to the later of its two samples and leaves the window
+    with the earlier one.
+    """
+    __slots__ = ('last', 'deltas')
+
+    def __init__(self):
+        self.last = math.nan
+        self.deltas = MonotonicQueue()
+
+    def add(self, index, value):
+        delta = abs(value - self.last)
+        if delta == delta:  # NaN deltas (and the first sample) are skipped, like pandas max()
+            self.deltas.push(index, delta)
+        self.last = value
+
+    def evict_through(self, index):
+        """Drop deltas that need a sample with index <= index as their earlier end"""
+        self.deltas.evict_through(index + 1)
+
+class EdgeFanDetector:
+    """FanDetector over the trailing 30 minutes, updated per sample without pandas
+
+    update() returns a transition (timestamp_ms, 'on' | 'off', temp_max_change,
+    humid_max_change) when the fan/ventilation state changes, else None.
+    Matches FanDetector.analyze_window on the trailing slice;
+    StreamingFanDetector builds on it. A timestamp_ms lower than the newest
+    one means the device rebooted: the window starts over, and a fan that
+    was on is reported off unless the new window shows it again.
+    """
+    __slots__ = ('thresholds', 'window_ms', 'timestamps', 'index', 'temp', 'humid', 'fan_on')
+
+    def __init__(self, thresholds=None, window_ms=30 * 60 * 1000):
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self.window_ms = window_ms
+        self.fan_on = False
+        self.reset()
+
+    def reset(self):
+        """Empty the window (a reboot: timestamp_ms went back)"""
+        self.timestamps = ArrayQueue('q')
+        self.index = 0  # Index of the next sample
+        self.temp = MaxAbsDelta()
+        self.humid = MaxAbsDelta()
+
+    def update(self, timestamp_ms, temperature, humidity):
+        timestamp_ms = int(timestamp_ms)
+        if len(self.timestamps) and timestamp_ms < self.timestamps.last():
+            self.reset()
+        index = self.index
+        self.index += 1
+        self.timestamps.append(timestamp_ms)
+        self.temp.add(index, float(temperature))
+        self.humid.add(index, float(humidity))
+
+        # Slide the window: samples older than window_ms leave, with the delta after them
+        while self.timestamps.first() <= timestamp_ms - self.window_ms:
+            self.timestamps.popleft()
+            old_index = self.index - len(self.timestamps) - 1
+            self.temp.evict_through(old_index)
+            self.humid.evict_through(old_index)
+
+        temp_max, humid_max = self.temp.deltas.front(), self.humid.deltas.front()
+        fan_detect = (temp_max > self.thresholds['temp_max_change'] or
+                      humid_max > self.thresholds['humid_max_change'])
+        if fan_detect != self.fan_on:
+            self.fan_on = fan_detect
+            return timestamp_ms, 'on' if fan_detect else 'off', temp_max, humid_max
+        return None
+
+    def nbytes(self):
+        return self.timestamps.nbytes() + self.temp.deltas.nbytes() + self.humid.deltas.nbytes()
@@ -0,0 +1,112 @@
+import math
+from array import array
+from bisect import bisect_left, insort
+
+def kth_smallest_deviation(values, split, center, k):
+    """k-th smallest |x - center| over a sorted sequence, in O(log n)
+
+    values[:split] lie below center and values[split:] at or above it, so the
+    deviations form two sorted runs: center - values[split-1], ... going left
+    and values[split] - center, ... going right. Binary search on how many of
+    the k+1 smallest come from the left run.
+    """
+    n_left = split
+    n_right = len(values) - split
+    lo = max(0, k + 1 - n_right)
+    hi = min(k + 1, n_left)
+    while True:
+        i = (lo + hi) // 2   # Taken from the left run
+        j = k + 1 - i        # Taken from the right run
+        if i < hi and j > 0 and values[split + j - 1] - center > center - values[split - 1 - i]:
+            lo = i + 1
+        elif i > lo and j < n_right and center - values[split - i] > values[split + j] - center:
+            hi = i - 1
+        else:
+            left = center - values[split - i] if i > 0 else -math.inf
+            right = values[split + j - 1] - center if j > 0 else -math.inf
+            return max(left, right)
+
+class HampelChannel:
+    """Hampel filter for one sensor channel over a fixed ring buffer
+
+    Same rule as RealTimeHampelFilter's numpy/scipy reference
+    (hampel_filter_point): once window_size values have arrived,
+    a value further than n_sigmas * MAD from the window median (itself
+    included) is replaced by the median; windows holding NaN pass values
+    through. The ring keeps arrival order, a sorted array gives the median
+    and MAD in O(log w) plus the shift of one insert/delete.
+    """
+    __slots__ = ('window_size', 'n_sigmas', 'ring', 'next', 'count', 'sorted_values',
+                 'nan_count')
+
+    def __init__(self, window_size=10, n_sigmas=3):
+        self.window_size = window_size
+        self.n_sigmas = n_sigmas
+        self.ring = array('d', [0.0] * window_size)
+        self.next = 0       # Ring slot the next value goes to
+        self.count = 0
+        self.sorted_values = array('d')  # Window values minus NaN, sorted
+        self.nan_count = 0
+
+    def filter(self, value):
+        """Add a reading and return it cleaned"""
+        value = float(value)
+        if self.count == self.window_size:
+            oldest = self.ring[self.next]
+            if oldest != oldest:
+                self.nan_count -= 1
+            else:
+                del self.sorted_values[bisect_left(self.sorted_values, oldest)]
+        else:
+            self.count += 1
+        self.ring[self.next] = value
+        self.next = (self.next + 1) % self.window_size
+        if value != value:
+            self.nan_count += 1
+        else:
+            insort(self.sorted_values, value)
+
+        if self.count < self.window_size or self.nan_count:
+            return value
+        median = self.median()
+        if abs(value - median) > self.n_sigmas * self.mad(median):
+            return median
+        return value
+
+    def median(self):
+        """Median of the window's non-NaN values, as np.median gives it"""
+        values = self.sorted_values
+        n = len(values)
+        if n % 2:
+            return values[n // 2]
+        return (values[n // 2 - 1] + values[n // 2]) / 2
+
+    def mad(self, median):
+        """Median absolute deviation from median, as scipy's median_abs_deviation gives it"""
+        values = self.sorted_values
+        n = len(values)
+        split = bisect_left(values, median)
+        if n % 2:
+            return kth_smallest_deviation(values, split, median, n // 2)
+        return (kth_smallest_deviation(values, split, median, n // 2 - 1) +
+                kth_smallest_deviation(values, split, median, n // 2)) / 2
+
+    def nbytes(self):
+        return (self.ring.buffer_info()[1] * self.ring.itemsize +
+                self.sorted_values.buffer_info()[1] * self.sorted_values.itemsize)
+
+class EdgeHampelFilter:
+    """co2/temperature/humidity Hampel filter (RealTimeHampelFilter builds on it)"""
+    __slots__ = ('co2', 'temperature', 'humidity')
+
+    def __init__(self, window_size=10, n_sigmas=3):
+        self.co2 = HampelChannel(window_size, n_sigmas)
+        self.temperature = HampelChannel(window_size, n_sigmas)
+        self.humidity = HampelChannel(window_size, n_sigmas)
+
+    def process_reading(self, co2, temperature, humidity):
+        return (self.co2.filter(co2), self.temperature.filter(temperature),
+                self.humidity.filter(humidity))
+
+    def nbytes(self):
+        return self.co2.nbytes() + self.temperature.nbytes() + self.humidity.nbytes()
@@ -0,0 +1,117 @@
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+from merge_data import SENSORS, SensorStream, find_daily_files
+
+def load_daily_readings(data_dir, condition):
+    """Join the per-sensor daily CSVs of a condition into (timestamp_ms, co2, temp, humidity) rows
+
+    Rows are in recording order. timestamp_ms is uptime and restarts when the
+    device reboots, so readings are joined on merge_data's (epoch,
+    timestamp_ms) rather than timestamp_ms alone, and days never interleave.
+    """
+    values = {}
+    files = find_daily_files(data_dir, condition)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for sensor in SENSORS:
+            for epoch, timestamp_ms, _, _, value in SensorStream(sensor, files[sensor], executor):
+                values.setdefault((epoch, timestamp_ms), {})[sensor] = value
+
+    # Only timestamps where all three sensors reported
+    return [(ts, v['co2'], v['temperature'], v['humidity'])
+            for (_, ts), v in sorted(values.items()) if len(v) == len(SENSORS)]
+
+def replay_clock(readings):
+    """ms of each reading after the first, for pacing a replay
+
+    Within a boot the recorded timestamp_ms spacing is kept; a reading whose
+    timestamp_ms went back (a reboot) is due right after the one before it,
+    as the time the device was down is not in the recording.
+    """
+    offsets, elapsed, last = [], 0, None
+    for reading in readings:
+        if last is not None and reading[0] >= last:
+            elapsed += reading[0] - last
+        offsets.append(elapsed)
+        last = reading[0]
+    return offsets
+
+def recorded_rate(readings):
+    """Samples per second of device time, counting each boot's own span"""
+    clock = replay_clock(readings)
+    intervals = sum(1 for a, b in zip(readings, readings[1:]) if b[0] >= a[0])
+    return intervals / max(clock[-1] / 1000, 1e-9) if clock else 0.0
+
+class ReplaySerial:
+    """Serial port stand-in that replays recorded readings at accelerated speed
+
+    Lines use the 'timestamp_ms,co2,temperature,humidity' format trans.py expects
+    (or 'co2,temperature,humidity' with include_timestamp=False). speed=100 plays
+    back 100x faster than recorded; speed=None returns lines without waiting.
+    readline() returns b'' once the recording is exhausted, like a timed-out read.
+    With buffer_lines, lines that fall more than that many behind the clock
+    are lost like in an overrun UART buffer (counted in dropped). last_due is
+    the monotonic time the line just returned was sent.
+    """
+    def __init__(self, readings, speed=100.0, include_timestamp=True, port='REPLAY',
+                 buffer_lines=None):
+        self.readings = readings
+        self.speed = speed
+        self.include_timestamp = include_timestamp
+        self.port = port
+        self.buffer_lines = buffer_lines
+        self.position = 0
+        self.is_open = True
+        self.start_wall = None
+        self.times = None  # replay_clock of the readings
+        self.dropped = 0
+        self.last_due = None
+
+    @classmethod
+    def from_cleaned_data(cls, data_dir='cleaned_data', condition='worm', **kwargs):
+        return cls(load_daily_readings(data_dir, condition), **kwargs)
+
+    def readline(self):
+        if not self.is_open or self.position >= len(self.readings):
+            return b''
+        if self.speed and self.start_wall is None:
+            self.start_wall = time.monotonic()
+            self.times = replay_clock(self.readings)
+        if self.speed and self.buffer_lines is not None:
+            self._overrun()
+            if self.position >= len(self.readings):
+                return b''
+        timestamp_ms, co2, temperature, humidity = self.readings[self.position]
+        self.position += 1
+
+        if self.speed:
+            # Wait until the reading is due on the accelerated clock
+            due = self.start_wall + self.times[self.position - 1] / 1000 / self.speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.last_due = due
+        else:
+            self.last_due = time.monotonic()
+
+        if self.include_timestamp:
+            line = f"{timestamp_ms},{co2},{temperature},{humidity}\r\n"
+        else:
+            line = f"{co2},{temperature},{humidity}\r\n"
+        return line.encode('utf-8')
+
+    def _overrun(self):
+        """Skip lines that were sent so long ago they no longer fit in the buffer"""
+        now_ms = (time.monotonic() - self.start_wall) * 1000 * self.speed
+        waiting = bisect_right(self.times, now_ms) - self.position
+        if waiting > self.buffer_lines:
+            self.position += waiting - self.buffer_lines
+            self.dropped += waiting - self.buffer_lines
+
+    @property
+    def in_waiting(self):
+        return 0 if self.position >= len(self.readings) else 1
+
+    def close(self):
+        self.is_open = False
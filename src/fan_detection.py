@@ -1,18 +1,17 @@
-import pandas as pd
-import numpy as np
-import os
-from datetime import datetime, timedelta
+from edge.fan import DEFAULT_THRESHOLDS, EdgeFanDetector
+
+# pandas and data_store are imported in the functions that use them, so
+# StreamingFanDetector loads without pandas
 
 class FanDetector:
     def __init__(self):
-        self.thresholds = {
-            'temp_max_change': 0.4,    # Maximum temperature change (°C/min)
-            'humid_max_change': 2.0,    # Maximum humidity change (%/min)
-        }
+        # Shared with the edge runtime (edge/fan.py)
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
         self.window_size = '30min'     # Define window size
     
     def analyze_window(self, window_data):
         """Analyze a 30-minute window of temperature and humidity data"""
+        import pandas as pd
         # Ensure data is within 30-minute window
         window_data = window_data.copy()
         window_data['timestamp'] = pd.to_datetime(window_data['timestamp'])
@@ -35,4 +34,58 @@ class FanDetector:
         fan_detect = temp_peak or humid_peak
         
         
-        return fan_detect
\ No newline at end of file
+        return fan_detect
+
+class StreamingFanDetector(EdgeFanDetector):
+    """Online FanDetector over the trailing 30 minutes of the cleaned stream
+
+    The edge runtime's detector; update() also takes the sample's timestamp
+    and returns a transition (timestamp, 'on' | 'off', temp_max_change,
+    humid_max_change) when the fan/ventilation state changes, else None.
+    """
+    __slots__ = ()
+
+    def update(self, timestamp, timestamp_ms, temperature, humidity):
+        event = super().update(timestamp_ms, temperature, humidity)
+        if event is not None:
+            return (timestamp,) + event[1:]
+        return None
+
+def run_fan_detection(df):
+    """Drive StreamingFanDetector over a cleaned dataset and collect its transitions"""
+    detector = StreamingFanDetector()
+    transitions = []
+    for timestamp, timestamp_ms, temperature, humidity in zip(
+            df['timestamp'], df['timestamp_ms'].tolist(),
+            df['temperature'].tolist(), df['humidity'].tolist()):
+        event = detector.update(timestamp, timestamp_ms, temperature, humidity)
+        if event is not None:
+            transitions.append(event)
+    return transitions
+
+def main():
+    import pandas as pd
+    from data_store import load_condition
+    data_dir = "cleaned_data"
+    
+    for condition in ['worm', 'withoutworm']:
+        df = load_condition(data_dir, condition)
+        transitions = run_fan_detection(df)
+        
+        # Time spent with the fan/ventilation detected as on
+        on_time = pd.Timedelta(0)
+        for (start, state, _, _), end in zip(transitions, [t[0] for t in transitions[1:]] +
+                                              [df['timestamp'].iloc[-1]]):
+            if state == 'on':
+                on_time += end - start
+        total_time = df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]
+        
+        print(f"\n=== {condition} ===")
+        print(f"Samples: {len(df)}, transitions: {len(transitions)}")
+        print(f"Fan on for {on_time} of {total_time} "
+              f"({100 * on_time / total_time:.1f}%)")
+        for timestamp, state, temp_max, humid_max in transitions:
+            print(f"{timestamp}  fan {state:<3}  max |dT| {temp_max:.2f}  max |dH| {humid_max:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from windowing import timestamps_ns
+
+DEFAULT_CACHE_DIR = os.path.join('cache', 'features')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 64
+
+def _column_bytes(series):
+    """Raw bytes behind a column; datetimes as int64 ns so tz/unit don't change the hash"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(series):
+        return timestamps_ns(series).tobytes()
+    return np.ascontiguousarray(series.to_numpy()).tobytes()
+
+def fingerprints(df, columns, row_counts=()):
+    """Content hashes of the first n rows of df[columns] for each n in row_counts plus len(df)
+
+    One pass over the data: each column's hasher is copied at every cut, so
+    checking whether cached rows are a prefix of df costs no extra reads.
+    """
+    cuts = sorted({n for n in row_counts if 0 < n <= len(df)} | {len(df)})
+    digests = {n: [] for n in cuts}
+    for col in columns:
+        data = _column_bytes(df[col])
+        itemsize = len(data) // len(df) if len(df) else 0
+        hasher = hashlib.blake2b(col.encode(), digest_size=16)
+        done = 0
+        for n in cuts:
+            hasher.update(data[done * itemsize:n * itemsize])
+            done = n
+            digests[n].append(hasher.copy().digest())
+    return {n: hashlib.blake2b(b''.join(parts), digest_size=16).hexdigest()
+            for n, parts in digests.items()}
+
+class FeatureCache:
+    """On-disk cache of derived feature frames, keyed by input content hash and parameters
+
+    Each entry remembers how many input rows it was computed from and their
+    hash. When new rows are appended to a dataset, the entry for the old rows
+    is found by prefix hash and only the tail is recomputed. Least recently
+    used entries are evicted once the cache exceeds max_bytes or max_entries.
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'extended': 0, 'misses': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    # Index ------------------------------------------------------------------
+
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _load_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, index):
+        # Write-then-rename so a crash never leaves a half-written index
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_path())
+
+    @staticmethod
+    def _spec(name, params):
+        return json.dumps({'name': name, 'params': params}, sort_keys=True, default=str)
+
+    def _load_entry(self, key):
+        return pd.read_pickle(os.path.join(self.directory, f'{key}.pkl'))
+
+    def _store(self, index, spec, digest, rows, result):
+        key = hashlib.blake2b(f'{spec}|{digest}'.encode(), digest_size=16).hexdigest()
+        path = os.path.join(self.directory, f'{key}.pkl')
+        result.to_pickle(path)
+        index[key] = {'spec': spec, 'digest': digest, 'rows': rows,
+                      'bytes': os.path.getsize(path), 'last_used': time.time()}
+        self._evict(index)
+        self._save_index(index)
+
+    def _evict(self, index):
+        """Drop least recently used entries until under both limits"""
+        by_age = sorted(index, key=lambda key: index[key]['last_used'])
+        total = sum(entry['bytes'] for entry in index.values())
+        while by_age and (total > self.max_bytes or len(index) > self.max_entries):
+            key = by_age.pop(0)
+            total -= index.pop(key)['bytes']
+            try:
+                os.remove(os.path.join(self.directory, f'{key}.pkl'))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        index = self._load_index()
+        for key in index:
+            try:
+                os.remove(os.path.join(self.directory, f'{key}.pkl'))
+            except FileNotFoundError:
+                pass
+        self._save_index({})
+
+    # Lookup -----------------------------------------------------------------
+
+    def get(self, name, params, df, columns, compute, extend=None):
+        """Cached compute(df), keyed by (name, params) and the content of df[columns]
+
+        On a miss, extend(cached_result, df, cached_rows) is tried against the
+        largest cached entry whose input is a prefix of df; it should compute
+        only what the new rows change. Without it (or with no prefix entry) the
+        result is computed from scratch.
+        """
+        spec = self._spec(name, params)
+        index = self._load_index()
+        candidates = {key: entry for key, entry in index.items()
+                      if entry['spec'] == spec and entry['rows'] <= len(df)}
+        digests = fingerprints(df, columns, [entry['rows'] for entry in candidates.values()])
+        digest = digests[len(df)]
+
+        result = None
+        for key, entry in sorted(candidates.items(), key=lambda item: -item[1]['rows']):
+            if digests.get(entry['rows']) != entry['digest']:
+                continue
+            try:
+                cached = self._load_entry(key)
+            except (FileNotFoundError, EOFError):
+                continue
+            if entry['rows'] == len(df) and entry['digest'] == digest:
+                entry['last_used'] = time.time()
+                self._save_index(index)
+                self.stats['hits'] += 1
+                return cached
+            if extend is not None:
+                result = extend(cached, df, entry['rows'])
+                if result is not None:
+                    entry['last_used'] = time.time()
+                    self.stats['extended'] += 1
+                    break
+
+        if result is None:
+            result = compute(df)
+            self.stats['misses'] += 1
+        self._store(index, spec, digest, len(df), result)
+        return result
+
+    def time_windows(self, name, df, columns, compute, size, step=None, params=None):
+        """Cache a per-window frame over time windows anchored at the first timestamp
+
+        compute(frame, origin) must return one row per non-empty window with a
+        'window_start' column, windows starting at origin (None: first
+        timestamp). After an append only windows that could contain new rows
+        are recomputed; windows already closed before the old last timestamp
+        are reused.
+        """
+        size_ns = pd.Timedelta(size).value
+        step_ns = size_ns if step is None else pd.Timedelta(step).value
+
+        def extend(cached, frame, rows):
+            ts = timestamps_ns(frame['timestamp'])
+            if np.any(ts[1:] < ts[:-1]):
+                return None  # Appended rows go back in time: windows must be rebuilt
+            origin, last = ts[0], ts[rows - 1]
+            # First window on the grid that was still open at the old last timestamp
+            resume = origin + step_ns * max(0, (last - size_ns - origin) // step_ns + 1)
+            keep = timestamps_ns(cached['window_start']) < resume
+            tail = compute(frame.iloc[np.searchsorted(ts, resume, side='left'):], resume)
+            return pd.concat([cached[keep], tail], ignore_index=True)
+
+        params = dict(params or {}, size=str(size), step=None if step is None else str(step))
+        return self.get(name, params, df, columns, lambda frame: compute(frame, None), extend)
+
+    def row_windows(self, name, df, columns, compute, window_size, group_col=None, params=None):
+        """Cache a frame of fixed-row-count windows (complete windows only)
+
+        After an append the complete windows are kept and compute runs on the
+        rows from the first incomplete one. With group_col (a tidy frame of
+        several series), old and new windows are joined group by group.
+        """
+        def extend(cached, frame, rows):
+            resume = (rows // window_size) * window_size
+            tail = compute(frame.iloc[resume:])
+            if tail.empty:
+                return cached  # No new complete window (an empty tail would upset dtypes)
+            if group_col is None:
+                return pd.concat([cached, tail], ignore_index=True)
+            parts = []
+            for group in pd.unique(pd.concat([cached[group_col], tail[group_col]])):
+                parts.append(cached[cached[group_col] == group])
+                parts.append(tail[tail[group_col] == group])
+            return pd.concat(parts, ignore_index=True)
+
+        params = dict(params or {}, window_size=window_size)
+        return self.get(name, params, df, columns, compute, extend)
+
+    def row_series(self, name, df, columns, compute, lookback=1, params=None):
+        """Cache a per-row frame (e.g. diffs and rates) whose rows need `lookback` previous rows
+
+        After an append compute runs on the new rows plus lookback rows of
+        context, and those context rows are dropped from its output.
+        """
+        def extend(cached, frame, rows):
+            start = max(rows - lookback, 0)
+            tail = compute(frame.iloc[start:]).iloc[rows - start:]
+            return pd.concat([cached, tail])
+
+        return self.get(name, dict(params or {}), df, columns, compute, extend)
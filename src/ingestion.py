@@ -0,0 +1,447 @@
+import csv
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+SENSORS = ['co2', 'temperature', 'humidity']
+CSV_HEADER = ["timestamp", "co2", "temperature", "humidity"]
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[nN][aA][nN]'
+# 'timestamp_ms,co2,temperature,humidity' (trans.py) or 'co2,temperature,humidity'
+_SENSOR_LINE = re.compile(rf'(?:(\d+),)?({_NUMBER}),({_NUMBER}),({_NUMBER})')
+
+def parse_sensor_line(line):
+    """Parse a 3- or 4-field sensor line into (timestamp_ms or None, co2, temp, humidity)
+
+    Raises ValueError on anything else.
+    """
+    match = _SENSOR_LINE.fullmatch(line.strip())
+    if match is None:
+        raise ValueError(f"malformed sensor line: {line!r}")
+    timestamp_ms, co2, temperature, humidity = match.groups()
+    return (int(timestamp_ms) if timestamp_ms is not None else None,
+            float(co2), float(temperature), float(humidity))
+
+class DailyCSVWriter:
+    """Append rows to one CSV per day, keeping the file handle open between rows"""
+    def __init__(self, directory, header=CSV_HEADER, flush_rows=20, flush_interval=5.0,
+                 clock=time.monotonic):
+        self.directory = directory
+        self.header = list(header)
+        self.flush_rows = flush_rows          # Flush after this many buffered rows
+        self.flush_interval = flush_interval  # ... or after this many seconds
+        self.clock = clock
+        self.date_str = None
+        self.file = None
+        self.writer = None
+        self.pending = 0
+        self.last_flush = clock()
+
+    def recover_tail(self):
+        """Repair the day files after a crash and return what the last rows hold
+
+        A row torn by power loss (no trailing newline) is cut off. Returns
+        (time, rows): the last row's time (second resolution, as written),
+        taken from the newest file that has rows, and a Counter of the rows
+        written in that second (as tuples of fields), so a caller can skip
+        exactly those. (None, empty Counter) if no file has rows.
+        """
+        if not os.path.isdir(self.directory):
+            return None, Counter()
+        days = sorted(name for name in os.listdir(self.directory)
+                      if re.fullmatch(r'\d{4}-\d{2}-\d{2}\.csv', name))
+        # A file just started after midnight may hold only its header
+        for name in reversed(days):
+            path = os.path.join(self.directory, name)
+            with open(path, 'rb+') as f:
+                data = f.read()
+                end = data.rfind(b'\n') + 1
+                if end < len(data):
+                    f.truncate(end)
+            lines = data[:end].decode('utf-8').splitlines()[1:]
+            if not lines:
+                continue
+            last = lines[-1].split(',', 1)[0]
+            rows = Counter()
+            for line in reversed(lines):
+                if line.split(',', 1)[0] != last:
+                    break
+                rows[tuple(line.split(','))] += 1
+            return datetime.strptime(last, "%Y-%m-%d_%H-%M-%S"), rows
+        return None, Counter()
+
+    def _open(self, date_str):
+        """Close the current day's file and open (or create) the file for date_str"""
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{date_str}.csv")
+        # Header is only written once, when the day's file is new or empty
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if is_new:
+            self.writer.writerow(self.header)
+        self.date_str = date_str
+
+    def write(self, current_time, row):
+        """Write one row, rolling over to a new file when the date changes"""
+        date_str = current_time.strftime("%Y-%m-%d")
+        if date_str != self.date_str:
+            self._open(date_str)
+        self.writer.writerow(row)
+        self.pending += 1
+
+        if (self.pending >= self.flush_rows or
+                self.clock() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Push buffered rows to the operating system"""
+        if self.file is not None:
+            self.file.flush()
+        self.pending = 0
+        self.last_flush = self.clock()
+
+    def sync(self):
+        """Flush and fsync, so written rows survive a power loss"""
+        self.flush()
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+        self.file = None
+        self.writer = None
+        self.date_str = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def csv_row(current_time, co2, temperature, humidity):
+    """The daily CSV row for one reading"""
+    return [current_time.strftime("%Y-%m-%d_%H-%M-%S"), co2, temperature, humidity]
+
+def reading_documents(current_time, timestamp_ms, co2, temperature, humidity):
+    """Build the (sensor, date_str, data) documents for one reading"""
+    date_str = current_time.strftime("%Y-%m-%d")
+    return [(sensor, date_str, {
+                "timestamp": current_time,
+                "timestamp_ms": timestamp_ms,
+                "value": value
+            }) for sensor, value in zip(SENSORS, (co2, temperature, humidity))]
+
+class MemorySink:
+    """In-memory stand-in for Firestore, used by tests and benchmarks"""
+    def __init__(self):
+        self.documents = []
+        self.commits = 0
+
+    def commit(self, documents):
+        self.documents.extend(documents)
+        self.commits += 1
+
+class FirestoreSink:
+    """Write documents to Firestore using batched commits"""
+    # Firestore rejects batches with more than 500 writes
+    MAX_BATCH_WRITES = 500
+
+    def __init__(self, client, collection='test'):
+        self.client = client
+        self.collection_ref = client.collection(collection)
+
+    def commit(self, documents):
+        for start in range(0, len(documents), self.MAX_BATCH_WRITES):
+            batch = self.client.batch()
+            for sensor, date_str, data in documents[start:start + self.MAX_BATCH_WRITES]:
+                # Same layout as before: {collection}/{sensor}_data/{date}/{auto id}
+                doc_ref = (self.collection_ref.document(f"{sensor}_data")
+                           .collection(date_str).document())
+                batch.set(doc_ref, data)
+            batch.commit()
+
+class BatchUploader:
+    """Group co2/temperature/humidity documents and commit them to a sink in batches"""
+    def __init__(self, sink, batch_size=30, max_delay=60.0, clock=time.monotonic):
+        self.sink = sink
+        self.batch_size = batch_size  # Commit once this many documents are buffered
+        self.max_delay = max_delay    # ... or once the oldest buffered document is this old
+        self.clock = clock
+        self.buffer = []
+        self.first_added = None
+
+    def add(self, current_time, timestamp_ms, co2, temperature, humidity):
+        """Buffer one reading as three sensor documents"""
+        self.buffer.extend(reading_documents(current_time, timestamp_ms,
+                                             co2, temperature, humidity))
+        if self.first_added is None:
+            self.first_added = self.clock()
+
+        if (len(self.buffer) >= self.batch_size or
+                self.clock() - self.first_added >= self.max_delay):
+            return self.flush()
+        return 0
+
+    def pending(self):
+        """Readings buffered but not yet committed"""
+        return len(self.buffer) // len(SENSORS)
+
+    def flush(self):
+        """Commit all buffered documents, returning how many were sent"""
+        if not self.buffer:
+            return 0
+        documents = self.buffer
+        self.sink.commit(documents)
+        self.buffer = []
+        self.first_added = None
+        return len(documents)
+
+class BackgroundUploader:
+    """Drain readings from a bounded queue on worker threads and upload them with retry
+
+    The serial reader calls put(), which never blocks: when the queue is full the
+    reading is appended to an on-disk spill file (or dropped if there is none) and
+    replayed once the workers catch up.
+    """
+    def __init__(self, sink, maxsize=1000, workers=1, batch_size=30, max_delay=5.0,
+                 max_retries=5, backoff=0.5, max_backoff=30.0, spill_path=None):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.n_workers = workers
+        self.batch_size = batch_size    # Documents per commit
+        self.max_delay = max_delay      # Seconds a partial batch may wait
+        self.max_retries = max_retries
+        self.backoff = backoff          # Initial retry delay, doubled per attempt
+        self.max_backoff = max_backoff
+        self.spill_path = spill_path
+        self.spill_lock = threading.Lock()
+        self.replay_lock = threading.Lock()  # One worker replays the spill file at a time
+        self.stats_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.stats = {
+            'enqueued': 0,       # Readings accepted into the queue
+            'uploaded': 0,       # Readings committed to the sink
+            'spilled': 0,        # Readings written to the spill file
+            'replayed': 0,       # Spilled readings put back on the queue
+            'dropped': 0,        # Readings lost (queue full and no spill file)
+            'retries': 0,        # Failed commit attempts that were retried
+            'failed_batches': 0, # Batches that exhausted their retries
+            'max_depth': 0,      # Highest queue depth seen
+        }
+
+    def _count(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    def put(self, current_time, timestamp_ms, co2, temperature, humidity):
+        """Queue one reading without blocking the caller"""
+        sample = (current_time, timestamp_ms, co2, temperature, humidity)
+        try:
+            self.queue.put_nowait(sample)
+        except queue.Full:
+            self._spill([sample])
+            return False
+        with self.stats_lock:
+            self.stats['enqueued'] += 1
+            self.stats['max_depth'] = max(self.stats['max_depth'], self.queue.qsize())
+        return True
+
+    def pending(self):
+        """Readings queued or being committed (not yet uploaded or spilled)"""
+        return self.queue.unfinished_tasks
+
+    def _spill(self, samples):
+        """Append readings to the spill file as JSON lines"""
+        if self.spill_path is None:
+            self._count('dropped', len(samples))
+            return
+        try:
+            with self.spill_lock:
+                with open(self.spill_path, 'a') as f:
+                    for current_time, timestamp_ms, co2, temperature, humidity in samples:
+                        f.write(json.dumps([current_time.isoformat(), timestamp_ms,
+                                            co2, temperature, humidity]) + "\n")
+        except OSError as e:
+            # put() runs on the serial reader: a full or missing disk must not stop ingest
+            print(f"Spill failed ({e}), dropping {len(samples)} readings")
+            self._count('dropped', len(samples))
+            return
+        self._count('spilled', len(samples))
+
+    def _replay_spill(self):
+        """Move spilled readings back onto the queue while there is room
+
+        The spill file is renamed aside so put() can keep spilling, and the
+        renamed file is only deleted once its readings are back on the queue
+        or written back to the spill file; after a crash it is replayed again.
+        """
+        if self.spill_path is None or not self.replay_lock.acquire(blocking=False):
+            return
+        try:
+            replaying = self.spill_path + '.replay'
+            with self.spill_lock:
+                if not os.path.exists(replaying):
+                    if not os.path.exists(self.spill_path):
+                        return
+                    os.replace(self.spill_path, replaying)
+            with open(replaying) as f:
+                lines = f.readlines()
+            remaining = []
+            for i, line in enumerate(lines):
+                try:
+                    iso_time, timestamp_ms, co2, temperature, humidity = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line from a crash mid-write
+                sample = (datetime.fromisoformat(iso_time), timestamp_ms, co2, temperature,
+                          humidity)
+                try:
+                    self.queue.put_nowait(sample)
+                except queue.Full:
+                    remaining = lines[i:]
+                    break
+                self._count('replayed')
+            if remaining:
+                # Put the unreplayed tail back in front of anything spilled meanwhile
+                with self.spill_lock:
+                    newer = []
+                    if os.path.exists(self.spill_path):
+                        with open(self.spill_path) as f:
+                            newer = f.readlines()
+                    tmp_path = self.spill_path + '.tmp'
+                    with open(tmp_path, 'w') as f:
+                        f.writelines(remaining + newer)
+                    os.replace(tmp_path, self.spill_path)
+            os.remove(replaying)
+        except OSError as e:
+            print(f"Spill replay failed ({e}), will retry")
+        finally:
+            self.replay_lock.release()
+
+    def _commit(self, samples):
+        """Commit a batch of readings, retrying with exponential backoff"""
+        documents = []
+        for sample in samples:
+            documents.extend(reading_documents(*sample))
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink.commit(documents)
+                self._count('uploaded', len(samples))
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    break
+                self._count('retries')
+                print(f"Upload failed ({e}), retrying in {delay:.1f}s")
+                if self.stop_event.wait(delay) and attempt > 0:
+                    # Shutting down: give up early, the batch goes to the spill file
+                    break
+                delay = min(delay * 2, self.max_backoff)
+        self._count('failed_batches')
+        self._spill(samples)
+        return False
+
+    def _worker(self):
+        samples_per_batch = max(1, self.batch_size // len(SENSORS))
+        while True:
+            batch = []
+            deadline = None
+            while len(batch) < samples_per_batch:
+                timeout = 0.1 if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    if deadline is not None or self.stop_event.is_set():
+                        break
+                    # Idle: take the chance to bring spilled readings back
+                    self._replay_spill()
+                    continue
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_delay
+            if batch:
+                self._commit(batch)
+                for _ in batch:
+                    self.queue.task_done()
+            elif self.stop_event.is_set():
+                return
+
+    def start(self):
+        self.stop_event.clear()
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._worker, name=f"uploader-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Upload whatever is still queued, then stop the workers"""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+def ingest_serial(ser, csv_writer, upload, stop_on_eof=False, verbose=True, store=None,
+                  device='gateway', rollups=None, wal=None, checkpointer=None, stats=None):
+    """Read lines from a serial port, log them to CSV and hand each reading to upload()
+
+    upload is BatchUploader.add or BackgroundUploader.put. With a SegmentStore
+    each reading is also appended to it under `device`, and with a
+    RollupStore folded into its 1 min - 1 h tiers. With a WriteAheadLog each
+    reading is logged before the sinks get it, and a wal.Checkpointer
+    advances the log once the sinks are durable. With a PipelineStats, lines,
+    samples and parse failures are counted. With stop_on_eof the loop ends
+    when readline() returns nothing, which is how ReplaySerial signals the
+    end of a recording.
+    """
+    count = 0
+    while True:
+        raw = ser.readline()
+        if not raw:
+            if stop_on_eof:
+                return count
+            continue
+        if stats is not None:
+            stats.lines += 1
+        try:
+            line = raw.decode('utf-8').strip()
+            timestamp_ms, co2, temperature, humidity = parse_sensor_line(line)
+            co2 = round(co2)  # Integer ppm, as the WAL records it
+        except (ValueError, OverflowError, UnicodeDecodeError):
+            if stats is not None:
+                stats.parse_failures += 1
+            continue
+        if verbose:
+            print(f"Received: {line}")
+        if timestamp_ms is None:
+            # 3-field lines carry no device clock; use the local one
+            timestamp_ms = int(time.monotonic() * 1000)
+
+        current_time = datetime.utcnow()
+        if wal is not None:
+            # Logged before any sink sees it; durable at the next group commit
+            wal.append(current_time, timestamp_ms, co2, temperature, humidity)
+
+        # Save all data to a single CSV file with date as filename
+        csv_writer.write(current_time, csv_row(current_time, co2, temperature, humidity))
+        if store is not None:
+            store.append_reading(device, current_time, timestamp_ms, co2, temperature, humidity)
+        if rollups is not None:
+            rollups.add_reading(device, current_time, co2, temperature, humidity)
+
+        # co2_data / temperature_data / humidity_data documents
+        upload(current_time, timestamp_ms, co2, temperature, humidity)
+        if checkpointer is not None:
+            checkpointer.maybe()
+        if stats is not None:
+            stats.samples += 1
+        count += 1
@@ -1,19 +1,18 @@
-import pandas as pd
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import os
-from datetime import datetime
+
+from edge.insect import DEFAULT_THRESHOLDS, DEFAULT_WEIGHTS, EdgeInsectDetector
+
+# pandas-backed helpers (windowing, data_store, feature_cache) are imported in the
+# functions that use them, so StreamingInsectDetector loads with numpy alone
 
 class InsectDetector:
-    def __init__(self):
-        # Thresholds based on light infestation experiment (0.4%~0.5% mealworms)
-        self.thresholds = {
-            'mean_level': 680,    # Base CO2 threshold
-            'std_change': 0.05,   # Standard deviation threshold
-            'min_change': 0.3,    # Minimum change threshold
-            'peak_change': 1.0    # Peak change threshold
-        }
+    def __init__(self, thresholds=None, weights=None, score_threshold=0.4):
+        # Defaults shared with the edge runtime (edge/insect.py)
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        # Score weights; tune_detector.py searches these together with the thresholds
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        # Detection threshold lowered for better recall
+        self.score_threshold = score_threshold
     
     def analyze_window(self, window_data):
         """Analyze a 30-minute window of CO2 data"""
@@ -24,19 +23,7 @@ class InsectDetector:
         max_change = changes.max()
         min_change = changes.abs().min()
         
-        # Multiple detection criteria for CO2
-        level_detected = mean_level > self.thresholds['mean_level']
-        std_detected = std_change > self.thresholds['std_change']
-        change_detected = (max_change > self.thresholds['peak_change'] or 
-                         min_change > self.thresholds['min_change'])
-        
-        # Calculate detection score (weighted combination)
-        score = (level_detected * 0.6 +    # Higher weight for mean level
-                std_detected * 0.2 +       # Medium weight for variation
-                change_detected * 0.2)      # Lower weight for peaks
-        
-        # Detection threshold lowered for better recall
-        detection = score > 0.4
+        detection, score = self.score_features(mean_level, std_change, max_change, min_change)
         
         results = {
             'mean_level': mean_level,
@@ -48,43 +35,106 @@ class InsectDetector:
         
         return detection, results
 
-def evaluate_detector(detector, worm_df, withoutworm_df, window_size='30min'):
+    def score_features(self, mean_level, std_change, max_change, min_change):
+        """Detection and score from window features (scalars or arrays of windows)"""
+        # Multiple detection criteria for CO2
+        level_detected = mean_level > self.thresholds['mean_level']
+        std_detected = std_change > self.thresholds['std_change']
+        change_detected = np.logical_or(max_change > self.thresholds['peak_change'],
+                                        min_change > self.thresholds['min_change'])
+        
+        # Calculate detection score (weighted combination)
+        score = (level_detected * self.weights['level'] +
+                std_detected * self.weights['std'] +
+                change_detected * self.weights['change'])
+        
+        detection = score > self.score_threshold
+        return detection, score
+
+    def detect(self, features):
+        """Vectorized analyze_window over a frame from compute_window_features"""
+        return self.score_features(features['mean_level'].to_numpy(),
+                                   features['std_change'].to_numpy(),
+                                   features['max_change'].to_numpy(),
+                                   features['min_change'].to_numpy())
+
+def compute_window_features(df, window_size='30min', step=None, origin=None):
+    """analyze_window's CO2 features for every non-empty window in one pass
+
+    Returns one row per window with window_start, mean_level, std_change,
+    max_change and min_change, equal to what analyze_window computes on the
+    same slice (rates of change only between rows of the same window).
+    """
+    import pandas as pd
+    from windowing import (window_frame, window_bounds, length_groups, nan_mean_std,
+                           window_starts_index)
+    df, ts = window_frame(df)
+    starts, lo, hi = window_bounds(ts, window_size, step, origin)
+    keep = hi > lo
+    position = np.cumsum(keep) - 1
+    n_windows = keep.sum()
+    features = {name: np.full(n_windows, np.nan)
+                for name in ['mean_level', 'std_change', 'max_change', 'min_change']}
+
+    co2 = df['co2'].to_numpy(dtype=float)
+    timestamp_ms = df['timestamp_ms'].to_numpy(dtype=float)
+    for which, rows in length_groups(lo, hi):
+        out = position[which]
+        features['mean_level'][out] = nan_mean_std(co2[rows])[0]
+        # Leading NaN column like Series.diff(), so the std sums in pandas' order
+        changes = np.full(rows.shape, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            changes[:, 1:] = (np.diff(co2[rows], axis=1) /
+                              (np.diff(timestamp_ms[rows], axis=1) / 1000))
+        features['std_change'][out] = nan_mean_std(changes)[1]
+        features['max_change'][out] = np.fmax.reduce(changes, axis=1)
+        features['min_change'][out] = np.fmin.reduce(np.abs(changes), axis=1)
+
+    features = pd.DataFrame(features)
+    features.insert(0, 'window_start', window_starts_index(starts[keep], df['timestamp']))
+    return features
+
+def cached_window_features(df, window_size='30min', step=None, cache=None):
+    """compute_window_features through the feature cache (only new windows after an append)"""
+    from feature_cache import FeatureCache
+    cache = cache or FeatureCache()
+    return cache.time_windows(
+        'insect_window_features', df, ['timestamp', 'timestamp_ms', 'co2'],
+        lambda frame, origin: compute_window_features(frame, window_size, step, origin),
+        window_size, step)
+
+class StreamingInsectDetector(EdgeInsectDetector):
+    """Online InsectDetector: re-scores the trailing 30-minute window on every sample
+
+    The edge runtime's detector (running sums, Welford with removal and
+    monotonic queues, O(1) amortized per update) configured from an
+    InsectDetector. The window is the samples with timestamp_ms within
+    window_ms of the newest one; results match InsectDetector.analyze_window
+    on that slice.
+    """
+    __slots__ = ('detector',)
+
+    def __init__(self, detector=None, window_ms=30 * 60 * 1000):
+        self.detector = detector or InsectDetector()
+        super().__init__(self.detector.thresholds, self.detector.weights,
+                         self.detector.score_threshold, window_ms)
+
+def evaluate_detector(detector, worm_df, withoutworm_df, window_size='30min', cache=None):
     """Evaluate detector performance"""
-    # Process data in 30-minute windows
-    true_positives = 0
-    false_positives = 0
-    true_negatives = 0
-    false_negatives = 0
-    
+    # Process data in 30-minute windows (features come from the cache when one is given)
+    if cache is not None:
+        features = lambda df: cached_window_features(df, window_size, cache=cache)
+    else:
+        features = lambda df: compute_window_features(df, window_size)
     # Evaluate worm data (should detect insects)
-    for start in pd.date_range(worm_df['timestamp'].min(), 
-                             worm_df['timestamp'].max(), 
-                             freq=window_size):
-        end = start + pd.Timedelta(window_size)
-        window = worm_df[(worm_df['timestamp'] >= start) & 
-                        (worm_df['timestamp'] < end)]
-        
-        if len(window) > 0:
-            detection, _ = detector.analyze_window(window)
-            if detection:
-                true_positives += 1
-            else:
-                false_negatives += 1
+    worm_detected, _ = detector.detect(features(worm_df))
+    true_positives = int(worm_detected.sum())
+    false_negatives = int(len(worm_detected) - true_positives)
     
     # Evaluate without-worm data (should not detect insects)
-    for start in pd.date_range(withoutworm_df['timestamp'].min(), 
-                             withoutworm_df['timestamp'].max(), 
-                             freq=window_size):
-        end = start + pd.Timedelta(window_size)
-        window = withoutworm_df[(withoutworm_df['timestamp'] >= start) & 
-                               (withoutworm_df['timestamp'] < end)]
-        
-        if len(window) > 0:
-            detection, _ = detector.analyze_window(window)
-            if detection:
-                false_positives += 1
-            else:
-                true_negatives += 1
+    withoutworm_detected, _ = detector.detect(features(withoutworm_df))
+    false_positives = int(withoutworm_detected.sum())
+    true_negatives = int(len(withoutworm_detected) - false_positives)
     
     # Calculate metrics
     total = true_positives + false_positives + true_negatives + false_negatives
@@ -107,19 +157,17 @@ def evaluate_detector(detector, worm_df, withoutworm_df, window_size='30min'):
     }
 
 def main():
+    from data_store import load_condition
+    from feature_cache import FeatureCache
     export_dir = "cleaned_data"
     
-    # Load data
-    worm_df = pd.read_csv(os.path.join(export_dir, 'worm_cleaned.csv'))
-    withoutworm_df = pd.read_csv(os.path.join(export_dir, 'withoutworm_cleaned.csv'))
-    
-    # Convert timestamps
-    for df in [worm_df, withoutworm_df]:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Load data (timestamps come back already typed from the column store)
+    worm_df = load_condition(export_dir, 'worm')
+    withoutworm_df = load_condition(export_dir, 'withoutworm')
     
     # Initialize and evaluate detector
     detector = InsectDetector()
-    metrics = evaluate_detector(detector, worm_df, withoutworm_df)
+    metrics = evaluate_detector(detector, worm_df, withoutworm_df, cache=FeatureCache())
     
     # Print results
     print("\nInsect Detection Performance Metrics:")
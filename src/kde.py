@@ -0,0 +1,35 @@
+import numpy as np
+
+def binned_kde(values, gridsize=512, cut=3, bw_adjust=1.0):
+    """Gaussian KDE on a regular grid via linear binning and an FFT convolution
+
+    Same estimate as seaborn's kdeplot defaults (Scott's rule bandwidth, grid
+    extending cut bandwidths past the data) but O(n + gridsize log gridsize)
+    instead of O(n * gridsize). Returns (grid, density); both are empty when
+    there are fewer than two distinct finite values.
+    """
+    x = np.asarray(values, dtype=float)
+    x = x[np.isfinite(x)]
+    n = len(x)
+    if n < 2 or np.ptp(x) == 0:
+        return np.empty(0), np.empty(0)
+
+    bw = bw_adjust * x.std(ddof=1) * n ** (-1 / 5)
+    lo, hi = x.min() - cut * bw, x.max() + cut * bw
+    grid = np.linspace(lo, hi, gridsize)
+    delta = grid[1] - grid[0]
+
+    # Linear binning: each point splits its unit weight between its two grid neighbours
+    pos = (x - lo) / delta
+    left = np.clip(np.floor(pos).astype(np.int64), 0, gridsize - 2)
+    frac = pos - left
+    counts = (np.bincount(left, 1 - frac, minlength=gridsize) +
+              np.bincount(left + 1, frac, minlength=gridsize))
+
+    # Kernel sampled at every grid offset, convolved with zero padding (no wrap-around)
+    offsets = np.arange(-(gridsize - 1), gridsize) * delta
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    size = 1 << int(np.ceil(np.log2(len(counts) + len(kernel) - 1)))
+    density = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    density = density[gridsize - 1:2 * gridsize - 1] / n
+    return grid, np.maximum(density, 0)
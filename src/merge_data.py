@@ -0,0 +1,161 @@
+import csv
+import glob
+import heapq
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+SENSORS = ['co2', 'temperature', 'humidity']
+MERGED_HEADER = ['timestamp', 'timestamp_ms', 'co2', 'temperature', 'humidity']
+
+def find_daily_files(data_dir, condition):
+    """Map each sensor to its daily CSV paths, oldest day first"""
+    files = {}
+    for sensor in SENSORS:
+        pattern = os.path.join(data_dir, f'{condition}_{sensor}_data_*.csv')
+        # Names end in _YYYY-MM-DD.csv, so a plain sort is chronological
+        files[sensor] = sorted(path for path in glob.glob(pattern)
+                               if re.search(r'_\d{4}-\d{2}-\d{2}\.csv$', path))
+    return files
+
+def read_sensor_file(path):
+    """Parse one daily sensor file into (timestamp_ms, timestamp, value) tuples"""
+    with open(path, newline='') as f:
+        return [(int(row['timestamp_ms']), row['timestamp'], row['value'])
+                for row in csv.DictReader(f)]
+
+class SensorStream:
+    """Records of one sensor across all its days, parsed ahead in a worker pool
+
+    Yields (epoch, timestamp_ms, sensor, timestamp, value) in (epoch,
+    timestamp_ms) order. timestamp_ms is device uptime, so when it goes back
+    while the wall-clock timestamp moves on the device has rebooted and a new
+    epoch starts; going back in both is an out-of-order record. At most
+    `prefetch` days are parsed or held in memory at any time.
+    """
+    def __init__(self, sensor, paths, executor, prefetch=2):
+        self.sensor = sensor
+        self.paths = deque(paths)
+        self.executor = executor
+        self.prefetch = prefetch
+        self.pending = deque()
+        self.records = 0
+        self.duplicates = 0
+        self.out_of_order = 0
+        self.resets = 0
+
+    def _fill(self):
+        while self.paths and len(self.pending) < self.prefetch:
+            self.pending.append(self.executor.submit(read_sensor_file, self.paths.popleft()))
+
+    def __iter__(self):
+        last_ms = last_time = None
+        epoch = 0
+        self._fill()
+        while self.pending:
+            day = self.pending.popleft().result()
+            self._fill()
+            for timestamp_ms, timestamp, value in day:
+                # A repeated timestamp_ms (e.g. overlapping exports) is a duplicate;
+                # going backwards except at a reboot would break the merge order,
+                # so those are skipped too
+                if last_ms is not None and timestamp_ms <= last_ms:
+                    if timestamp_ms == last_ms:
+                        self.duplicates += 1
+                        continue
+                    if datetime.fromisoformat(timestamp) > datetime.fromisoformat(last_time):
+                        epoch += 1
+                        self.resets += 1
+                    else:
+                        self.out_of_order += 1
+                        continue
+                last_ms, last_time = timestamp_ms, timestamp
+                self.records += 1
+                yield epoch, timestamp_ms, self.sensor, timestamp, value
+
+def merge_condition(data_dir, condition, output_file, tolerance_ms=1000, how='inner',
+                    gap_threshold_ms=60000, workers=None, prefetch=2):
+    """Stream-merge a condition's per-sensor daily CSVs into one merged CSV
+
+    Readings of different sensors whose timestamp_ms lie within tolerance_ms of
+    the first reading of a row are joined into that row. how='inner' keeps only
+    rows where every sensor reported, 'outer' keeps all rows with blanks for
+    missing sensors. Rows never span a device reboot: every sensor counts
+    uptime resets the same way, so their epochs line up. Returns a report of
+    counts, duplicates, resets and gaps.
+    """
+    files = find_daily_files(data_dir, condition)
+    report = {'rows': 0, 'incomplete_rows': 0, 'gaps': [], 'records': {}, 'duplicates': {},
+              'out_of_order': {}, 'resets': {}}
+
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(output_file, 'w', newline='') as out:
+        streams = [SensorStream(sensor, files[sensor], executor, prefetch)
+                   for sensor in SENSORS]
+        writer = csv.writer(out)
+        writer.writerow(MERGED_HEADER)
+
+        last_row = None
+
+        def emit(group):
+            nonlocal last_row
+            if how == 'inner' and len(group) < len(SENSORS):
+                report['incomplete_rows'] += 1
+                return
+            epoch, anchor_ms, anchor_time = group['_anchor']
+            # Gaps within one boot; a reset shows up in report['resets'] instead
+            if (last_row is not None and last_row[0] == epoch and
+                    anchor_ms - last_row[1] > gap_threshold_ms):
+                report['gaps'].append((last_row[1], anchor_ms))
+            last_row = (epoch, anchor_ms)
+            writer.writerow([anchor_time, anchor_ms] + [group.get(s, '') for s in SENSORS])
+            report['rows'] += 1
+
+        group = None
+        for epoch, timestamp_ms, sensor, timestamp, value in heapq.merge(*streams):
+            if (group is not None and sensor not in group and epoch == group['_anchor'][0] and
+                    timestamp_ms - group['_anchor'][1] <= tolerance_ms):
+                group[sensor] = value
+                continue
+            if group is not None:
+                emit(group)
+            group = {'_anchor': (epoch, timestamp_ms, timestamp), sensor: value}
+        if group is not None:
+            emit(group)
+
+        for stream in streams:
+            report['records'][stream.sensor] = stream.records
+            report['duplicates'][stream.sensor] = stream.duplicates
+            report['out_of_order'][stream.sensor] = stream.out_of_order
+            report['resets'][stream.sensor] = stream.resets
+
+    return report
+
+def print_report(condition, report):
+    print(f"\n=== {condition} ===")
+    print(f"Rows written: {report['rows']}")
+    print(f"Rows dropped (missing a sensor): {report['incomplete_rows']}")
+    for sensor in SENSORS:
+        print(f"{sensor}: {report['records'][sensor]} records, "
+              f"{report['duplicates'][sensor]} duplicates, "
+              f"{report['out_of_order'][sensor]} out of order, "
+              f"{report['resets'][sensor]} uptime resets")
+    print(f"Gaps: {len(report['gaps'])}")
+    for start_ms, end_ms in report['gaps'][:10]:
+        print(f"  {start_ms} -> {end_ms} ({(end_ms - start_ms) / 1000:.0f} s)")
+
+def main():
+    data_dir = "cleaned_data"
+    export_dir = "exports"
+    os.makedirs(export_dir, exist_ok=True)
+
+    for condition in ['worm', 'withoutworm']:
+        output_file = os.path.join(export_dir, f'{condition}_merged_all.csv')
+        report = merge_condition(data_dir, condition, output_file)
+        print_report(condition, report)
+        print(f"Saved merged data to: {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import bisect
+import time
+
+class DeviceMetrics:
+    """Throughput and lag counters for one sensor device"""
+    def __init__(self, device_id, clock=time.monotonic):
+        self.device_id = device_id
+        self.clock = clock
+        self.samples = 0
+        self.parse_errors = 0
+        self.disconnects = 0
+        self.bytes_read = 0
+        self.started = clock()
+        self.last_sample = None
+        self.lag_total = 0.0   # Seconds between bytes arriving and the row being written
+        self.lag_max = 0.0
+
+    def record(self, received_at):
+        """Count one cleaned sample whose bytes were read at received_at"""
+        now = self.clock()
+        lag = now - received_at
+        self.samples += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        self.last_sample = now
+
+    def summary(self):
+        elapsed = max(self.clock() - self.started, 1e-9)
+        return {
+            'device_id': self.device_id,
+            'samples': self.samples,
+            'parse_errors': self.parse_errors,
+            'disconnects': self.disconnects,
+            'bytes_read': self.bytes_read,
+            'samples_per_sec': self.samples / elapsed,
+            'mean_lag_ms': 1000 * self.lag_total / self.samples if self.samples else 0.0,
+            'max_lag_ms': 1000 * self.lag_max,
+        }
+
+class LatencyHistogram:
+    """Fixed log-spaced latency buckets, cheap enough to update on every sample"""
+    # Bucket upper bounds in seconds: 1 us .. ~67 s, doubling each step
+    BOUNDS = [1e-6 * 2 ** i for i in range(27)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        """Add another histogram's samples to this one"""
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (at most the max), in seconds"""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                # A bucket's bound can exceed every sample in it
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': 1000 * self.total / self.count if self.count else 0.0,
+            'p50_ms': 1000 * self.percentile(50),
+            'p99_ms': 1000 * self.percentile(99),
+            'max_ms': 1000 * self.max,
+        }
+
+class PipelineStats:
+    """Counters for a read -> parse -> clean loop"""
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.lines = 0
+        self.samples = 0
+        self.parse_failures = 0
+        self.read_to_clean = LatencyHistogram()
+
+    def samples_per_sec(self):
+        return self.samples / max(self.clock() - self.started, 1e-9)
+
+    def summary(self):
+        return {
+            'lines': self.lines,
+            'samples': self.samples,
+            'parse_failures': self.parse_failures,
+            'samples_per_sec': self.samples_per_sec(),
+            'read_to_clean': self.read_to_clean.summary(),
+        }
@@ -1,16 +1,51 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import median_abs_deviation
+from numpy.lib.stride_tricks import sliding_window_view
 import os
 
+from quantile_sketch import KLLSketch
+
+SENSOR_COLUMNS = ['co2', 'temperature', 'humidity']
+# Files larger than this are cleaned in streaming mode
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+def rolling_hampel(values, window_size=10, n_sigmas=3, block_size=262144):
+    """Trailing-window Hampel filter over an array
+
+    Each point is compared with the median and MAD of the window_size raw values
+    ending at it, exactly like RealTimeHampelFilter, so offline and streaming
+    cleaning agree sample for sample. The first window_size - 1 points are kept
+    as-is. Work is done in blocks of block_size rows to bound memory.
+    """
+    values = np.asarray(values, dtype=float)
+    cleaned = values.copy()
+    n = len(values)
+    if n < window_size:
+        return cleaned
+
+    scratch = np.empty((min(block_size, n), window_size))
+    for start in range(window_size - 1, n, block_size):
+        stop = min(start + block_size, n)
+        windows = sliding_window_view(values[start - window_size + 1:stop], window_size)
+        buf = scratch[:stop - start]
+
+        # Rolling median; np.median partitions the scratch copy in place
+        np.copyto(buf, windows)
+        median = np.median(buf, axis=1, overwrite_input=True)
+
+        # Rolling MAD
+        np.subtract(windows, median[:, None], out=buf)
+        np.abs(buf, out=buf)
+        mad = np.median(buf, axis=1, overwrite_input=True)
+
+        current = values[start:stop]
+        cleaned[start:stop] = np.where(np.abs(current - median) > n_sigmas * mad,
+                                       median, current)
+    return cleaned
+
 def hampel_filter(series, window_size=10, n_sigmas=3):
     """Apply Hampel filter for outlier detection and removal"""
-    rolling_median = series.rolling(window=window_size, center=True).median()
-    mad = median_abs_deviation(series, nan_policy='omit')
-    threshold = n_sigmas * mad
-    difference = np.abs(series - rolling_median)
-    
-    return np.where(difference > threshold, rolling_median, series)
+    return rolling_hampel(np.asarray(series, dtype=float), window_size, n_sigmas)
 
 def process_data(input_file):
     """Process single file with Hampel filter and percentile clipping"""
@@ -19,7 +54,7 @@ def process_data(input_file):
     df['timestamp'] = pd.to_datetime(df['timestamp'])
     
     # Process each sensor column
-    for col in ['co2', 'temperature', 'humidity']:
+    for col in SENSOR_COLUMNS:
         # Apply Hampel filter
         df[col] = hampel_filter(df[col])
         
@@ -30,6 +65,53 @@ def process_data(input_file):
     
     return df[['timestamp', 'timestamp_ms', 'co2', 'temperature', 'humidity']]
 
+class ChunkedHampel:
+    """rolling_hampel applied chunk by chunk, carrying the last window_size - 1 raw values over"""
+    def __init__(self, window_size=10, n_sigmas=3):
+        self.window_size = window_size
+        self.n_sigmas = n_sigmas
+        self.tail = np.empty(0)
+
+    def process(self, values):
+        combined = np.concatenate([self.tail, np.asarray(values, dtype=float)])
+        cleaned = rolling_hampel(combined, self.window_size, self.n_sigmas)
+        self.tail = combined[-(self.window_size - 1):] if self.window_size > 1 else combined[:0]
+        return cleaned[len(combined) - len(values):]
+
+def _filtered_chunks(input_file, chunksize, window_size, n_sigmas):
+    """Yield chunks of input_file with the Hampel filter applied to every sensor column"""
+    filters = {col: ChunkedHampel(window_size, n_sigmas) for col in SENSOR_COLUMNS}
+    for chunk in pd.read_csv(input_file, chunksize=chunksize):
+        for col in SENSOR_COLUMNS:
+            chunk[col] = filters[col].process(chunk[col].to_numpy())
+        yield chunk
+
+def process_data_streaming(input_file, output_file, chunksize=100000,
+                           window_size=10, n_sigmas=3, sketch_k=2000):
+    """Clean a file of any size in bounded memory
+
+    Pass 1 filters the file chunk by chunk and feeds a KLL sketch per column to
+    estimate the 0.5/99.5 percentile clipping bounds. Pass 2 filters again (the
+    filter is deterministic, so no temporary file is needed), clips and appends
+    each chunk to output_file.
+    """
+    sketches = {col: KLLSketch(sketch_k) for col in SENSOR_COLUMNS}
+    for chunk in _filtered_chunks(input_file, chunksize, window_size, n_sigmas):
+        for col in SENSOR_COLUMNS:
+            sketches[col].update(chunk[col].to_numpy())
+
+    bounds = {col: sketches[col].quantiles([0.005, 0.995]) for col in SENSOR_COLUMNS}
+
+    first = True
+    for chunk in _filtered_chunks(input_file, chunksize, window_size, n_sigmas):
+        for col in SENSOR_COLUMNS:
+            lower, upper = bounds[col]
+            chunk[col] = chunk[col].clip(lower, upper)
+        chunk[['timestamp', 'timestamp_ms', 'co2', 'temperature', 'humidity']].to_csv(
+            output_file, mode='w' if first else 'a', header=first, index=False)
+        first = False
+    return bounds
+
 def main():
     export_dir = "exports"
     
@@ -39,8 +121,11 @@ def main():
         output_file = os.path.join(export_dir, f'{condition}_cleaned.csv')
         
         # Process and save
-        cleaned_df = process_data(input_file)
-        cleaned_df.to_csv(output_file, index=False)
+        if os.path.getsize(input_file) > STREAMING_THRESHOLD_BYTES:
+            process_data_streaming(input_file, output_file)
+        else:
+            cleaned_df = process_data(input_file)
+            cleaned_df.to_csv(output_file, index=False)
         print(f"Saved cleaned data to: {output_file}")
 
 if __name__ == "__main__":
@@ -0,0 +1,77 @@
+import numpy as np
+
+class KLLSketch:
+    """Mergeable approximate-quantile sketch (KLL) with memory independent of stream length
+
+    Items live in a stack of compactors; an item at level h stands for 2**h
+    inputs. When a level overflows it is sorted and every other item is promoted,
+    so the sketch holds O(k log(n / k)) values. Rank error is roughly 1.7 / k.
+    """
+    def __init__(self, k=2000, seed=None):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Top level holds k items, lower levels shrink geometrically (never below 2)
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add an array of values (NaN is ignored)"""
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so total weight is preserved
+                keep = items[:1] if len(items) % 2 else items[:0]
+                paired = items[len(keep):]
+                promoted = paired[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                # Capacities shift when a level is added, so restart from the bottom
+                level = 0
+                continue
+            level += 1
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1)"""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        if not self.count:
+            return [np.nan for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_h), 2.0 ** h)
+                                  for h, items_h in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        return [float(items[min(np.searchsorted(cumulative, q * total, side='left'),
+                                len(items) - 1)]) for q in qs]
+
+    def __len__(self):
+        return sum(len(items) for items in self.levels)
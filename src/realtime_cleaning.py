@@ -1,24 +1,37 @@
-import pandas as pd
+import argparse
 import numpy as np
-from scipy.stats import median_abs_deviation
 from collections import deque
 import time
-import serial  # for reading sensor data
 
-class RealTimeHampelFilter:
+from edge.hampel import EdgeHampelFilter
+from ingestion import parse_sensor_line
+from metrics import PipelineStats
+
+class RealTimeHampelFilter(EdgeHampelFilter):
+    """Hampel filter for one co2/temperature/humidity reading at a time
+
+    process_reading is the edge runtime's (sorted windows, O(log w) median
+    and MAD, no numpy). hampel_filter_point with the *_window deques is the
+    original numpy/scipy path, kept as the reference it must match exactly.
+    """
+    __slots__ = ('window_size', 'n_sigmas', 'co2_window', 'temp_window', 'humidity_window')
+
     def __init__(self, window_size=10, n_sigmas=3):
+        super().__init__(window_size, n_sigmas)
         self.window_size = window_size
         self.n_sigmas = n_sigmas
-        # Initialize sliding windows for each sensor
+        # Reference-path windows; process_reading does not fill them
         self.co2_window = deque(maxlen=window_size)
         self.temp_window = deque(maxlen=window_size)
         self.humidity_window = deque(maxlen=window_size)
 
     def hampel_filter_point(self, value, window):
-        """Apply Hampel filter to a single point"""
+        """Apply Hampel filter to a single point (reference implementation)"""
         if len(window) < self.window_size:
             return value
         
+        # scipy is only needed by this reference path, so the gateway never imports it
+        from scipy.stats import median_abs_deviation
         window_array = np.array(window)
         median = np.median(window_array)
         mad = median_abs_deviation(window_array, nan_policy='omit')
@@ -28,68 +41,130 @@ class RealTimeHampelFilter:
             return median
         return value
 
-    def process_reading(self, co2, temperature, humidity):
-        """Process new sensor readings"""
-        # Add new values to windows
-        self.co2_window.append(co2)
-        self.temp_window.append(temperature)
-        self.humidity_window.append(humidity)
-        
-        # Apply Hampel filter
-        cleaned_co2 = self.hampel_filter_point(co2, self.co2_window)
-        cleaned_temp = self.hampel_filter_point(temperature, self.temp_window)
-        cleaned_humidity = self.hampel_filter_point(humidity, self.humidity_window)
-        
-        return cleaned_co2, cleaned_temp, cleaned_humidity
+class MultiChannelHampelFilter:
+    """Hampel filter for many channels at once, backed by a (channels, window) ring buffer
 
-def read_sensor_data(serial_port):
-    """Read data from sensor via serial port"""
-    try:
-        line = serial_port.readline().decode('utf-8').strip()
-        # Assuming format: "co2,temperature,humidity"
-        co2, temp, humidity = map(float, line.split(','))
-        return co2, temp, humidity
-    except Exception as e:
-        print(f"Error reading sensor: {e}")
-        return None, None, None
+    Each call to process_batch takes one reading per channel (for example an
+    (n_devices, 3) array of co2/temperature/humidity) and filters all of them
+    with vectorized median/MAD, following the same rules as RealTimeHampelFilter.
+    """
+    def __init__(self, n_channels, window_size=10, n_sigmas=3):
+        self.n_channels = n_channels
+        self.window_size = window_size
+        self.n_sigmas = n_sigmas
+        self.buffer = np.empty((n_channels, window_size))
+        self.position = 0   # Ring slot the next reading goes into
+        self.count = 0      # Readings seen, capped at window_size
+        # Scratch space so a tick allocates nothing the size of the buffer
+        self.scratch = np.empty((n_channels, window_size))
+        self.median = np.empty(n_channels)
+
+    def process_batch(self, readings):
+        """Add one reading per channel and return the cleaned readings in the same shape"""
+        readings = np.asarray(readings, dtype=float)
+        values = readings.reshape(self.n_channels)
+
+        self.buffer[:, self.position] = values
+        self.position = (self.position + 1) % self.window_size
+        self.count = min(self.count + 1, self.window_size)
+        if self.count < self.window_size:
+            return readings.copy()
+
+        # Median per channel; np.median partitions the scratch copy in place
+        np.copyto(self.scratch, self.buffer)
+        np.median(self.scratch, axis=1, overwrite_input=True, out=self.median)
+
+        # MAD per channel
+        np.subtract(self.buffer, self.median[:, None], out=self.scratch)
+        np.abs(self.scratch, out=self.scratch)
+        mad = np.median(self.scratch, axis=1, overwrite_input=True)
+        threshold = self.n_sigmas * mad
+
+        cleaned = np.where(np.abs(values - self.median) > threshold, self.median, values)
+        return cleaned.reshape(readings.shape)
+
+def clean_stream(serial_port, hampel, stats, stop_on_eof=False):
+    """Yield (timestamp_ms, raw, cleaned) as soon as each line arrives
+
+    readline() blocks until the sensor sends a full line, so there is no polling
+    delay between a reading arriving and it being cleaned.
+    """
+    while True:
+        line = serial_port.readline()
+        received = time.perf_counter()
+        if not line:
+            # Only a read timeout (or the end of a replayed recording) returns nothing
+            if stop_on_eof:
+                return
+            continue
+        stats.lines += 1
+        try:
+            timestamp_ms, co2, temp, humidity = parse_sensor_line(line.decode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            stats.parse_failures += 1
+            continue
+
+        cleaned = hampel.process_reading(co2, temp, humidity)
+        stats.samples += 1
+        stats.read_to_clean.record(time.perf_counter() - received)
+        yield timestamp_ms, (co2, temp, humidity), cleaned
+
+def print_stats(stats):
+    summary = stats.summary()
+    latency = summary['read_to_clean']
+    print(f"\n[stats] {summary['samples']} samples, {summary['samples_per_sec']:.2f} samples/s, "
+          f"{summary['parse_failures']} parse failures; read-to-clean "
+          f"p50 {latency['p50_ms']:.3f} ms, p99 {latency['p99_ms']:.3f} ms, "
+          f"max {latency['max_ms']:.3f} ms")
 
 def main():
     # Initialize serial connection (adjust port and baud rate as needed)
-    SERIAL_PORT = 'COM3'  # Change to your sensor's port
-    BAUD_RATE = 9600
+    parser = argparse.ArgumentParser(description="Clean live sensor readings with a Hampel filter")
+    parser.add_argument('--port', default='COM3', help="sensor's serial port")
+    parser.add_argument('--baud', type=int, default=9600)
+    args = parser.parse_args()
+    SERIAL_PORT = args.port
+    BAUD_RATE = args.baud
+    STATS_INTERVAL = 60  # Seconds between metric printouts
     
+    stats = PipelineStats()
     try:
+        import serial  # for reading sensor data
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE)
         print(f"Connected to sensor on {SERIAL_PORT}")
         
         # Initialize Hampel filter
         hampel = RealTimeHampelFilter(window_size=10, n_sigmas=3)
+        # Insect detection on the cleaned CO2 stream, updated every sample
+        from insect_detection import StreamingInsectDetector
+        insect_detector = StreamingInsectDetector()
+        last_stats = time.monotonic()
         
-        while True:
-            # Read sensor data
-            co2, temp, humidity = read_sensor_data(ser)
-            
-            if all(v is not None for v in [co2, temp, humidity]):
-                # Clean data using Hampel filter
-                cleaned_co2, cleaned_temp, cleaned_humidity = hampel.process_reading(
-                    co2, temp, humidity
-                )
+        for timestamp_ms, (co2, temp, humidity), cleaned in clean_stream(ser, hampel, stats):
+            cleaned_co2, cleaned_temp, cleaned_humidity = cleaned
+            if timestamp_ms is None:
+                # 3-field lines carry no device clock; use the local one
+                timestamp_ms = int(time.monotonic() * 1000)
+            detection, results = insect_detector.update(timestamp_ms, cleaned_co2)
                 
-                # Print results
-                print("\nRaw Readings:")
-                print(f"CO2: {co2:.2f}, Temp: {temp:.2f}, Humidity: {humidity:.2f}")
-                print("Cleaned Readings:")
-                print(f"CO2: {cleaned_co2:.2f}, Temp: {cleaned_temp:.2f}, "
-                      f"Humidity: {cleaned_humidity:.2f}")
-            
-            # Add small delay to prevent excessive CPU usage
-            time.sleep(0.1)
+            # Print results
+            print("\nRaw Readings:")
+            print(f"CO2: {co2:.2f}, Temp: {temp:.2f}, Humidity: {humidity:.2f}")
+            print("Cleaned Readings:")
+            print(f"CO2: {cleaned_co2:.2f}, Temp: {cleaned_temp:.2f}, "
+                  f"Humidity: {cleaned_humidity:.2f}")
+            print(f"Insects detected: {bool(detection)} (score {results['score']:.1f})")
+
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                print_stats(stats)
+                last_stats = time.monotonic()
             
     except KeyboardInterrupt:
         print("\nStopping sensor reading...")
     except Exception as e:
         print(f"Error: {e}")
     finally:
+        print_stats(stats)
         if 'ser' in locals():
             ser.close()
             print("Serial connection closed")
@@ -0,0 +1,199 @@
+"""Load-test the ingestion pipeline with virtual serial devices
+
+    python src/replay.py --devices 1 10 100 --speed 100 1000 10000 --duration 10
+
+Each virtual device replays cleaned_data/<condition>_*_data_*.csv as serial
+lines through a ReplaySerial into the real path: ingest_serial (WAL, daily
+CSV, segment store, rollups, upload queue), then Hampel cleaning and the
+insect and fan detectors. For every devices x speed combination it reports
+sustained samples/s, send-to-detection latency percentiles and samples lost
+to serial buffer overruns or a full upload queue.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from fake_serial import ReplaySerial, load_daily_readings, recorded_rate
+from ingestion import BackgroundUploader, DailyCSVWriter, MemorySink, ingest_serial
+from quantile_sketch import KLLSketch
+
+LATENCY_BATCH = 4096  # Latencies buffered per device before they go into its sketch
+
+class DevicePipeline:
+    """Per-device upload hook: cleans and scores each reading, then queues the upload
+
+    ingest_serial hands every reading to upload(); this stands in for it,
+    runs the realtime stages and records latency from the moment the
+    virtual device sent the line, in a KLLSketch (merged across devices
+    for the percentiles) plus the exact maximum.
+    """
+    def __init__(self, ser, upload, runtime='edge', clock=time.monotonic):
+        self.ser = ser
+        self.upload = upload
+        self.clock = clock
+        self.latency = KLLSketch()
+        self.latencies = []  # Not yet in the sketch
+        self.latency_max = 0.0
+        self.samples = 0
+        if runtime == 'edge':
+            from edge import EdgeDevice
+            self.device = EdgeDevice()
+            self.stages = None
+        else:
+            from fan_detection import StreamingFanDetector
+            from insect_detection import StreamingInsectDetector
+            from realtime_cleaning import RealTimeHampelFilter
+            self.device = None
+            self.stages = (RealTimeHampelFilter(), StreamingInsectDetector(),
+                           StreamingFanDetector())
+
+    def __call__(self, current_time, timestamp_ms, co2, temperature, humidity):
+        if self.device is not None:
+            self.device.process(timestamp_ms, co2, temperature, humidity)
+        else:
+            hampel, insects, fan = self.stages
+            cleaned = hampel.process_reading(co2, temperature, humidity)
+            insects.update(timestamp_ms, cleaned[0])
+            fan.update(current_time, timestamp_ms, cleaned[1], cleaned[2])
+        self.upload(current_time, timestamp_ms, co2, temperature, humidity)
+        self.samples += 1
+        latency = self.clock() - self.ser.last_due
+        self.latencies.append(latency)
+        if latency > self.latency_max:
+            self.latency_max = latency
+        if len(self.latencies) >= LATENCY_BATCH:
+            self.flush_latency()
+
+    def flush_latency(self):
+        """Move the buffered latencies into the sketch"""
+        self.latency.update(self.latencies)
+        self.latencies = []
+
+def run_replay(readings, n_devices, speed, duration, output_dir, runtime='edge',
+               buffer_lines=256, queue_size=1000, store=True, wal=True):
+    """Run n_devices virtual devices for up to duration seconds; returns a result dict"""
+    from rollups import RollupStore
+    from segment_store import SegmentStore
+    from wal import Checkpointer, WriteAheadLog
+
+    uploader = BackgroundUploader(MemorySink(), maxsize=queue_size, workers=1, batch_size=30,
+                                  max_delay=1.0).start()
+    segments = SegmentStore(os.path.join(output_dir, 'segments')) if store else None
+    rollups = RollupStore(os.path.join(output_dir, 'rollups')) if store else None
+    devices = []
+    for i in range(n_devices):
+        device_id = f'sim{i:03d}'
+        ser = ReplaySerial(readings, speed=speed, port=device_id, buffer_lines=buffer_lines)
+        csv_writer = DailyCSVWriter(os.path.join(output_dir, 'csv', device_id), flush_rows=20)
+        log = checkpointer = None
+        if wal:
+            log = WriteAheadLog(os.path.join(output_dir, 'wal', device_id))
+            # Local sinks only: the shared upload queue is rarely empty under load
+            checkpointer = Checkpointer(log, csv_writer, None, None, None, interval=5.0)
+            log.start()
+        devices.append((device_id, ser, csv_writer, log, checkpointer,
+                        DevicePipeline(ser, uploader.put, runtime)))
+
+    def serve(device_id, ser, csv_writer, log, checkpointer, pipeline):
+        ingest_serial(ser, csv_writer, pipeline, stop_on_eof=True, verbose=False,
+                      store=segments, device=device_id, rollups=rollups, wal=log,
+                      checkpointer=checkpointer)
+
+    threads = [threading.Thread(target=serve, args=device, daemon=True) for device in devices]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    # Closing a port makes its readline() return b'', which ends ingest_serial
+    timer = threading.Timer(duration, lambda: [device[1].close() for device in devices])
+    timer.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    timer.cancel()
+    uploader.stop()
+    for _, _, csv_writer, log, _, _ in devices:
+        csv_writer.close()
+        if log is not None:
+            log.close()
+    if segments is not None:
+        segments.close()
+        rollups.close()
+
+    # Recorded samples per second of device time
+    rate = recorded_rate(readings)
+    latency = KLLSketch()
+    for device in devices:
+        device[5].flush_latency()
+        latency.merge(device[5].latency)
+    p50, p95, p99 = latency.quantiles([0.5, 0.95, 0.99]) if latency.count else (0.0,) * 3
+    samples = sum(device[5].samples for device in devices)
+    return {
+        'devices': n_devices,
+        'speed': speed,
+        'runtime': runtime,
+        'elapsed_s': elapsed,
+        'samples': samples,
+        'samples_per_sec': samples / elapsed,
+        'offered_per_sec': n_devices * speed * rate,
+        'latency_p50_ms': 1000 * p50,
+        'latency_p95_ms': 1000 * p95,
+        'latency_p99_ms': 1000 * p99,
+        'latency_max_ms': 1000 * max(device[5].latency_max for device in devices),
+        'serial_dropped': sum(device[1].dropped for device in devices),
+        'upload_dropped': uploader.stats['dropped'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded readings through the pipeline")
+    parser.add_argument('--data-dir', default="cleaned_data")
+    parser.add_argument('--condition', default='worm')
+    parser.add_argument('--devices', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--speed', type=float, nargs='+', default=[1, 100, 1000, 10000],
+                        help="replay speed-up factors (1 = real time)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per run")
+    parser.add_argument('--runtime', choices=['edge', 'reference'], default='edge',
+                        help="edge runtime or RealTimeHampelFilter + streaming detectors")
+    parser.add_argument('--buffer-lines', type=int, default=256,
+                        help="serial buffer per device; older unread lines are dropped")
+    parser.add_argument('--no-store', action='store_true', help="no segment store or rollups")
+    parser.add_argument('--no-wal', action='store_true')
+    parser.add_argument('--output-dir', default=None, help="keep outputs here (default: temp)")
+    parser.add_argument('--json', default=None, help="also write the results to this file")
+    args = parser.parse_args()
+
+    readings = load_daily_readings(args.data_dir, args.condition)
+    if not readings:
+        raise SystemExit(f"No {args.condition}_*_data_*.csv readings in {args.data_dir}")
+
+    print(f"{'devices':>7} {'speed':>7} {'offered/s':>10} {'samples/s':>10} {'p50 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'serial drop':>11} {'upload drop':>11}")
+    results = []
+    for n_devices in args.devices:
+        for speed in args.speed:
+            output_dir = args.output_dir or tempfile.mkdtemp()
+            if args.output_dir:
+                output_dir = os.path.join(output_dir, f'{n_devices}x{speed:g}')
+            try:
+                result = run_replay(readings, n_devices, speed, args.duration, output_dir,
+                                    args.runtime, args.buffer_lines,
+                                    store=not args.no_store, wal=not args.no_wal)
+            finally:
+                if not args.output_dir:
+                    shutil.rmtree(output_dir)
+            results.append(result)
+            print(f"{n_devices:>7} {speed:>7g} {result['offered_per_sec']:>10.1f} "
+                  f"{result['samples_per_sec']:>10.1f} {result['latency_p50_ms']:>8.3f} "
+                  f"{result['latency_p95_ms']:>8.3f} {result['latency_p99_ms']:>8.3f} "
+                  f"{result['latency_max_ms']:>8.1f} {result['serial_dropped']:>11} "
+                  f"{result['upload_dropped']:>11}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
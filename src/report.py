@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Headless: workers inherit the backend, so no display is ever needed
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from analyze_env_changes import cached_env_changes, plot_changes
+from analyze_windows import cached_window_rates_all, plot_window_comparison
+from data_store import load_condition
+from feature_cache import FeatureCache
+from visualize import SENSORS, cached_change_rates, create_comparison_plots
+
+MANIFEST_NAME = 'report_manifest.json'
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+# Bump to redraw every figure after a change the source hash can't see (fonts, styles, ...)
+REPORT_VERSION = 1
+
+def save_comparison(worm_df, withoutworm_df, worm_rates, withoutworm_rates, output_dir):
+    """visualize's sensor comparison figure, saved like visualize.main does"""
+    fig = create_comparison_plots(worm_df, withoutworm_df, worm_rates, withoutworm_rates)
+    fig.savefig(os.path.join(output_dir, 'sensor_comparison.png'), dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+def _source_files(func):
+    """Source files of func's module and of every src/ module it imports, transitively"""
+    seen = set()
+    stack = [sys.modules[func.__module__]]
+    while stack:
+        module = stack.pop()
+        path = os.path.abspath(getattr(module, '__file__', None) or '')
+        if path in seen or not path.startswith(SRC_DIR + os.sep):
+            continue
+        seen.add(path)
+        for value in vars(module).values():
+            if inspect.ismodule(value):
+                stack.append(value)
+            elif isinstance(getattr(value, '__module__', None), str) and \
+                    value.__module__ in sys.modules:
+                # Names brought in with `from x import y`
+                stack.append(sys.modules[value.__module__])
+    return sorted(seen)
+
+def _fingerprint(func, args):
+    """Hash of a figure's inputs and of the source of every src/ module drawing it"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{REPORT_VERSION} {matplotlib.__version__}'.encode())
+    for path in _source_files(func):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    for arg in args:
+        if isinstance(arg, (pd.DataFrame, pd.Series)):
+            h.update(pd.util.hash_pandas_object(arg).to_numpy().tobytes())
+            names = arg.columns if isinstance(arg, pd.DataFrame) else [arg.name]
+            h.update(repr(list(names)).encode())
+        else:
+            h.update(repr(arg).encode())
+    return h.hexdigest()
+
+def load_inputs(data_dir, cache=None, store_root=None):
+    """Load both datasets and derive every plotted feature once"""
+    cache = cache or FeatureCache()
+    data = {}
+    for condition in ['worm', 'withoutworm']:
+        df = load_condition(data_dir, condition, store_root=store_root)
+        data[condition] = {
+            'df': df,
+            'env_changes': cached_env_changes(df, cache=cache),
+            'window_rates': cached_window_rates_all(df, SENSORS, cache=cache),
+            'change_rates': cached_change_rates(df, cache=cache),
+        }
+    return data
+
+def figure_tasks(data, output_dir):
+    """(file name, function, args) for every figure of the report"""
+    worm, noworm = data['worm'], data['withoutworm']
+    tasks = [
+        ('env_changes_with_worms.png', plot_changes,
+         (worm['env_changes'], 'With_Worms', output_dir)),
+        ('env_changes_without_worms.png', plot_changes,
+         (noworm['env_changes'], 'Without_Worms', output_dir)),
+    ]
+    for sensor in SENSORS:
+        windows = [rates[rates['sensor'] == sensor].reset_index(drop=True)
+                   for rates in (worm['window_rates'], noworm['window_rates'])]
+        tasks.append((f'{sensor}_window_analysis.png', plot_window_comparison,
+                      (windows[0], windows[1], sensor, output_dir)))
+    columns = ['timestamp', 'timestamp_ms'] + SENSORS
+    tasks.append(('sensor_comparison.png', save_comparison,
+                  (worm['df'][columns], noworm['df'][columns],
+                   worm['change_rates'], noworm['change_rates'], output_dir)))
+    return tasks
+
+def _render(task):
+    name, func, args = task
+    start = time.perf_counter()
+    func(*args)
+    plt.close('all')
+    return name, time.perf_counter() - start
+
+def generate_report(data_dir="cleaned_data", output_dir="pic", workers=None, force=False,
+                    store_root=None):
+    """Render every figure to output_dir in a process pool, skipping unchanged ones
+
+    A manifest in output_dir records each figure's input fingerprint; figures
+    whose fingerprint matches and whose file still exists are not redrawn.
+    Returns {file name: seconds spent, or None if skipped}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    tasks = figure_tasks(load_inputs(data_dir, store_root=store_root), output_dir)
+    fingerprints = {name: _fingerprint(func, args) for name, func, args in tasks}
+    todo = [task for task in tasks
+            if manifest.get(task[0]) != fingerprints[task[0]] or
+            not os.path.exists(os.path.join(output_dir, task[0]))]
+
+    timings = {name: None for name, _, _ in tasks}
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for name, seconds in executor.map(_render, todo):
+                timings[name] = seconds
+                manifest[name] = fingerprints[name]
+
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all analysis figures in parallel")
+    parser.add_argument('--data-dir', default="cleaned_data")
+    parser.add_argument('--store', default=None,
+                        help="read the conditions from this segment store root instead")
+    parser.add_argument('--output-dir', default="pic")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help="redraw figures even if unchanged")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    timings = generate_report(args.data_dir, args.output_dir, args.workers, args.force,
+                              args.store)
+    for name, seconds in timings.items():
+        status = "skipped (unchanged)" if seconds is None else f"{seconds:.2f} s"
+        print(f"{name}: {status}")
+    print(f"Report written to {args.output_dir}/ in {time.perf_counter() - start:.2f} s")
+
+if __name__ == "__main__":
+    main()
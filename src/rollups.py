@@ -0,0 +1,378 @@
+import argparse
+import os
+import numpy as np
+
+from segment_store import SENSORS, to_ns
+
+# Tier name -> bucket width in ns; each width is a multiple of the one before,
+# so every bucket of a tier is the merge of whole buckets of the finer tier
+TIERS = {
+    '1min': 60 * 10**9,
+    '5min': 5 * 60 * 10**9,
+    '30min': 30 * 60 * 10**9,
+    '1h': 60 * 60 * 10**9,
+}
+# One record per bucket [start_ns, start_ns + width). count/sum/sumsq/min/max skip
+# NaN like pandas; first/last are the values of the first/last sample (NaN
+# included, like window_aggregates) and first_ns/last_ns their times, which is
+# what makes two buckets of the same interval mergeable in any order
+ROLLUP_DTYPE = np.dtype([
+    ('start_ns', '<i8'), ('count', '<i8'), ('sum', '<f8'), ('sumsq', '<f8'), ('min', '<f8'),
+    ('max', '<f8'), ('first', '<f8'), ('last', '<f8'), ('first_ns', '<i8'), ('last_ns', '<i8'),
+])
+ROLLUP_ROOT = "rollups"          # Cleaned conditions imported from cleaned_data
+RAW_ROLLUP_ROOT = "raw_rollups"  # Raw gateway readings (trans.py)
+
+def _bucket(start_ns, time_ns, value):
+    """A one-sample bucket as a list in ROLLUP_DTYPE field order"""
+    if value != value:
+        return [start_ns, 0, 0.0, 0.0, np.inf, -np.inf, value, value, time_ns, time_ns]
+    return [start_ns, 1, value, value * value, value, value, value, value, time_ns, time_ns]
+
+def _merge_into(bucket, other):
+    """Merge bucket list `other` into `bucket` (same or enclosing interval)"""
+    bucket[1] += other[1]
+    bucket[2] += other[2]
+    bucket[3] += other[3]
+    bucket[4] = min(bucket[4], other[4])
+    bucket[5] = max(bucket[5], other[5])
+    if other[8] < bucket[8]:
+        bucket[6], bucket[8] = other[6], other[8]
+    if other[9] >= bucket[9]:
+        bucket[7], bucket[9] = other[7], other[9]
+
+def from_samples(time_ns, values, width_ns=TIERS['1min']):
+    """Buckets of width_ns over raw samples, in time order"""
+    time_ns = np.asarray(time_ns, dtype=np.int64)
+    values = np.asarray(values, dtype=float)
+    if len(time_ns) > 1 and np.any(np.diff(time_ns) < 0):
+        order = np.argsort(time_ns, kind='stable')
+        time_ns, values = time_ns[order], values[order]
+    records = np.empty(len(time_ns), dtype=ROLLUP_DTYPE)
+    valid = ~np.isnan(values)
+    records['start_ns'] = time_ns // width_ns * width_ns
+    records['count'] = valid
+    records['sum'] = np.where(valid, values, 0.0)
+    records['sumsq'] = records['sum'] ** 2
+    records['min'] = np.where(valid, values, np.inf)
+    records['max'] = np.where(valid, values, -np.inf)
+    records['first'] = records['last'] = values
+    records['first_ns'] = records['last_ns'] = time_ns
+    return merge_buckets(records, width_ns)
+
+def merge_buckets(records, width_ns=None):
+    """Merge buckets into width_ns buckets (default: merge buckets with equal start)
+
+    Works on any mix of finer and duplicate buckets, in any order: counts,
+    sums and extremes add up and first/last come from the earliest/latest sample.
+    """
+    if not len(records):
+        return np.empty(0, dtype=ROLLUP_DTYPE)
+    start = records['start_ns']
+    if width_ns is not None:
+        start = start // width_ns * width_ns
+    by_first = np.lexsort((records['first_ns'], start))
+    records, start = records[by_first], start[by_first]
+    cuts = np.flatnonzero(np.r_[True, start[1:] != start[:-1]])
+    ends = np.r_[cuts[1:], len(records)] - 1
+    by_last = np.lexsort((records['last_ns'], start))
+
+    merged = np.empty(len(cuts), dtype=ROLLUP_DTYPE)
+    merged['start_ns'] = start[cuts]
+    for field in ('count', 'sum', 'sumsq'):
+        merged[field] = np.add.reduceat(records[field], cuts)
+    merged['min'] = np.minimum.reduceat(records['min'], cuts)
+    merged['max'] = np.maximum.reduceat(records['max'], cuts)
+    merged['first'] = records['first'][cuts]
+    merged['first_ns'] = records['first_ns'][cuts]
+    merged['last'] = records['last'][by_last][ends]
+    merged['last_ns'] = records['last_ns'][by_last][ends]
+    return merged
+
+def bucket_stats(records):
+    """mean, sample std, min and max per bucket (NaN where undefined)"""
+    count = records['count'].astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = records['sum'] / count
+        var = (records['sumsq'] - records['sum'] * mean) / (count - 1)
+    std = np.sqrt(np.where(count > 1, np.maximum(var, 0.0), np.nan))
+    empty = records['count'] == 0
+    minimum = np.where(empty, np.nan, records['min'])
+    maximum = np.where(empty, np.nan, records['max'])
+    return mean, std, minimum, maximum
+
+class RollupSeries:
+    """Rollup tiers of one device/sensor, kept up to date one sample at a time
+
+    Each tier has one open bucket. A sample goes into the open 1-minute
+    bucket; when a sample for a later minute arrives the bucket is closed,
+    written to its tier file and merged into the open 5-minute bucket, and
+    so on up to 1 hour. A sample older than the open minute (a clock step
+    back) is written as its own bucket to every tier's .late file. Readers
+    merge buckets with the same start, so late samples and the partial
+    buckets close() writes on shutdown combine with later ones. sync()
+    leaves the open buckets in memory; reopening after a crash rebuilds the
+    open 5 min - 1 h buckets from the finer buckets written since, and only
+    the open minute has to be replayed.
+    """
+    def __init__(self, directory, writable=True):
+        self.directory = directory
+        self.writable = writable
+        self.widths = list(TIERS.values())
+        self.open = [None] * len(TIERS)
+        self.written_ns = None  # Start of the last 1-minute bucket on disk
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+            for name in TIERS:
+                for path in (self._path(name), self._path(name, late=True)):
+                    if os.path.exists(path):
+                        # Drop a record torn by a crash mid-write
+                        size = os.path.getsize(path)
+                        with open(path, 'r+b') as f:
+                            f.truncate(size - size % ROLLUP_DTYPE.itemsize)
+            last_ns = self.last_ns()
+            if last_ns is not None:
+                self.written_ns = last_ns // self.widths[0] * self.widths[0]
+            self._restore_open()
+
+    def _path(self, tier, late=False):
+        return os.path.join(self.directory, f'{tier}.late' if late else f'{tier}.bin')
+
+    def _tier(self, tier):
+        """Memory map of a tier file (in start order), or None if it is empty"""
+        path = self._path(tier)
+        rows = os.path.getsize(path) // ROLLUP_DTYPE.itemsize if os.path.exists(path) else 0
+        return np.memmap(path, dtype=ROLLUP_DTYPE, mode='r', shape=(rows,)) if rows else None
+
+    def _restore_open(self):
+        """Rebuild each coarser tier's open bucket from finer buckets not yet merged up
+
+        A finer bucket is in a written coarser bucket iff its last sample is
+        no later than that tier's last written sample; the rest all belong
+        to the coarser tier's open bucket.
+        """
+        names = list(TIERS)
+        for level in range(1, len(names)):
+            finer = self._tier(names[level - 1])
+            if finer is None:
+                continue
+            coarser = self._tier(names[level])
+            mark = coarser['last_ns'][-1] if coarser is not None else np.iinfo(np.int64).min
+            pending = np.array(finer[np.searchsorted(finer['last_ns'], mark, side='right'):])
+            if len(pending):
+                bucket = merge_buckets(pending, self.widths[level])[-1]
+                self.open[level] = list(bucket.tolist())
+
+    def _write(self, tier, buckets, late=False):
+        with open(self._path(tier, late), 'ab') as f:
+            f.write(np.array([tuple(b) for b in buckets], dtype=ROLLUP_DTYPE).tobytes())
+
+    def add(self, time_ns, value):
+        value = float(value)
+        current = self.open[0]
+        width = self.widths[0]
+        floor = current[0] if current is not None else self.written_ns
+        if floor is not None and time_ns < floor:
+            # Late sample (tier files stay in start order): its own bucket in every tier
+            for tier, tier_width in zip(TIERS, self.widths):
+                self._write(tier, [_bucket(time_ns // tier_width * tier_width, time_ns, value)],
+                            late=True)
+            return
+        if current is not None and time_ns >= current[0] + width:
+            self._close(0)
+            current = None
+        sample = _bucket(time_ns // width * width, time_ns, value)
+        if current is None:
+            self.open[0] = sample
+        else:
+            _merge_into(current, sample)
+
+    def _close(self, level):
+        """Write the open bucket of a tier and merge it into the next tier"""
+        bucket = self.open[level]
+        self.open[level] = None
+        self._write(list(TIERS)[level], [bucket])
+        if level == 0:
+            self.written_ns = bucket[0]
+        if level + 1 == len(self.widths):
+            return
+        width = self.widths[level + 1]
+        start = bucket[0] // width * width
+        parent = self.open[level + 1]
+        if parent is not None and parent[0] != start:
+            self._close(level + 1)
+            parent = None
+        if parent is None:
+            self.open[level + 1] = [start] + bucket[1:]
+        else:
+            _merge_into(parent, bucket)
+
+    def close(self):
+        """Write every open (partial) bucket"""
+        for level in range(len(self.widths)):
+            if self.open[level] is not None:
+                self._close(level)
+
+    def sync(self):
+        """fsync every tier file; open buckets stay open (see open_since)"""
+        for tier in TIERS:
+            for path in (self._path(tier), self._path(tier, late=True)):
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        os.fsync(f.fileno())
+
+    def open_since(self):
+        """Time of the first sample in the open 1-minute bucket, or None
+
+        That bucket is only in memory: a crash loses it, so its samples have
+        to stay replayable (the coarser open buckets are rebuilt on reopen).
+        """
+        return None if self.open[0] is None else self.open[0][8]
+
+    def last_ns(self):
+        """Time of the latest sample in a written 1-minute bucket, or None"""
+        records = self._tier(next(iter(TIERS)))
+        return None if records is None else int(records['last_ns'][-1])
+
+    def import_samples(self, time_ns, values):
+        """Replace every tier with tiers built from raw samples (backfill; no open buckets)"""
+        records = from_samples(time_ns, values, self.widths[0])
+        for tier, width in TIERS.items():
+            records = merge_buckets(records, width)
+            with open(self._path(tier), 'wb') as f:
+                f.write(records.tobytes())
+            if os.path.exists(self._path(tier, late=True)):
+                os.remove(self._path(tier, late=True))
+        self.open = [None] * len(TIERS)
+        last_ns = self.last_ns()
+        self.written_ns = None if last_ns is None else last_ns // self.widths[0] * self.widths[0]
+
+    def read(self, tier, start_ns=None, end_ns=None):
+        """Buckets of a tier starting in [start_ns, end_ns), duplicates merged"""
+        width = TIERS[tier]
+        start_ns = None if start_ns is None else start_ns // width * width
+        parts = []
+        mm = self._tier(tier)
+        if mm is not None:
+            # The tier file is in start order: binary search, then read the slice
+            starts = mm['start_ns']
+            lo = 0 if start_ns is None else np.searchsorted(starts, start_ns, side='left')
+            hi = len(mm) if end_ns is None else np.searchsorted(starts, end_ns, side='left')
+            parts.append(np.array(mm[lo:hi]))
+        late = self._path(tier, late=True)
+        if os.path.exists(late):
+            records = np.fromfile(late, dtype=ROLLUP_DTYPE)
+            keep = np.ones(len(records), dtype=bool)
+            if start_ns is not None:
+                keep &= records['start_ns'] >= start_ns
+            if end_ns is not None:
+                keep &= records['start_ns'] < end_ns
+            parts.append(records[keep])
+        if not parts:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        return merge_buckets(np.concatenate(parts))
+
+class RollupStore:
+    """Rollup tiers per device and sensor under root/<device>/<sensor>/<tier>.bin"""
+    def __init__(self, root=ROLLUP_ROOT, writable=True):
+        self.root = root
+        self.writable = writable
+        self.series = {}
+
+    def get(self, device, sensor):
+        key = (device, sensor)
+        if key not in self.series:
+            self.series[key] = RollupSeries(os.path.join(self.root, device, sensor), self.writable)
+        return self.series[key]
+
+    def has_device(self, device):
+        return os.path.isdir(os.path.join(self.root, device))
+
+    def add_reading(self, device, when, co2, temperature, humidity):
+        time_ns = to_ns(when)
+        for sensor, value in zip(SENSORS, (co2, temperature, humidity)):
+            self.get(device, sensor).add(time_ns, value)
+
+    def close(self):
+        for series in self.series.values():
+            series.close()
+
+    def sync(self):
+        for series in self.series.values():
+            series.sync()
+
+    def open_since(self):
+        """Earliest sample time still only in an open 1-minute bucket, or None"""
+        times = [series.open_since() for series in self.series.values()]
+        times = [t for t in times if t is not None]
+        return min(times) if times else None
+
+    def high_water(self, device):
+        """Latest sample time every sensor of a device has in written buckets"""
+        marks = [self.get(device, sensor).last_ns() for sensor in SENSORS]
+        return None if None in marks else min(marks)
+
+    def import_frame(self, device, df):
+        """Backfill every tier of a device from a cleaned DataFrame, replacing what it had"""
+        from windowing import timestamps_ns
+        time_ns = timestamps_ns(df['timestamp'])
+        for sensor in SENSORS:
+            self.get(device, sensor).import_samples(time_ns, df[sensor].to_numpy(float))
+
+    def read(self, device, sensor, tier, start=None, end=None):
+        return self.get(device, sensor).read(tier, to_ns(start), to_ns(end))
+
+    def frame(self, device, tier, start=None, end=None, sensors=SENSORS):
+        """One row per bucket: window_start (UTC) and <sensor>_<stat> columns
+
+        Stats are count, mean, std, min, max, first, last and diff (last -
+        first), named like window_aggregates' output.
+        """
+        import pandas as pd
+        frame = None
+        for sensor in sensors:
+            records = self.read(device, sensor, tier, start, end)
+            mean, std, minimum, maximum = bucket_stats(records)
+            part = pd.DataFrame({
+                'start_ns': records['start_ns'], f'{sensor}_count': records['count'],
+                f'{sensor}_mean': mean, f'{sensor}_std': std, f'{sensor}_min': minimum,
+                f'{sensor}_max': maximum, f'{sensor}_first': records['first'],
+                f'{sensor}_last': records['last'],
+                f'{sensor}_diff': records['last'] - records['first'],
+            })
+            frame = part if frame is None else frame.merge(part, on='start_ns', how='outer',
+                                                           sort=True)
+        frame.insert(0, 'window_start', pd.to_datetime(frame.pop('start_ns'), utc=True))
+        return frame
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-resolution rollups: import and query")
+    parser.add_argument('--root', default=ROLLUP_ROOT)
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="backfill rollups of <condition>_cleaned.csv files")
+    imp.add_argument('--data-dir', default="cleaned_data")
+    imp.add_argument('conditions', nargs='*', default=['worm', 'withoutworm'])
+    query = sub.add_parser('query', help="print one tier of a device")
+    query.add_argument('device')
+    query.add_argument('--tier', choices=list(TIERS), default='1h')
+    query.add_argument('--start', help="ISO time, UTC if no offset")
+    query.add_argument('--end')
+    args = parser.parse_args()
+
+    store = RollupStore(args.root, writable=args.command != 'query')
+    if args.command == 'import':
+        from data_store import load_condition
+        for condition in args.conditions:
+            df = load_condition(args.data_dir, condition)
+            store.import_frame(condition, df)
+            print(f"Rolled up {len(df)} readings of '{condition}'")
+    else:
+        frame = store.frame(args.device, args.tier, args.start, args.end)
+        columns = ['window_start'] + [f'{sensor}_{stat}' for sensor in SENSORS
+                                      for stat in ('mean', 'min', 'max')]
+        if len(frame):
+            print(frame[columns].to_string(index=False, max_rows=40))
+        print(f"{len(frame)} buckets")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+import argparse
+import json
+import os
+import re
+from bisect import bisect_left
+from datetime import datetime, timezone
+import numpy as np
+
+SENSORS = ['co2', 'temperature', 'humidity']
+# One fixed-size binary record per reading: wall-clock instant (ns since the epoch, UTC),
+# the device's own timestamp_ms (uptime, resets on reboot) and the sensor value
+RECORD_DTYPE = np.dtype([('time_ns', '<i8'), ('timestamp_ms', '<i8'), ('value', '<f8')])
+SEGMENT_ROWS = 65536   # Records per segment file (1.5 MiB)
+INDEX_STRIDE = 512     # Sparse index: time_ns of every INDEX_STRIDE-th record
+SEGMENT_ROOT = "segments"          # Cleaned conditions imported from cleaned_data
+RAW_SEGMENT_ROOT = "raw_segments"  # Raw gateway readings (trans.py)
+
+def to_ns(when):
+    """int ns since the epoch for a datetime (naive = UTC), a string, or an int of ns"""
+    if when is None or isinstance(when, (int, np.integer)):
+        return when
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    delta = when - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 10**9 + delta.microseconds * 1000
+
+class SeriesLog:
+    """Append-only segments of one device/sensor, in a directory with a manifest
+
+    Segments are files of RECORD_DTYPE rows sorted by time_ns, at most
+    segment_rows each. Only the last segment is appended to; a reading that
+    goes back in time starts a new segment (compaction sorts them back in).
+    The manifest lists every segment with its row count, time range and a
+    sparse index, and is written before a new segment's data and after
+    appends, so a segment file never has fewer rows than its entry says and
+    files missing from the manifest are leftovers of an interrupted write.
+    """
+    def __init__(self, directory, segment_rows=SEGMENT_ROWS, index_stride=INDEX_STRIDE,
+                 writable=True):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.index_stride = index_stride
+        self.writable = writable
+        self.rows = []     # Pending per-reading tuples
+        self.chunks = []   # Pending record arrays, in order after self.rows
+        if writable:
+            os.makedirs(directory, exist_ok=True)
+        self.reload()
+
+    # Manifest ----------------------------------------------------------------
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def _path(self, segment):
+        return os.path.join(self.directory, segment['file'])
+
+    def reload(self):
+        """Re-read the manifest, recovering rows appended after it was last written"""
+        self.segments = []
+        self.next_seq = 0
+        if os.path.exists(self._manifest_path()):
+            with open(self._manifest_path()) as f:
+                manifest = json.load(f)
+            self.segments = manifest['segments']
+            self.next_seq = manifest['next_seq']
+        for segment in self.segments:
+            path = self._path(segment)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows = size // RECORD_DTYPE.itemsize
+            if self.writable and size % RECORD_DTYPE.itemsize:
+                # A torn record from a crash mid-write
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * RECORD_DTYPE.itemsize)
+            if rows != segment['rows']:
+                self._rebuild(segment, rows)
+        self.segments = [segment for segment in self.segments if segment['rows']]
+        if self.writable:
+            known = {segment['file'] for segment in self.segments}
+            for name in os.listdir(self.directory):
+                if name.endswith('.seg') and name not in known:
+                    os.remove(os.path.join(self.directory, name))
+            self._write_manifest()
+
+    def _rebuild(self, segment, rows):
+        times = self._records(segment, 0, rows)['time_ns'] if rows else np.empty(0, np.int64)
+        segment['rows'] = rows
+        segment['first_ns'] = int(times[0]) if rows else None
+        segment['last_ns'] = int(times[-1]) if rows else None
+        segment['index'] = times[::self.index_stride].tolist()
+
+    def _write_manifest(self):
+        tmp = self._manifest_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(json.dumps({'segments': self.segments, 'next_seq': self.next_seq}))
+        os.replace(tmp, self._manifest_path())
+
+    def _new_segment(self):
+        segment = {'file': f'{self.next_seq:08d}.seg', 'rows': 0, 'first_ns': None,
+                   'last_ns': None, 'index': []}
+        self.next_seq += 1
+        return segment
+
+    # Writing -----------------------------------------------------------------
+
+    def append(self, time_ns, timestamp_ms, value):
+        self.rows.append((time_ns, timestamp_ms, value))
+
+    def append_many(self, time_ns, timestamp_ms, values):
+        records = np.empty(len(time_ns), dtype=RECORD_DTYPE)
+        records['time_ns'], records['timestamp_ms'], records['value'] = time_ns, timestamp_ms, values
+        self._pack_rows()
+        self.chunks.append(records)
+
+    def _pack_rows(self):
+        if self.rows:
+            self.chunks.append(np.array(self.rows, dtype=RECORD_DTYPE))
+            self.rows = []
+
+    def pending(self):
+        return len(self.rows) + sum(len(chunk) for chunk in self.chunks)
+
+    def flush(self):
+        """Write pending records to segment files, then the manifest"""
+        self._pack_rows()
+        if not self.chunks:
+            return
+        records = np.concatenate(self.chunks)
+        self.chunks = []
+        # Positions where time goes backwards: a record there can't extend the segment
+        breaks = np.flatnonzero(np.diff(records['time_ns']) < 0) + 1
+        start = 0
+        while start < len(records):
+            last = self.segments[-1] if self.segments else None
+            if (last is None or last['rows'] >= self.segment_rows or
+                    records['time_ns'][start] < last['last_ns']):
+                last = self._new_segment()
+                self.segments.append(last)
+                self._write_manifest()  # Entry first, so the file is never an orphan
+            stop = min(len(records), start + self.segment_rows - last['rows'])
+            next_break = breaks[np.searchsorted(breaks, start, side='right'):][:1]
+            if len(next_break):
+                stop = min(stop, int(next_break[0]))
+            self._write_records(last, records[start:stop])
+            start = stop
+        self._write_manifest()
+
+    def sync(self):
+        """Flush, then fsync the manifest and the segment being appended to"""
+        self.flush()
+        paths = [self._manifest_path()] + [self._path(s) for s in self.segments[-1:]]
+        for path in paths:
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+
+    def last_ns(self):
+        """Latest time_ns in the log (pending records included), or None"""
+        self._pack_rows()
+        times = [segment['last_ns'] for segment in self.segments]
+        times += [int(chunk['time_ns'].max()) for chunk in self.chunks]
+        return max(times) if times else None
+
+    def _write_records(self, segment, records):
+        with open(self._path(segment), 'ab') as f:
+            f.write(records.tobytes())
+        first_row = segment['rows']
+        # Index entries for every stride-th row position that falls in this block
+        offset = (-first_row) % self.index_stride
+        segment['index'].extend(records['time_ns'][offset::self.index_stride].tolist())
+        segment['rows'] += len(records)
+        if segment['first_ns'] is None:
+            segment['first_ns'] = int(records['time_ns'][0])
+        segment['last_ns'] = int(records['time_ns'][-1])
+
+    # Reading -----------------------------------------------------------------
+
+    def _records(self, segment, lo, hi):
+        """Rows [lo, hi) of a segment, read through a memory map"""
+        if hi <= lo:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        mm = np.memmap(self._path(segment), dtype=RECORD_DTYPE, mode='r',
+                       shape=(segment['rows'],))
+        return np.array(mm[lo:hi])
+
+    def _seek(self, segment, time_ns):
+        """First row of a segment with time_ns >= time_ns, via the sparse index"""
+        if time_ns is None:
+            return 0
+        index = segment['index']
+        block = bisect_left(index, time_ns)
+        # Rows before the index entry at `block` all sort before time_ns
+        lo = max(0, (block - 1) * self.index_stride)
+        hi = min(segment['rows'], block * self.index_stride + 1)
+        times = self._records(segment, lo, hi)['time_ns']
+        return lo + int(np.searchsorted(times, time_ns, side='left'))
+
+    def read(self, start_ns=None, end_ns=None):
+        """Records with start_ns <= time_ns < end_ns, sorted by time"""
+        if self.writable:
+            self.flush()
+        parts = []
+        for segment in self.segments:
+            if ((start_ns is not None and segment['last_ns'] < start_ns) or
+                    (end_ns is not None and segment['first_ns'] >= end_ns)):
+                continue
+            lo = self._seek(segment, start_ns)
+            hi = segment['rows'] if end_ns is None else self._seek(segment, end_ns)
+            parts.append(self._records(segment, lo, hi))
+        if not parts:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        records = np.concatenate(parts)
+        if len(parts) > 1 and np.any(np.diff(records['time_ns']) < 0):
+            records = records[np.argsort(records['time_ns'], kind='stable')]
+        return records
+
+    # Compaction --------------------------------------------------------------
+
+    def compact(self):
+        """Merge small and time-overlapping segments into full, sorted ones
+
+        Runs of neighbouring segments that are under half full or overlap in
+        time are rewritten when that saves segments or restores time order;
+        full, ordered segments are left alone. New files are written and
+        listed in the manifest before the old ones go, so run it from the
+        writing process or while ingestion is stopped. Returns the number of
+        segments removed.
+        """
+        self.flush()
+        half = self.segment_rows // 2
+        runs, run = [], []
+        for segment in self.segments:
+            if run and (segment['rows'] < half or run[-1]['rows'] < half or
+                        segment['first_ns'] < run[-1]['last_ns']):
+                run.append(segment)
+            else:
+                runs.append(run)
+                run = [segment]
+        runs.append(run)
+
+        before = len(self.segments)
+        segments, obsolete = [], []
+        for run in runs:
+            ordered = all(a['last_ns'] <= b['first_ns'] for a, b in zip(run, run[1:]))
+            needed = -(-sum(segment['rows'] for segment in run) // self.segment_rows)
+            if ordered and needed >= len(run):
+                segments.extend(run)
+                continue
+            records = np.concatenate([self._records(s, 0, s['rows']) for s in run])
+            records = records[np.argsort(records['time_ns'], kind='stable')]
+            for start in range(0, len(records), self.segment_rows):
+                segment = self._new_segment()
+                self._write_records(segment, records[start:start + self.segment_rows])
+                segments.append(segment)
+            obsolete.extend(run)
+        if not obsolete:
+            return 0
+        self.segments = segments
+        self._write_manifest()
+        for segment in obsolete:
+            os.remove(self._path(segment))
+        return before - len(self.segments)
+
+class SegmentStore:
+    """Per-device, per-sensor segment logs under one root directory
+
+    root/<device>/<sensor>/ holds one SeriesLog. Writes are buffered and
+    flushed every flush_rows readings (and on flush()/close()); reads cost
+    O(log n) to seek plus the rows returned, independent of history size.
+    """
+    def __init__(self, root=SEGMENT_ROOT, segment_rows=SEGMENT_ROWS, index_stride=INDEX_STRIDE,
+                 flush_rows=100, writable=True):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.index_stride = index_stride
+        self.flush_rows = flush_rows
+        self.writable = writable
+        self.logs = {}
+
+    def log(self, device, sensor):
+        key = (device, sensor)
+        if key not in self.logs:
+            if not re.fullmatch(r'[\w.-]+', device) or not re.fullmatch(r'[\w.-]+', sensor):
+                raise ValueError(f"Bad device/sensor name: {device!r}/{sensor!r}")
+            self.logs[key] = SeriesLog(os.path.join(self.root, device, sensor),
+                                       self.segment_rows, self.index_stride, self.writable)
+        return self.logs[key]
+
+    def devices(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def append_reading(self, device, when, timestamp_ms, co2, temperature, humidity):
+        """Log one reading (all three sensors) taken at wall-clock time `when`"""
+        time_ns = to_ns(when)
+        for sensor, value in zip(SENSORS, (co2, temperature, humidity)):
+            log = self.log(device, sensor)
+            log.append(time_ns, timestamp_ms, value)
+            if len(log.rows) >= self.flush_rows:
+                log.flush()
+
+    def flush(self):
+        for log in self.logs.values():
+            log.flush()
+
+    def sync(self):
+        for log in self.logs.values():
+            log.sync()
+
+    def close(self):
+        self.flush()
+
+    def high_water(self, device):
+        """Latest time_ns every sensor of a device has (None if any has nothing)"""
+        marks = [self.log(device, sensor).last_ns() for sensor in SENSORS]
+        return None if None in marks else min(marks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_range(self, device, sensor, start=None, end=None):
+        """Records of one device/sensor with start <= time < end"""
+        return self.log(device, sensor).read(to_ns(start), to_ns(end))
+
+    def read_frame(self, device, start=None, end=None, sensors=SENSORS):
+        """Readings of a device as a cleaned-data style DataFrame
+
+        Columns timestamp (datetime64[ns, UTC]), timestamp_ms and one per
+        sensor, one row per reading time.
+        """
+        import pandas as pd
+        frame = None
+        for sensor in sensors:
+            records = self.read_range(device, sensor, start, end)
+            part = pd.DataFrame({'time_ns': records['time_ns'],
+                                 'timestamp_ms': records['timestamp_ms'],
+                                 sensor: records['value']})
+            frame = part if frame is None else frame.merge(
+                part, on=['time_ns', 'timestamp_ms'], how='outer', sort=True)
+        timestamp = pd.to_datetime(frame.pop('time_ns'), utc=True).dt.as_unit('ns')
+        frame.insert(0, 'timestamp', timestamp)
+        return frame
+
+    def import_frame(self, device, df):
+        """Append a cleaned DataFrame (timestamp, timestamp_ms, sensors) to a device
+
+        Only rows after what each sensor already holds are written, so importing
+        the same (or a grown) file again adds nothing twice. Returns the number
+        of new readings.
+        """
+        from windowing import timestamps_ns
+        time_ns = timestamps_ns(df['timestamp'])
+        timestamp_ms = df['timestamp_ms'].to_numpy()
+        added = 0
+        for sensor in SENSORS:
+            log = self.log(device, sensor)
+            last = log.last_ns()
+            new = np.ones(len(time_ns), bool) if last is None else time_ns > last
+            log.append_many(time_ns[new], timestamp_ms[new], df[sensor].to_numpy(float)[new])
+            log.flush()
+            added = max(added, int(new.sum()))
+        return added
+
+    def compact(self, device=None):
+        removed = 0
+        for name in ([device] if device else self.devices()):
+            for sensor in SENSORS:
+                if os.path.isdir(os.path.join(self.root, name, sensor)):
+                    removed += self.log(name, sensor).compact()
+        return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment store: import, compact and query")
+    parser.add_argument('--root', default=SEGMENT_ROOT)
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help="backfill <condition>_cleaned.csv files as devices")
+    imp.add_argument('--data-dir', default="cleaned_data")
+    imp.add_argument('conditions', nargs='*', default=['worm', 'withoutworm'])
+    sub.add_parser('compact', help="merge small and out-of-order segments")
+    query = sub.add_parser('query', help="print readings of a device in a time range")
+    query.add_argument('device')
+    query.add_argument('--start', help="ISO time, UTC if no offset")
+    query.add_argument('--end')
+    args = parser.parse_args()
+
+    store = SegmentStore(args.root, writable=args.command != 'query')
+    if args.command == 'import':
+        from data_store import load_cleaned
+        for condition in args.conditions:
+            df = load_cleaned(os.path.join(args.data_dir, f'{condition}_cleaned.csv'))
+            added = store.import_frame(condition, df)
+            print(f"Imported {added} new readings as device '{condition}' "
+                  f"({len(df) - added} already stored)")
+    elif args.command == 'compact':
+        print(f"Removed {store.compact()} segments")
+    else:
+        frame = store.read_frame(args.device, args.start, args.end)
+        if len(frame):
+            print(frame.to_string(index=False, max_rows=40))
+        print(f"{len(frame)} readings")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,86 +1,118 @@
-import serial
-from google.cloud import firestore
-from google.oauth2 import service_account
-from datetime import datetime
+import argparse
 import os
-import csv
+
+from ingestion import (DailyCSVWriter, BatchUploader, BackgroundUploader, FirestoreSink,
+                       ingest_serial)
+from metrics import PipelineStats
+from rollups import RAW_ROLLUP_ROOT, RollupStore
+from segment_store import RAW_SEGMENT_ROOT, SegmentStore
+from wal import WAL_DIR, Checkpointer, WriteAheadLog, recover
 
 # 设置串口参数
 PORT = 'COM25'  # 替换为你的串口号
 BAUDRATE = 115200
 
-# Create local test directory structure
+# 'background' uploads from worker threads so Firestore latency never stalls the
+# serial read; 'inline' commits batches on the reading thread
+UPLOAD_MODE = 'background'
+SPILL_FILE = "upload_spill.jsonl"  # In --output-dir: readings that did not fit in the upload queue
+
+# Local CSV output directory
 test_dir = "test"
-subdirs = ["co2", "temperature", "humidity"]
-for subdir in [test_dir] + [os.path.join(test_dir, d) for d in subdirs]:
-    if not os.path.exists(subdir):
-        os.makedirs(subdir)
 
-# Firestore 初始化
+# Segment store device name for this gateway's readings
+DEVICE = 'gateway'
+
+# Firestore 密钥
 key_path = "cloud/experiment-sdk.json"  # 替换为你的 JSON 密钥路径
-credentials = service_account.Credentials.from_service_account_file(key_path)
-db = firestore.Client(credentials=credentials)
-
-# 获取 test collection reference
-test_ref = db.collection('test')
-
-# 打开串口
-ser = serial.Serial(PORT, BAUDRATE)
-print(f"Listening on {PORT}... Uploading to Firestore")
-
-try:
-    while True:
-        line = ser.readline().decode('utf-8').strip()
-        print(f"Received: {line}")
-        parts = line.split(',')
-        if len(parts) == 4:
-            timestamp_ms = int(parts[0])
-            co2 = int(parts[1])
-            temperature = float(parts[2])
-            humidity = float(parts[3])
-
-            current_time = datetime.utcnow()
-            time_str = current_time.strftime("%Y-%m-%d_%H-%M-%S")
-            date_str = current_time.strftime("%Y-%m-%d")
-
-            # Save all data to a single CSV file with date as filename
-            csv_path = os.path.join(test_dir, f"{date_str}.csv")
-            
-            # Create file with headers if it doesn't exist
-            if not os.path.exists(csv_path):
-                with open(csv_path, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["timestamp", "co2", "temperature", "humidity"])
-
-            # Append the new data
-            with open(csv_path, 'a', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([time_str, co2, temperature, humidity])
-
-            # 写入 co2_data 集合
-            test_ref.document("co2_data").collection(date_str).add({
-                "timestamp": current_time,
-                "timestamp_ms": timestamp_ms,
-                "value": co2
-            })
-
-            # 写入 temperature_data 集合
-            test_ref.document("temperature_data").collection(date_str).add({
-                "timestamp": current_time,
-                "timestamp_ms": timestamp_ms,
-                "value": temperature
-            })
-
-            # 写入 humidity_data 集合
-            test_ref.document("humidity_data").collection(date_str).add({
-                "timestamp": current_time,
-                "timestamp_ms": timestamp_ms,
-                "value": humidity
-            })
-
-            print("Uploaded all to Firestore.")
-
-except KeyboardInterrupt:
-    print("Stopped by user.")
-finally:
-    ser.close()
+
+def firestore_sink(key_path, collection='test'):
+    """Authenticate with a service-account key and return a Firestore batch sink"""
+    # Imported here: the Google client libraries are slow to load and only needed to upload
+    from google.cloud import firestore
+    from google.oauth2 import service_account
+    credentials = service_account.Credentials.from_service_account_file(key_path)
+    db = firestore.Client(credentials=credentials)
+    return FirestoreSink(db, collection)
+
+def main():
+    parser = argparse.ArgumentParser(description="Log serial sensor readings to CSV and Firestore")
+    parser.add_argument('--port', default=PORT)
+    parser.add_argument('--baud', type=int, default=BAUDRATE)
+    parser.add_argument('--upload-mode', choices=['background', 'inline'], default=UPLOAD_MODE)
+    parser.add_argument('--key', default=key_path, help="service-account JSON key")
+    parser.add_argument('--output-dir', default=test_dir)
+    parser.add_argument('--store', default=RAW_SEGMENT_ROOT,
+                        help="segment store root for the raw readings")
+    parser.add_argument('--rollups', default=RAW_ROLLUP_ROOT,
+                        help="rollup tiers root for the raw readings")
+    parser.add_argument('--no-store', action='store_true',
+                        help="CSV only, no segment store or rollups")
+    parser.add_argument('--device', default=DEVICE, help="device name in the segment store")
+    parser.add_argument('--wal', default=WAL_DIR, help="write-ahead log directory")
+    parser.add_argument('--no-wal', action='store_true', help="no write-ahead log")
+    parser.add_argument('--commit-every', type=int, default=32,
+                        help="fsync the log after this many readings ...")
+    parser.add_argument('--commit-ms', type=float, default=200,
+                        help="... or this many ms after the oldest unsynced one")
+    args = parser.parse_args()
+
+    import serial
+
+    # Firestore 初始化
+    sink = firestore_sink(args.key)
+
+    # CSV rows go through one open file per day; Firestore writes are grouped into batch commits
+    csv_writer = DailyCSVWriter(args.output_dir, flush_rows=20, flush_interval=5.0)
+    if args.upload_mode == 'background':
+        os.makedirs(args.output_dir, exist_ok=True)
+        uploader = BackgroundUploader(sink, maxsize=1000, workers=1, batch_size=30, max_delay=5.0,
+                                      spill_path=os.path.join(args.output_dir, SPILL_FILE)).start()
+        upload = uploader.put
+    else:
+        uploader = BatchUploader(sink, batch_size=30, max_delay=60.0)
+        upload = uploader.add
+    store = None if args.no_store else SegmentStore(args.store, flush_rows=20)
+    rollups = None if args.no_store else RollupStore(args.rollups)
+
+    wal = checkpointer = None
+    if not args.no_wal:
+        # Readings logged but not checkpointed before a crash go back into every sink
+        wal = WriteAheadLog(args.wal, commit_every=args.commit_every,
+                            commit_interval=args.commit_ms / 1000)
+        recovered = recover(wal, csv_writer, upload, store, rollups, args.device)
+        if recovered:
+            print(f"Recovered {recovered} readings from the write-ahead log")
+        checkpointer = Checkpointer(wal, csv_writer, store, rollups, uploader)
+        wal.start()
+
+    # 打开串口
+    ser = serial.Serial(args.port, args.baud)
+    print(f"Listening on {args.port}... Uploading to Firestore")
+
+    stats = PipelineStats()
+    try:
+        ingest_serial(ser, csv_writer, upload, store=store, device=args.device,
+                      rollups=rollups, wal=wal, checkpointer=checkpointer, stats=stats)
+
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        print(f"{stats.samples} readings, {stats.parse_failures} unparseable lines")
+        if args.upload_mode == 'background':
+            uploader.stop()
+            print(f"Upload stats: {uploader.stats}")
+        else:
+            uploader.flush()
+        if checkpointer is not None:
+            # Clean shutdown: every reading reached the sinks, nothing to replay
+            checkpointer.run()
+            wal.close()
+        csv_writer.close()
+        if store is not None:
+            store.close()
+            rollups.close()
+        ser.close()
+
+if __name__ == "__main__":
+    main()
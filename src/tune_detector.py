@@ -0,0 +1,169 @@
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from data_store import load_condition
+from feature_cache import FeatureCache
+from insect_detection import InsectDetector, cached_window_features
+
+# Search space around the hand-tuned values in InsectDetector
+DEFAULT_GRID = {
+    'mean_level': np.arange(600, 800, 5.0),
+    'std_change': np.round(np.arange(0.0, 0.3, 0.01), 4),
+    'min_change': np.round(np.arange(0.0, 1.0, 0.05), 4),
+    'peak_change': np.round(np.arange(0.2, 3.0, 0.2), 4),
+}
+DEFAULT_WEIGHTS = [
+    (0.6, 0.2, 0.2),
+    (0.5, 0.25, 0.25),
+    (0.4, 0.3, 0.3),
+    (0.34, 0.33, 0.33),
+    (0.7, 0.15, 0.15),
+    (0.8, 0.1, 0.1),
+]
+DEFAULT_SCORE_THRESHOLDS = [0.3, 0.4, 0.5, 0.6]
+
+def load_features(data_dir="cleaned_data", window_size='30min', store_root=None):
+    """Per-window feature vectors and labels (1 = worms present), computed once"""
+    frames = []
+    cache = FeatureCache()
+    for condition, label in [('worm', 1), ('withoutworm', 0)]:
+        df = load_condition(data_dir, condition, store_root=store_root)
+        features = cached_window_features(df, window_size, cache=cache)
+        features['label'] = label
+        frames.append(features)
+    return pd.concat(frames, ignore_index=True)
+
+def _hits(values, thresholds):
+    """(len(thresholds), windows) matrix of values > threshold (NaN never hits)"""
+    with np.errstate(invalid='ignore'):
+        return values[None, :] > np.asarray(thresholds)[:, None]
+
+def evaluate_chunk(features, labels, grid, weights, score_thresholds):
+    """Confusion counts for every grid point of one weight setting
+
+    Returns an array of shape (mean_level, std_change, min_change, peak_change,
+    score_threshold, 2) holding (true positives, false positives).
+    """
+    level = _hits(features['mean_level'], grid['mean_level']).astype(float)
+    std = _hits(features['std_change'], grid['std_change']).astype(float)
+    # change_detected depends on both min_change and peak_change
+    change = (_hits(features['min_change'], grid['min_change'])[:, None, :] |
+              _hits(features['max_change'], grid['peak_change'])[None, :, :]).astype(float)
+
+    w_level, w_std, w_change = weights
+    positive = labels == 1
+    counts = np.empty((len(grid['mean_level']), len(grid['std_change']),
+                       len(grid['min_change']), len(grid['peak_change']),
+                       len(score_thresholds), 2), dtype=np.int64)
+    # Loop over mean_level to keep the broadcast (std, min, peak, windows) block small
+    for i in range(len(grid['mean_level'])):
+        score = (level[i][None, None, None, :] * w_level +
+                 std[:, None, None, :] * w_std +
+                 change[None, :, :, :] * w_change)
+        for j, cutoff in enumerate(score_thresholds):
+            detected = score > cutoff
+            counts[i, ..., j, 0] = detected[..., positive].sum(axis=-1)
+            counts[i, ..., j, 1] = detected[..., ~positive].sum(axis=-1)
+    return counts
+
+def _evaluate_task(args):
+    return evaluate_chunk(*args)
+
+def grid_search(features, grid=None, weights=None, score_thresholds=None, workers=None):
+    """Evaluate every threshold/weight combination, fanned out over a process pool
+
+    Returns one row per combination with tp/fp/fn/tn, precision, recall and F1.
+    """
+    grid = {key: np.asarray(values) for key, values in (grid or DEFAULT_GRID).items()}
+    weights = weights or DEFAULT_WEIGHTS
+    score_thresholds = score_thresholds or DEFAULT_SCORE_THRESHOLDS
+
+    arrays = {name: features[name].to_numpy(dtype=float)
+              for name in ['mean_level', 'std_change', 'max_change', 'min_change']}
+    labels = features['label'].to_numpy()
+
+    # One task per (weights, slice of mean_level values)
+    mean_chunks = np.array_split(grid['mean_level'], max(1, min(len(grid['mean_level']), 8)))
+    tasks = []
+    for w, chunk in itertools.product(weights, mean_chunks):
+        chunk_grid = dict(grid, mean_level=chunk)
+        tasks.append((w, chunk, (arrays, labels, chunk_grid, w, score_thresholds)))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_evaluate_task, [task for _, _, task in tasks]))
+
+    frames = []
+    for (w, chunk, _), counts in zip(tasks, results):
+        index = pd.MultiIndex.from_product(
+            [chunk, grid['std_change'], grid['min_change'], grid['peak_change'],
+             score_thresholds],
+            names=['mean_level', 'std_change', 'min_change', 'peak_change', 'score_threshold'])
+        frame = index.to_frame(index=False)
+        frame['w_level'], frame['w_std'], frame['w_change'] = w
+        frame['tp'] = counts[..., 0].ravel()
+        frame['fp'] = counts[..., 1].ravel()
+        frames.append(frame)
+    results = pd.concat(frames, ignore_index=True)
+
+    n_positive = int((labels == 1).sum())
+    n_negative = int((labels == 0).sum())
+    results['fn'] = n_positive - results['tp']
+    results['tn'] = n_negative - results['fp']
+    detected = results['tp'] + results['fp']
+    results['precision'] = np.where(detected > 0, results['tp'] / detected.clip(lower=1), np.nan)
+    results['recall'] = results['tp'] / max(n_positive, 1)
+    denominator = results['precision'] + results['recall']
+    results['f1_score'] = np.where(denominator > 0,
+                                   2 * results['precision'] * results['recall'] / denominator,
+                                   0.0)
+    return results
+
+def pareto_frontier(results):
+    """Combinations not beaten on both precision and recall by any other"""
+    ranked = results.dropna(subset=['precision']).sort_values(
+        ['recall', 'precision'], ascending=[False, False])
+    best_precision = -np.inf
+    keep = []
+    for idx, precision in zip(ranked.index, ranked['precision']):
+        if precision > best_precision:
+            keep.append(idx)
+            best_precision = precision
+    # One representative combination per (precision, recall) point
+    frontier = results.loc[keep].sort_values('recall')
+    return frontier.drop_duplicates(subset=['precision', 'recall'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Grid-search InsectDetector thresholds and weights")
+    parser.add_argument('--data-dir', default="cleaned_data")
+    parser.add_argument('--store', default=None,
+                        help="read the conditions from this segment store root instead")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help="optional CSV of every combination")
+    args = parser.parse_args()
+
+    features = load_features(args.data_dir, store_root=args.store)
+    print(f"{len(features)} windows ({int(features['label'].sum())} with worms)")
+
+    results = grid_search(features, workers=args.workers)
+    print(f"Evaluated {len(results)} combinations")
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+    baseline = InsectDetector()
+    detection, _ = baseline.detect(features)
+    tp = int((detection & (features['label'] == 1)).sum())
+    fp = int((detection & (features['label'] == 0)).sum())
+    print(f"\nCurrent thresholds: tp={tp} fp={fp}")
+
+    columns = ['mean_level', 'std_change', 'min_change', 'peak_change', 'w_level', 'w_std',
+               'w_change', 'score_threshold', 'precision', 'recall', 'f1_score']
+    print("\nPrecision/recall frontier:")
+    print(pareto_frontier(results)[columns].to_string(index=False))
+    print("\nTop 10 by F1:")
+    print(results.sort_values('f1_score', ascending=False)[columns].head(10).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
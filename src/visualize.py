@@ -1,83 +1,171 @@
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from data_store import load_condition
+from decimate import m4, axes_pixel_width, to_x, x_range
+from feature_cache import FeatureCache
+
+SENSORS = ['co2', 'temperature', 'humidity']
+
 def load_and_prepare_data(export_dir):
     """Load and prepare both datasets"""
-    # Read merged CSV files
-    worm_df = pd.read_csv(os.path.join(export_dir, 'worm_cleaned.csv'))
-    withoutworm_df = pd.read_csv(os.path.join(export_dir, 'withoutworm_cleaned.csv'))
-    
-    # Convert timestamp strings to datetime objects
-    for df in [worm_df, withoutworm_df]:
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    # Read cleaned files through the column store (typed int64 timestamps, no string parsing)
+    worm_df = load_condition(export_dir, 'worm')
+    withoutworm_df = load_condition(export_dir, 'withoutworm')
     
     return worm_df, withoutworm_df
 
-def create_comparison_plots(worm_df, withoutworm_df):
-    """Create comparison plots for all sensors with average changes"""
-    sensors = ['co2', 'temperature', 'humidity']
+def _panel_lines(worm_df, withoutworm_df, worm_rates, withoutworm_rates, sensor, kind):
+    """(x, y, label, color) of the lines in one panel; kind is 'raw' or 'rate'"""
+    if kind == 'raw':
+        return [(worm_df['timestamp'], worm_df[sensor], 'With Worm', 'blue'),
+                (withoutworm_df['timestamp'], withoutworm_df[sensor], 'Without Worm', 'red')]
+    # Calculate rolling average of changes (30-second window) on the full series
+    window = 30
+    worm_avg_changes = worm_rates[sensor].rolling(window=window, min_periods=1).mean()
+    withoutworm_avg_changes = withoutworm_rates[sensor].rolling(window=window, min_periods=1).mean()
+    return [(worm_df['timestamp'], worm_avg_changes, 'With Worm (30s avg)', 'blue'),
+            (withoutworm_df['timestamp'], withoutworm_avg_changes, 'Without Worm (30s avg)', 'red')]
+
+def _decimate_lines(lines, n_bins):
+    """M4-decimate every line of a panel to n_bins equal columns of its x limits
+
+    The limits are the lines' shared x range plus matplotlib's default
+    margin, i.e. what autoscaling would pick, so every line is binned on the
+    same edges, which evenly split the axis width once draw_panel sets them
+    as its limits. Returns (lines, xlim).
+    """
+    xs = [x for x, _, _, _ in lines]
+    bounds = x_range(xs, plt.rcParams['axes.xmargin'])
+    if bounds is None:
+        return lines, None
+    lines = [m4(x, y, n_bins, bounds) + (label, color) for x, y, label, color in lines]
+    return lines, tuple(to_x(value, xs[0]) for value in bounds)
+
+def draw_panel(ax, sensor, kind, lines, xlim=None):
+    """Plot one panel's lines and decorations"""
+    for x, y, label, color in lines:
+        ax.plot(x, y, label=label, color=color, alpha=0.7)
+    if xlim is not None:
+        ax.set_xlim(*xlim)
+    if kind == 'raw':
+        # Customize raw data plot
+        ax.set_title(f'{sensor.upper()} Values')
+        ax.set_ylabel(f'{sensor} value')
+    else:
+        # Add horizontal line at zero for reference
+        ax.axhline(y=0, color='gray', linestyle='--', alpha=0.5)
+        # Customize rate of change plot
+        ax.set_title(f'{sensor.upper()} Rate of Change')
+        ax.set_ylabel(f'Change per second')
+    ax.set_xlabel('Time')
+    ax.grid(True)
+    ax.legend()
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
+
+def create_comparison_plots(worm_df, withoutworm_df, worm_rates=None, withoutworm_rates=None,
+                            decimate=True, dpi=300):
+    """Create comparison plots for all sensors with average changes
+
+    worm_rates / withoutworm_rates are optional precomputed change_rates frames.
+    With decimate, each line is reduced with M4 to twice the panel's pixel
+    width at dpi before plotting, which keeps every spike while making render
+    time independent of the number of rows.
+    """
+    sensors = SENSORS
+    if worm_rates is None:
+        worm_rates = change_rates(worm_df, sensors)
+    if withoutworm_rates is None:
+        withoutworm_rates = change_rates(withoutworm_df, sensors)
     # Create 2 rows of subplots: raw data and rate of change
     fig, axes = plt.subplots(3, 2, figsize=(20, 15))
     fig.suptitle('Sensor Data Comparison: With Worm vs Without Worm')
     
     for i, sensor in enumerate(sensors):
-        # Left column: Raw data plot
-        # Plot both datasets
-        axes[i, 0].plot(worm_df['timestamp'], worm_df[sensor], 
-                    label='With Worm', color='blue', alpha=0.7)
-        axes[i, 0].plot(withoutworm_df['timestamp'], withoutworm_df[sensor], 
-                    label='Without Worm', color='red', alpha=0.7)
-        
-        # Customize raw data plot
-        axes[i, 0].set_title(f'{sensor.upper()} Values')
-        axes[i, 0].set_xlabel('Time')
-        axes[i, 0].set_ylabel(f'{sensor} value')
-        axes[i, 0].grid(True)
-        axes[i, 0].legend()
-        
-        # Right column: Rate of change plot
-        # Calculate rates of change
-        worm_changes = worm_df[sensor].diff() / (worm_df['timestamp_ms'].diff() / 1000)
-        withoutworm_changes = withoutworm_df[sensor].diff() / (withoutworm_df['timestamp_ms'].diff() / 1000)
-        
-        # Calculate rolling average of changes (30-second window)
-        window = 30
-        worm_avg_changes = worm_changes.rolling(window=window, min_periods=1).mean()
-        withoutworm_avg_changes = withoutworm_changes.rolling(window=window, min_periods=1).mean()
-        
-        # Plot rates of change
-        axes[i, 1].plot(worm_df['timestamp'], worm_avg_changes,
-                    label='With Worm (30s avg)', color='blue', alpha=0.7)
-        axes[i, 1].plot(withoutworm_df['timestamp'], withoutworm_avg_changes,
-                    label='Without Worm (30s avg)', color='red', alpha=0.7)
-        
-        # Add horizontal line at zero for reference
-        axes[i, 1].axhline(y=0, color='gray', linestyle='--', alpha=0.5)
-        
-        # Customize rate of change plot
-        axes[i, 1].set_title(f'{sensor.upper()} Rate of Change')
-        axes[i, 1].set_xlabel('Time')
-        axes[i, 1].set_ylabel(f'Change per second')
-        axes[i, 1].grid(True)
-        axes[i, 1].legend()
-        
-        # Rotate x-axis labels for both plots
-        for ax in axes[i]:
-            plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
+        # Left column: raw data, right column: rate of change
+        for j, kind in enumerate(['raw', 'rate']):
+            lines = _panel_lines(worm_df, withoutworm_df, worm_rates, withoutworm_rates, sensor, kind)
+            xlim = None
+            if decimate:
+                # 2x oversampling leaves room for tight_layout widening the axes
+                lines, xlim = _decimate_lines(lines, 2 * axes_pixel_width(axes[i, j], dpi))
+            draw_panel(axes[i, j], sensor, kind, lines, xlim)
     
     plt.tight_layout()
     return fig
 
-def calculate_changes(df, sensor):
-    """Calculate average changes for a sensor"""
-    # Calculate changes between consecutive readings
-    changes = df[sensor].diff()
+def _render_panel(args):
+    """Render one panel in its own Agg figure and return the RGBA pixels"""
+    sensor, kind, lines, xlim, size, dpi = args
+    import matplotlib
+    matplotlib.use('Agg')
+    fig, ax = plt.subplots(figsize=size, dpi=dpi)
+    draw_panel(ax, sensor, kind, lines, xlim)
+    fig.tight_layout()
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    return pixels
+
+def render_comparison_plots(worm_df, withoutworm_df, output_path, worm_rates=None,
+                            withoutworm_rates=None, dpi=300, workers=6):
+    """Render the 6 comparison panels in parallel processes and tile them into one PNG
+
+    Each panel is decimated here (small arrays go to the workers), drawn as
+    its own 10x5 inch Agg figure, and the tiles are stacked under a title
+    strip. Same panels as create_comparison_plots; layout is per tile.
+    """
+    sensors = SENSORS
+    if worm_rates is None:
+        worm_rates = change_rates(worm_df, sensors)
+    if withoutworm_rates is None:
+        withoutworm_rates = change_rates(withoutworm_df, sensors)
+    size = (10, 5)
+    tasks = []
+    for sensor in sensors:
+        for kind in ['raw', 'rate']:
+            lines = _panel_lines(worm_df, withoutworm_df, worm_rates, withoutworm_rates, sensor, kind)
+            lines, xlim = _decimate_lines(lines, 2 * size[0] * dpi)
+            lines = [(np.asarray(x), np.asarray(y), label, color) for x, y, label, color in lines]
+            tasks.append((sensor, kind, lines, xlim, size, dpi))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tiles = list(executor.map(_render_panel, tasks))
+
+    # Title strip rendered the same way, then rows of (raw, rate) tiles
+    title = plt.figure(figsize=(2 * size[0], 0.6), dpi=dpi)
+    title.text(0.5, 0.5, 'Sensor Data Comparison: With Worm vs Without Worm',
+               ha='center', va='center', fontsize='large')
+    title.canvas.draw()
+    rows = [np.asarray(title.canvas.buffer_rgba())]
+    plt.close(title)
+    rows += [np.hstack(tiles[k:k + 2]) for k in range(0, len(tiles), 2)]
+    plt.imsave(output_path, np.vstack(rows), dpi=dpi)
+    return output_path
+
+def change_rates(df, sensors):
+    """Per-second rate of change between consecutive readings, one column per sensor"""
     time_diff = df['timestamp_ms'].diff() / 1000  # Convert to seconds
-    
-    # Calculate rates of change (per second)
-    rates = changes / time_diff
+    return pd.DataFrame({sensor: df[sensor].diff() / time_diff for sensor in sensors})
+
+def cached_change_rates(df, sensors=SENSORS, cache=None):
+    """change_rates through the feature cache (only appended rows are differenced)"""
+    cache = cache or FeatureCache()
+    return cache.row_series('change_rates', df, ['timestamp_ms'] + list(sensors),
+                            lambda frame: change_rates(frame, sensors),
+                            params={'sensors': list(sensors)})
+
+def calculate_changes(df, sensor, rates=None):
+    """Calculate average changes for a sensor"""
+    # Calculate rates of change (per second) between consecutive readings
+    if rates is None:
+        rates = change_rates(df, [sensor])
+    rates = rates[sensor]
     
     stats = {
         'avg_change_per_second': rates.mean(),
@@ -90,34 +178,49 @@ def calculate_changes(df, sensor):
     return stats
 
 def main():
-    export_dir = "exports"
+    parser = argparse.ArgumentParser(description="Sensor comparison plots and change statistics")
+    parser.add_argument('--export-dir', default="exports")
+    parser.add_argument('--no-decimate', action='store_true', help="plot every raw point")
+    parser.add_argument('--parallel', action='store_true', help="render the 6 panels in worker processes")
+    parser.add_argument('--workers', type=int, default=6)
+    args = parser.parse_args()
+    export_dir = args.export_dir
     
     # Load data
     print("Loading data...")
     worm_df, withoutworm_df = load_and_prepare_data(export_dir)
     
-    # Create plots
-    print("Creating plots...")
-    fig = create_comparison_plots(worm_df, withoutworm_df)
+    # Rates of change, reused from the feature cache when the data is unchanged
+    cache = FeatureCache()
+    rates = {'worm': cached_change_rates(worm_df, cache=cache),
+             'withoutworm': cached_change_rates(withoutworm_df, cache=cache)}
     
-    # Save plot
+    # Create and save plots
+    print("Creating plots...")
     output_path = os.path.join(export_dir, 'sensor_comparison.png')
-    fig.savefig(output_path, dpi=300, bbox_inches='tight')
+    if args.parallel:
+        render_comparison_plots(worm_df, withoutworm_df, output_path, rates['worm'],
+                                rates['withoutworm'], workers=args.workers)
+    else:
+        fig = create_comparison_plots(worm_df, withoutworm_df, rates['worm'], rates['withoutworm'],
+                                      decimate=not args.no_decimate)
+        fig.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"Saved plot to: {output_path}")
     
     # Display basic statistics
     print("\nData Statistics:")
-    for condition, df in [("With Worm", worm_df), ("Without Worm", withoutworm_df)]:
+    for condition, df, df_rates in [("With Worm", worm_df, rates['worm']),
+                                    ("Without Worm", withoutworm_df, rates['withoutworm'])]:
         print(f"\n{condition}:")
         print(f"Date range: {df['timestamp'].min()} to {df['timestamp'].max()}")
         
         print("\nMean values and changes:")
-        for sensor in ['co2', 'temperature', 'humidity']:
+        for sensor in SENSORS:
             print(f"\n{sensor.upper()}:")
             print(f"Mean value: {df[sensor].mean():.2f}")
             
             # Calculate and display change statistics
-            changes = calculate_changes(df, sensor)
+            changes = calculate_changes(df, sensor, df_rates)
             print(f"Average change per second: {changes['avg_change_per_second']:.4f}")
             print(f"Standard deviation of changes: {changes['std_change']:.4f}")
             print(f"Maximum increase: {changes['max_increase']:.4f}")
@@ -0,0 +1,302 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from ingestion import csv_row
+from segment_store import to_ns
+
+# Frame: payload length and CRC32 of the payload, then the payload (one reading)
+FRAME_HEADER = struct.Struct('<II')
+# seq, time_ns (UTC), timestamp_ms, co2 (integer ppm, as ingest_serial passes it), temperature, humidity
+READING = struct.Struct('<qqqqdd')
+WAL_DIR = "wal"
+EPOCH = datetime(1970, 1, 1)
+
+def from_ns(time_ns):
+    """Naive UTC datetime (like datetime.utcnow()) for int ns since the epoch"""
+    return EPOCH + timedelta(microseconds=time_ns // 1000)
+
+def encode(seq, time_ns, timestamp_ms, co2, temperature, humidity):
+    payload = READING.pack(seq, time_ns, timestamp_ms, co2, temperature, humidity)
+    return FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+def decode_frames(data):
+    """Readings in a byte string, plus the offset where valid frames end
+
+    Stops at the first short or corrupt frame: that is the torn tail of the
+    last write before a crash.
+    """
+    readings, offset = [], 0
+    while offset + FRAME_HEADER.size <= len(data):
+        length, crc = FRAME_HEADER.unpack_from(data, offset)
+        start = offset + FRAME_HEADER.size
+        payload = data[start:start + length]
+        if length != READING.size or len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        readings.append(READING.unpack(payload))
+        offset = start + length
+    return readings, offset
+
+class WriteAheadLog:
+    """Append-only, CRC-framed log of readings with group commit
+
+    append() only buffers a frame. The buffer is written and fsynced once
+    commit_every readings are pending, or commit_interval seconds after the
+    oldest one arrived (a timer thread, so a quiet sensor doesn't hold a
+    reading back); fsync=False writes without syncing (for benchmarks).
+    The log is a series of files named after their first sequence number;
+    checkpoint(seq) records that every reading up to seq has reached durable
+    sinks, and files wholly before it are deleted.
+    """
+    def __init__(self, directory=WAL_DIR, commit_every=32, commit_interval=0.2,
+                 segment_bytes=4 * 1024 * 1024, fsync=True, clock=time.monotonic):
+        self.directory = directory
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.first_buffered = None
+        self.fd = None
+        self.file_bytes = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'appended': 0, 'commits': 0, 'checkpoints': 0}
+        os.makedirs(directory, exist_ok=True)
+        self.checkpoint_seq = self._read_checkpoint()
+        self.last_seq = self._recover_files()
+
+    # Files -------------------------------------------------------------------
+
+    def _files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.wal'))
+
+    def _checkpoint_path(self):
+        return os.path.join(self.directory, 'checkpoint.json')
+
+    def _read_checkpoint(self):
+        if not os.path.exists(self._checkpoint_path()):
+            return 0
+        with open(self._checkpoint_path()) as f:
+            return json.load(f)['seq']
+
+    def _recover_files(self):
+        """Cut a torn tail off the newest file; return the last logged seq"""
+        last_seq = self.checkpoint_seq
+        for name in reversed(self._files()):
+            path = os.path.join(self.directory, name)
+            with open(path, 'rb') as f:
+                readings, end = decode_frames(f.read())
+            if end < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(end)
+            if readings:
+                return max(last_seq, readings[-1][0])
+        return last_seq
+
+    def _open_file(self):
+        first_seq = self.last_seq - self.buffered + 1  # Of the frames about to be written
+        path = os.path.join(self.directory, f'{first_seq:016d}.wal')
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.file_bytes = 0
+        if self.fsync:
+            self._sync_directory()
+
+    def _sync_directory(self):
+        """Make a new or removed file name durable (no-op where unsupported)"""
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    # Writing -----------------------------------------------------------------
+
+    def append(self, current_time, timestamp_ms, co2, temperature, humidity):
+        """Log one reading; returns its sequence number"""
+        with self.lock:
+            self.last_seq += 1
+            self.buffer += encode(self.last_seq, to_ns(current_time), int(timestamp_ms),
+                                  int(co2), float(temperature), float(humidity))
+            self.buffered += 1
+            self.stats['appended'] += 1
+            if self.first_buffered is None:
+                self.first_buffered = self.clock()
+            if self.buffered >= self.commit_every:
+                self._commit()
+            return self.last_seq
+
+    def commit(self):
+        """Write and fsync everything appended so far"""
+        with self.lock:
+            self._commit()
+
+    def _commit(self):
+        if not self.buffered:
+            return
+        if self.fd is None or self.file_bytes >= self.segment_bytes:
+            if self.fd is not None:
+                os.close(self.fd)
+            self._open_file()
+        os.write(self.fd, self.buffer)
+        if self.fsync:
+            os.fsync(self.fd)
+        self.file_bytes += len(self.buffer)
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.first_buffered = None
+        self.stats['commits'] += 1
+
+    def _timer(self):
+        while not self.stop_event.wait(self.commit_interval / 4):
+            with self.lock:
+                if (self.first_buffered is not None and
+                        self.clock() - self.first_buffered >= self.commit_interval):
+                    self._commit()
+
+    def start(self):
+        """Start the commit_interval timer thread"""
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._timer, name="wal-commit", daemon=True)
+        self.thread.start()
+        return self
+
+    def checkpoint(self, seq=None):
+        """Record that readings up to seq (default: all appended) are durable elsewhere"""
+        with self.lock:
+            self._commit()
+            seq = self.last_seq if seq is None else seq
+            tmp = self._checkpoint_path() + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump({'seq': seq}, f)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(tmp, self._checkpoint_path())
+            self.checkpoint_seq = seq
+            # A file is obsolete once the next one starts at or before seq + 1
+            files = self._files()
+            for name, following in zip(files, files[1:]):
+                if int(following.split('.')[0]) <= seq + 1:
+                    os.remove(os.path.join(self.directory, name))
+            if self.fsync:
+                self._sync_directory()
+            self.stats['checkpoints'] += 1
+
+    def close(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self._commit()
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    # Reading -----------------------------------------------------------------
+
+    def replay(self, after=None):
+        """Yield (seq, time_ns, timestamp_ms, co2, temperature, humidity) logged after a seq
+
+        Defaults to everything after the last checkpoint.
+        """
+        after = self.checkpoint_seq if after is None else after
+        for name in self._files():
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                readings, _ = decode_frames(f.read())
+            for reading in readings:
+                if reading[0] > after:
+                    yield reading
+
+class Checkpointer:
+    """Advance a WAL checkpoint every `interval` seconds once the sinks are durable
+
+    Waits while the uploader still holds readings (they would be lost from
+    the upload otherwise), then fsyncs the CSV, segment store and rollups
+    before recording the checkpoint. The checkpoint stops short of readings
+    still in the rollups' open 1-minute buckets, which only replay restores.
+    """
+    def __init__(self, wal, csv_writer, store=None, rollups=None, uploader=None,
+                 interval=60.0, clock=time.monotonic):
+        self.wal = wal
+        self.csv_writer = csv_writer
+        self.store = store
+        self.rollups = rollups
+        self.uploader = uploader
+        self.interval = interval
+        self.clock = clock
+        self.last = clock()
+
+    def maybe(self):
+        if self.clock() - self.last >= self.interval:
+            if self.uploader is None or not self.uploader.pending():
+                self.run()
+
+    def run(self):
+        seq = self.wal.last_seq
+        self.csv_writer.sync()
+        if self.store is not None:
+            self.store.sync()
+        if self.rollups is not None:
+            self.rollups.sync()
+            seq = self._before_open_buckets(seq)
+        self.wal.checkpoint(seq)
+        self.last = self.clock()
+
+    def _before_open_buckets(self, seq):
+        """seq, or less so no reading of an open rollup bucket is checkpointed"""
+        since = self.rollups.open_since()
+        if since is None:
+            return seq
+        self.wal.commit()
+        for reading in self.wal.replay():
+            if reading[1] >= since:
+                return min(seq, reading[0] - 1)
+        return seq
+
+def recover(wal, csv_writer, upload, store=None, rollups=None, device='gateway'):
+    """Replay readings logged after the last checkpoint into the sinks
+
+    The CSV, segment store and rollups skip readings no later than what they
+    already hold (in the CSV's last second, exactly the rows it has), so
+    whatever reached them before the crash is not written twice; every
+    replayed reading is uploaded again (at least once). Returns the number
+    of readings replayed.
+    """
+    csv_mark, csv_present = csv_writer.recover_tail()
+    store_mark = store.high_water(device) if store is not None else None
+    rollup_mark = rollups.high_water(device) if rollups is not None else None
+    count = 0
+    for _, time_ns, timestamp_ms, co2, temperature, humidity in wal.replay():
+        current_time = from_ns(time_ns)
+        row = csv_row(current_time, co2, temperature, humidity)
+        second = current_time.replace(microsecond=0)
+        if csv_mark is None or second > csv_mark:
+            csv_writer.write(current_time, row)
+        elif second == csv_mark:
+            # Rows share a second: skip only those already in the file
+            key = tuple(str(field) for field in row)
+            if csv_present[key]:
+                csv_present[key] -= 1
+            else:
+                csv_writer.write(current_time, row)
+        if store is not None and (store_mark is None or time_ns > store_mark):
+            store.append_reading(device, current_time, timestamp_ms, co2, temperature, humidity)
+        if rollups is not None and (rollup_mark is None or time_ns > rollup_mark):
+            rollups.add_reading(device, current_time, co2, temperature, humidity)
+        upload(current_time, timestamp_ms, co2, temperature, humidity)
+        count += 1
+    return count
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+def timestamps_ns(series):
+    """int64 nanoseconds since the epoch for a datetime Series (naive or tz-aware)"""
+    return pd.DatetimeIndex(pd.to_datetime(series)).as_unit('ns').asi8
+
+def window_bounds(ts_ns, size, step=None, origin=None):
+    """Start times and row ranges [lo, hi) of every window over sorted int64 timestamps
+
+    Windows start at origin (default: the first timestamp), origin + step, ...
+    up to the last timestamp, like pd.date_range(min, max, freq=step), and each
+    covers [start, start + size). step defaults to size (tumbling windows); a
+    smaller step gives overlapping sliding windows.
+    """
+    size_ns = pd.Timedelta(size).value
+    step_ns = size_ns if step is None else pd.Timedelta(step).value
+    if not len(ts_ns):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    origin = ts_ns[0] if origin is None else origin
+    starts = origin + step_ns * np.arange((ts_ns[-1] - origin) // step_ns + 1)
+    lo = np.searchsorted(ts_ns, starts, side='left')
+    hi = np.searchsorted(ts_ns, starts + size_ns, side='left')
+    return starts, lo, hi
+
+def length_groups(lo, hi):
+    """Group non-empty windows by row count
+
+    Yields (window positions, row index matrix). All windows in a group have
+    the same length, so indexing a column with the matrix gives a dense 2D
+    block whose row reductions match pandas on each window slice exactly.
+    """
+    lengths = hi - lo
+    for n in np.unique(lengths[lengths > 0]):
+        which = np.flatnonzero(lengths == n)
+        yield which, lo[which][:, None] + np.arange(n)
+
+def nan_mean_std(block):
+    """Row-wise mean and sample std skipping NaN, with pandas' summation order"""
+    mask = np.isnan(block)
+    count = (~mask).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(mask, 0.0, block).sum(axis=1) / count
+        sqr = (mean[:, None] - block) ** 2
+        sqr[mask] = 0.0
+        var = sqr.sum(axis=1) / (count - 1)
+    std = np.sqrt(np.where(count > 1, var, np.nan))
+    return mean, std
+
+def window_frame(df, time_col='timestamp'):
+    """Rows sorted by time (stable) plus their int64 timestamps"""
+    ts = timestamps_ns(df[time_col])
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind='stable')
+        df, ts = df.iloc[order], ts[order]
+    return df, ts
+
+def window_starts_index(starts, like):
+    """Window start times as Timestamps with the timezone and unit of the `like` column"""
+    like = pd.to_datetime(like)
+    index = pd.DatetimeIndex(starts.view('datetime64[ns]')).as_unit(like.dt.unit)
+    tz = like.dt.tz
+    return index.tz_localize('UTC').tz_convert(tz) if tz is not None else index
+
+def window_aggregates(df, columns, size='30min', step=None, time_col='timestamp',
+                      aggs=('first', 'last', 'mean', 'std', 'diff'), origin=None):
+    """first/last/mean/std/diff (last - first) of columns for every non-empty window
+
+    One row per non-empty window, in time order, with 'window_start', 'count'
+    and '<column>_<agg>' columns. Values equal what pandas gives on each window
+    slice (mean/std skip NaN, first/last do not). origin (int64 ns) pins the
+    window grid, e.g. when computing only the tail of a longer series.
+    """
+    df, ts = window_frame(df, time_col)
+    starts, lo, hi = window_bounds(ts, size, step, origin)
+    keep = hi > lo
+    position = np.cumsum(keep) - 1  # Window index -> output row
+
+    result = {'window_start': window_starts_index(starts[keep], df[time_col]),
+              'count': (hi - lo)[keep]}
+    for col in columns:
+        values = df[col].to_numpy(dtype=float)
+        stats = {agg: np.full(keep.sum(), np.nan) for agg in aggs}
+        if 'first' in stats or 'diff' in stats:
+            first = values[lo[keep]]
+        if 'last' in stats or 'diff' in stats:
+            last = values[hi[keep] - 1]
+        if 'first' in stats:
+            stats['first'] = first
+        if 'last' in stats:
+            stats['last'] = last
+        if 'diff' in stats:
+            stats['diff'] = last - first
+        if 'mean' in stats or 'std' in stats:
+            for which, rows in length_groups(lo, hi):
+                mean, std = nan_mean_std(values[rows])
+                if 'mean' in stats:
+                    stats['mean'][position[which]] = mean
+                if 'std' in stats:
+                    stats['std'][position[which]] = std
+        for agg in aggs:
+            result[f'{col}_{agg}'] = stats[agg]
+    return pd.DataFrame(result)
@@ -0,0 +1,121 @@
+"""Parity of the edge runtime with the pandas/scipy versions
+
+    python -m pytest -q tests
+
+On cleaned_data, plus a synthetic device (the recordings have no fan
+events or reboots): Hampel output must equal the numpy/scipy reference
+exactly, and the insect and fan detectors must agree with InsectDetector /
+FanDetector .analyze_window on a pandas slice of the same trailing window
+(since the last reboot), every STRIDE samples and around every fan
+transition. One device's buffers must stay well under a few MB, reboots
+included.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from data_store import load_cleaned
+from edge import EdgeDevice, EdgeFanDetector, EdgeHampelFilter, EdgeInsectDetector
+from fan_detection import FanDetector
+from insect_detection import InsectDetector
+from realtime_cleaning import RealTimeHampelFilter
+from synthetic import generate_device
+
+STRIDE = 25
+WINDOW_MS = 30 * 60 * 1000
+
+@pytest.fixture(scope='module', params=['worm', 'withoutworm', 'synthetic'])
+def dataset(request):
+    if request.param != 'synthetic':
+        return load_cleaned(os.path.join(ROOT, 'cleaned_data', f'{request.param}_cleaned.csv'))
+    # Three days of 15 s samples with fan events and two reboots (rows 4474, 10530)
+    return generate_device(3 * 5760, seed=7)
+
+def epoch_starts(timestamp_ms):
+    """Per row, the first row since the device last rebooted (timestamp_ms went back)"""
+    reset = np.r_[True, np.diff(timestamp_ms) < 0]
+    return np.maximum.accumulate(np.where(reset, np.arange(len(timestamp_ms)), 0))
+
+def window_start(timestamp_ms, starts, i):
+    """First row of the window ending at row i, as the edge detectors hold it"""
+    first = starts[i]
+    return first + np.searchsorted(timestamp_ms[first:i + 1], timestamp_ms[i] - WINDOW_MS,
+                                   side='right')
+
+def trailing(df, starts, i):
+    return df.iloc[window_start(df['timestamp_ms'].to_numpy(), starts, i):i + 1]
+
+def test_hampel_matches_reference(dataset):
+    reference = RealTimeHampelFilter(window_size=10, n_sigmas=3)
+    edge = EdgeHampelFilter(window_size=10, n_sigmas=3)
+    windows = [reference.co2_window, reference.temp_window, reference.humidity_window]
+    for reading in zip(dataset['co2'].tolist(), dataset['temperature'].tolist(),
+                       dataset['humidity'].tolist()):
+        expected = []
+        for value, window in zip(reading, windows):
+            window.append(value)
+            expected.append(reference.hampel_filter_point(value, window))
+        got = edge.process_reading(*reading)
+        assert all(a == b or (a != a and b != b) for a, b in zip(expected, got))
+
+def test_insect_matches_pandas(dataset):
+    reference, insects = InsectDetector(), EdgeInsectDetector()
+    timestamp_ms = dataset['timestamp_ms'].to_numpy()
+    starts = epoch_starts(timestamp_ms)
+    for i, (ms, co2) in enumerate(zip(timestamp_ms.tolist(), dataset['co2'].tolist())):
+        detection, results = insects.update(ms, co2)
+        if i % STRIDE:
+            continue
+        expected_detection, expected = reference.analyze_window(trailing(dataset, starts, i))
+        assert bool(detection) == bool(expected_detection), i
+        for key, value in expected.items():
+            assert np.isclose(results[key], value, rtol=1e-9, atol=1e-12, equal_nan=True), (i, key)
+
+def test_fan_matches_pandas(dataset):
+    reference, fan = FanDetector(), EdgeFanDetector()
+    timestamp_ms = dataset['timestamp_ms'].to_numpy()
+    starts = epoch_starts(timestamp_ms)
+    transitions = []
+    for i, (ms, temp, humid) in enumerate(zip(
+            timestamp_ms.tolist(), dataset['temperature'].tolist(),
+            dataset['humidity'].tolist())):
+        if fan.update(ms, temp, humid) is not None:
+            transitions.append(i)
+        if i % STRIDE == 0:
+            assert bool(reference.analyze_window(trailing(dataset, starts, i))) == fan.fan_on, i
+    # The state really flips at each reported transition, not a sample early or late
+    state = False
+    for i in transitions:
+        state = not state
+        assert bool(reference.analyze_window(trailing(dataset, starts, i))) == state, i
+        assert bool(reference.analyze_window(trailing(dataset, starts, i - 1))) != state, i
+
+def test_footprint(dataset):
+    device = EdgeDevice()
+    peak = 0
+    for reading in zip(dataset['timestamp_ms'].tolist(), dataset['co2'].tolist(),
+                       dataset['temperature'].tolist(), dataset['humidity'].tolist()):
+        device.process(*reading)
+        peak = max(peak, device.nbytes())
+    assert peak < 1 << 20
+
+def test_reboot_starts_a_new_window():
+    # Twelve days with reboots at rows 5717, 7411, 8439 and 20262: after each
+    # one the window holds only samples since the reboot, never older uptime
+    df = generate_device(12 * 5760, seed=3)
+    timestamp_ms = df['timestamp_ms'].to_numpy()
+    starts = epoch_starts(timestamp_ms)
+    insects, fan = EdgeInsectDetector(), EdgeFanDetector()
+    for i, (ms, co2, temp, humid) in enumerate(zip(
+            timestamp_ms.tolist(), df['co2'].tolist(), df['temperature'].tolist(),
+            df['humidity'].tolist())):
+        insects.update(ms, co2)
+        fan.update(ms, temp, humid)
+        held = i + 1 - window_start(timestamp_ms, starts, i)
+        assert len(insects.timestamps) == held, i
+        assert len(fan.timestamps) == held, i
@@ -0,0 +1,75 @@
+"""Bit-identical checks for the incremental Hampel filters
+
+    python -m pytest -q tests
+
+The edge runtime's HampelChannel must give exactly np.median and scipy's
+median_abs_deviation of its window, and RealTimeHampelFilter /
+MultiChannelHampelFilter exactly the output of the per-reading scipy
+reference (hampel_filter_point).
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy.stats import median_abs_deviation
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from bench_hampel import make_readings, reference_filter
+from edge.hampel import HampelChannel
+from realtime_cleaning import MultiChannelHampelFilter, RealTimeHampelFilter
+
+TRIALS = 300
+
+def test_median_mad_fuzz():
+    rng = np.random.default_rng(4)
+    for trial in range(TRIALS):
+        window_size = int(rng.integers(1, 60))
+        n = int(rng.integers(1, 4 * window_size + 2))
+        # Few distinct values in some trials so ties and zero MADs turn up
+        if trial % 3 == 0:
+            values = rng.integers(0, 5, n).astype(float)
+        else:
+            values = rng.normal(0, 10 ** rng.uniform(-3, 3), n)
+        if trial % 5 == 0:
+            values[rng.random(n) < 0.1] = np.nan
+        channel = HampelChannel(window_size)
+        for i, value in enumerate(values.tolist()):
+            channel.filter(value)
+            window = values[max(0, i + 1 - window_size):i + 1]
+            finite = window[~np.isnan(window)]
+            if not len(finite):
+                continue
+            median = channel.median()
+            assert median == np.median(finite), (trial, i)
+            assert channel.mad(median) == median_abs_deviation(finite), (trial, i)
+
+@pytest.mark.parametrize('window_size', [3, 10, 30, 100])
+def test_realtime_matches_reference(window_size):
+    readings = make_readings(max(3000, 5 * window_size), seed=window_size)
+    reference, incremental = RealTimeHampelFilter(window_size), RealTimeHampelFilter(window_size)
+    for reading in readings:
+        assert incremental.process_reading(*reading) == reference_filter(reference, *reading)
+
+def test_realtime_nan_passes_through():
+    readings = make_readings(500, seed=1)
+    readings[100] = (float('nan'),) + readings[100][1:]
+    reference, incremental = RealTimeHampelFilter(10), RealTimeHampelFilter(10)
+    for reading in readings:
+        expected = reference_filter(reference, *reading)
+        got = incremental.process_reading(*reading)
+        assert all(a == b or (a != a and b != b) for a, b in zip(expected, got))
+
+def test_multichannel_matches_per_device():
+    n_devices, window_size = 7, 10
+    rng = np.random.default_rng(5)
+    ticks = 700 + rng.normal(0, 5, (400, n_devices, 3))
+    ticks[rng.random(ticks.shape) < 0.02] += 300
+    filters = [RealTimeHampelFilter(window_size) for _ in range(n_devices)]
+    batched = MultiChannelHampelFilter(n_devices * 3, window_size)
+    for tick in ticks:
+        expected = [hampel.process_reading(*reading) for hampel, reading in
+                    zip(filters, tick.tolist())]
+        assert batched.process_batch(tick).tolist() == [list(r) for r in expected]